@@ -0,0 +1,192 @@
+"""上下文挑选 - 在token预算内为特征挑选对比文件中最相关的段落"""
+from bisect import bisect_right
+from typing import Any, Dict, List, Optional, Tuple
+
+from analyzers.passage_ranker import BM25Ranker
+from processors.text_segmenter import SegmentIndex
+from utils.rate_limiter import estimate_tokens
+
+
+class ContextSelection:
+    """一次挑选的结果：送入提示词的正文及所选段落"""
+
+    __slots__ = ('content', 'passages', 'original_tokens', 'selected_tokens')
+
+    def __init__(self,
+                 content: str,
+                 passages: List[Dict[str, Any]],
+                 original_tokens: int,
+                 selected_tokens: int):
+        self.content = content
+        self.passages = passages
+        self.original_tokens = original_tokens
+        self.selected_tokens = selected_tokens
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.original_tokens - self.selected_tokens
+
+    @property
+    def truncated(self) -> bool:
+        """是否只发送了部分正文"""
+        return self.selected_tokens < self.original_tokens
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为响应中的上下文报告"""
+        return {
+            'truncated': self.truncated,
+            'original_tokens': self.original_tokens,
+            'selected_tokens': self.selected_tokens,
+            'tokens_saved': self.tokens_saved,
+            'passages': self.passages,
+        }
+
+
+class ContextSelector:
+    """
+    按token预算挑选上下文
+
+    对比文件按段落切分（超过预算四分之一的长段落再按句子切分），段落得分为其中各句子
+    与特征的BM25得分之和；相关段落按得分从高到低装入预算，装入的段落按原文顺序拼接。
+    没有任何段落与特征有共同词项时按原文顺序从头装入；没有一个段落能完整装入时
+    （如无标点的长行），截取排名最前的段落开头部分，保证送入的正文不为空。
+    """
+
+    # 不相邻的段落之间插入的省略标记
+    GAP_MARKER = "\n……\n"
+
+    def __init__(self, ranker: Optional[BM25Ranker] = None):
+        """
+        初始化挑选器
+
+        Args:
+            ranker: BM25排序器，默认新建（同一文档的词项统计在多次挑选间复用）
+        """
+        self.ranker = ranker or BM25Ranker()
+
+    def select(self,
+               feature_text: str,
+               content: str,
+               token_budget: int,
+               segments: Optional[SegmentIndex] = None,
+               key: Optional[str] = None) -> ContextSelection:
+        """
+        挑选与特征最相关的段落
+
+        Args:
+            feature_text: 技术特征文本
+            content: 对比文件正文
+            token_budget: 正文的token预算（按estimate_tokens估算）
+            segments: 句子/段落偏移索引，未提供时现场计算
+            key: 文档键（如文档ID），作为BM25词项统计的缓存键，未提供时按正文哈希
+
+        Returns:
+            挑选结果；正文未超出预算时原样返回全文，passages为空
+        """
+        original_tokens = estimate_tokens(content)
+        if original_tokens <= token_budget:
+            return ContextSelection(content, [], original_tokens, original_tokens)
+
+        segments = segments or SegmentIndex.build(content)
+        spans = self._passage_spans(content, segments, max(token_budget // 4, 1))
+        scores = self._passage_scores(feature_text, content, segments, spans, key)
+
+        # 有相关段落时只装入相关段落，否则按原文顺序装入
+        candidates = [i for i in range(len(spans)) if scores[i] > 0] or list(range(len(spans)))
+        chosen: List[int] = []
+        remaining = token_budget
+        ordered = sorted(candidates, key=lambda i: (-scores[i], i))
+        for index in ordered:
+            start, end = spans[index]
+            tokens = estimate_tokens(content[start:end])
+            if tokens <= remaining:
+                chosen.append(index)
+                remaining -= tokens
+
+        if ordered and not chosen:
+            # 没有段落能完整装入：截取排名最前的段落直到用满预算
+            index = ordered[0]
+            start, end = spans[index]
+            spans[index] = (start, min(end, start + self._max_chars(content, start, end, token_budget)))
+            chosen.append(index)
+
+        chosen.sort()
+        parts = []
+        passages = []
+        previous_end = None
+        for index in chosen:
+            start, end = spans[index]
+            if previous_end is not None:
+                parts.append("\n\n" if content[previous_end:start].isspace() else self.GAP_MARKER)
+            parts.append(content[start:end])
+            passages.append({
+                'start': start,
+                'end': end,
+                'tokens': estimate_tokens(content[start:end]),
+                'score': round(scores[index], 4),
+            })
+            previous_end = end
+
+        selected = ''.join(parts)
+        return ContextSelection(selected, passages, original_tokens, estimate_tokens(selected))
+
+    @staticmethod
+    def _max_chars(content: str, start: int, end: int, token_budget: int) -> int:
+        """从start起估算token数不超过预算的最大字符数（至少一个字符）"""
+        low, high = 1, end - start
+        while low < high:
+            middle = (low + high + 1) // 2
+            if estimate_tokens(content[start:start + middle]) <= token_budget:
+                low = middle
+            else:
+                high = middle - 1
+        return low
+
+    @staticmethod
+    def _passage_spans(content: str,
+                       segments: SegmentIndex,
+                       max_passage_tokens: int) -> List[Tuple[int, int]]:
+        """段落区间，过长的段落替换为其中的句子区间"""
+        spans = []
+        sentence = 0
+        sentence_count = segments.sentence_count
+        for start, end in segments.paragraph_spans():
+            if estimate_tokens(content[start:end]) <= max_passage_tokens:
+                spans.append((start, end))
+                continue
+            while sentence < sentence_count and segments.sentence_ends[sentence] <= start:
+                sentence += 1
+            while sentence < sentence_count and segments.sentence_starts[sentence] < end:
+                spans.append((segments.sentence_starts[sentence], segments.sentence_ends[sentence]))
+                sentence += 1
+        return spans
+
+    def _passage_scores(self,
+                        feature_text: str,
+                        content: str,
+                        segments: SegmentIndex,
+                        spans: List[Tuple[int, int]],
+                        key: Optional[str] = None) -> List[float]:
+        """各段落内句子的BM25得分之和"""
+        starts = [start for start, _ in spans]
+        scores = [0.0] * len(spans)
+        ranked = self.ranker.rank(feature_text, content, segments, top_k=segments.sentence_count,
+                                  key=key)
+        for sentence, score in ranked:
+            position = segments.sentence_starts[sentence]
+            index = _span_at(starts, spans, position)
+            if index >= 0:
+                scores[index] += score
+        return scores
+
+
+def _span_at(starts: List[int], spans: List[Tuple[int, int]], position: int) -> int:
+    """查找包含指定字符位置的区间序号，不在任何区间内时返回-1"""
+    i = bisect_right(starts, position) - 1
+    if i >= 0 and position < spans[i][1]:
+        return i
+    return -1
+
+
+# 创建全局实例
+context_selector = ContextSelector()
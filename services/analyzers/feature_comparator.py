@@ -1,5 +1,5 @@
 """特征对比分析器"""
-from typing import Dict, Optional, List
+from typing import Dict, Optional, List, Tuple
 import logging
 import asyncio
 import json
@@ -8,6 +8,9 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from utils.llm_clients import llm_client, doc_processor
+from utils.rate_limiter import estimate_tokens
+from analyzers.context_selector import ContextSelection, context_selector
+from processors.document_store import document_store
 from config import settings
 
 logger = logging.getLogger(__name__)
@@ -20,6 +23,9 @@ class FeatureComparator:
     使用多种LLM进行技术特征的智能比对分析
     """
     
+    # RAG检索每个特征返回的文档数
+    RETRIEVAL_TOP_K = 5
+    
     def __init__(self, model_id: str = None):
         """
         初始化特征比对器
@@ -36,7 +42,12 @@ class FeatureComparator:
                      compare_content: str, 
                      user_input: str = "",
                      use_rag: bool = False,
-                     dataset_ids: List[str] = None) -> Dict:
+                     dataset_ids: List[str] = None,
+                     hedge: Optional[bool] = None,
+                     bypass_cache: bool = False,
+                     related_docs: Optional[List[Dict]] = None,
+                     context_token_budget: Optional[int] = None,
+                     document_id: Optional[str] = None) -> Dict:
         """
         执行特征比对分析
         
@@ -46,40 +57,68 @@ class FeatureComparator:
             user_input: 用户额外需求
             use_rag: 是否使用RAG检索增强
             dataset_ids: RAG数据集ID列表
+            hedge: 是否对慢请求发出对冲请求，默认使用配置
+            bypass_cache: 是否跳过LLM响应缓存
+            related_docs: 已批量检索到的相关文档（启用RAG时提供则不再单独检索）
+            context_token_budget: 对比内容的token预算，超出时只发送最相关的段落，
+                默认使用配置中的COMPARE_CONTEXT_TOKEN_BUDGET，0表示发送全文
+            document_id: 对比内容为已上传文档时的文档ID，挑选段落时复用存储的偏移索引
             
         Returns:
-            比对分析结果字典
+            比对分析结果字典；挑选了段落时 context 中包含所选段落和节省的token数
         """
         try:
             # 如果启用RAG，先检索相关文档
-            related_docs = []
+            doc_content = ""
             if use_rag and dataset_ids:
-                related_docs = await self._retrieve_related_documents(
-                    feature_text, dataset_ids
-                )
+                if related_docs is None:
+                    related_docs = await self._retrieve_related_documents(
+                        feature_text, dataset_ids
+                    )
                 if related_docs:
-                    # 将检索到的文档添加到对比内容中
                     doc_content = self._format_retrieved_docs(related_docs)
-                    compare_content = f"{compare_content}\n\n<检索到的相关文档>\n{doc_content}\n</检索到的相关文档>"
+            else:
+                related_docs = []
+            
+            # 对比内容超出预算时只保留最相关的段落（检索到的文档占用一部分预算）
+            compare_content, selection = await self._select_context(
+                feature_text, compare_content, context_token_budget,
+                reserved_tokens=estimate_tokens(doc_content) if doc_content else 0,
+                document_id=document_id
+            )
+            
+            if doc_content:
+                # 将检索到的文档添加到对比内容中
+                compare_content = f"{compare_content}\n\n<检索到的相关文档>\n{doc_content}\n</检索到的相关文档>"
             
             # 构建提示词
             prompt = self._build_prompt(feature_text, compare_content, user_input)
             
             # 调用LLM进行分析
-            result = await self.llm_client.process_item(prompt, model=self.model_id)
+            result = await self.llm_client.process_item(
+                prompt, model=self.model_id, hedge=hedge, bypass_cache=bypass_cache
+            )
             
             if result.get('res'):
                 # 解析LLM响应
                 parsed_result = self._parse_result(result['res'])
                 parsed_result['model_used'] = result.get('model', self.model_id)
+                if result.get('hedged'):
+                    parsed_result['hedged'] = True
+                if result.get('cached'):
+                    parsed_result['cached'] = True
+                if result.get('coalesced'):
+                    parsed_result['coalesced'] = True
                 if related_docs:
                     parsed_result['retrieved_docs'] = len(related_docs)
+                if selection is not None:
+                    parsed_result['context'] = selection.to_dict()
                 return parsed_result
             else:
                 # 返回错误信息
                 return {
                     'status': 'error',
-                    'message': result.get('res', '分析失败'),
+                    'message': result.get('error') or '分析失败',
                     'similarity': 0.0
                 }
                 
@@ -95,7 +134,10 @@ class FeatureComparator:
                                 feature_text: str,
                                 compare_content: str,
                                 image_paths: List[str],
-                                user_input: str = "") -> Dict:
+                                user_input: str = "",
+                                bypass_cache: bool = False,
+                                context_token_budget: Optional[int] = None,
+                                document_id: Optional[str] = None) -> Dict:
         """
         执行图文特征比对分析
         
@@ -104,6 +146,9 @@ class FeatureComparator:
             compare_content: 对比文件内容
             image_paths: 图片路径列表
             user_input: 用户额外需求
+            bypass_cache: 是否跳过LLM响应缓存
+            context_token_budget: 对比内容的token预算，同 compare
+            document_id: 已上传文档的ID，同 compare
             
         Returns:
             比对分析结果字典
@@ -114,6 +159,10 @@ class FeatureComparator:
             # 构建包含图片的内容
             content_list = []
             
+            compare_content, selection = await self._select_context(
+                feature_text, compare_content, context_token_budget, document_id=document_id
+            )
+            
             # 添加文本提示
             prompt = self._build_prompt(feature_text, compare_content, user_input)
             content_list.append({"type": "text", "text": prompt})
@@ -132,7 +181,8 @@ class FeatureComparator:
             # 调用图文分析API
             result = await self.llm_client.process_item_image(
                 content_list, 
-                model=settings.IMAGE_MODEL_ID
+                model=settings.IMAGE_MODEL_ID,
+                bypass_cache=bypass_cache
             )
             
             if result.get('res'):
@@ -140,11 +190,15 @@ class FeatureComparator:
                 parsed_result = self._parse_result(result['res'])
                 parsed_result['model_used'] = settings.IMAGE_MODEL_ID
                 parsed_result['analysis_type'] = 'image_text'
+                if result.get('cached'):
+                    parsed_result['cached'] = True
+                if selection is not None:
+                    parsed_result['context'] = selection.to_dict()
                 return parsed_result
             else:
                 return {
                     'status': 'error',
-                    'message': '图文分析失败',
+                    'message': result.get('error') or '图文分析失败',
                     'similarity': 0.0
                 }
                 
@@ -159,7 +213,9 @@ class FeatureComparator:
     async def compare_streaming(self,
                                feature_text: str,
                                compare_content: str,
-                               user_input: str = "") -> Dict:
+                               user_input: str = "",
+                               context_token_budget: Optional[int] = None,
+                               document_id: Optional[str] = None) -> Dict:
         """
         流式执行特征比对分析
         
@@ -167,11 +223,19 @@ class FeatureComparator:
             feature_text: 技术特征文本
             compare_content: 对比文件内容
             user_input: 用户额外需求
+            context_token_budget: 对比内容的token预算，同 compare
+            document_id: 已上传文档的ID，同 compare
             
         Yields:
-            分析结果片段
+            分析结果片段；挑选了段落时先输出一个 context 片段
         """
         try:
+            compare_content, selection = await self._select_context(
+                feature_text, compare_content, context_token_budget, document_id=document_id
+            )
+            if selection is not None:
+                yield {'type': 'context', **selection.to_dict()}
+            
             prompt = self._build_prompt(feature_text, compare_content, user_input)
             
             # 系统提示词
@@ -207,6 +271,54 @@ class FeatureComparator:
                 'message': str(e)
             }
     
+    async def _select_context(self,
+                              feature_text: str,
+                              compare_content: str,
+                              token_budget: Optional[int],
+                              reserved_tokens: int = 0,
+                              document_id: Optional[str] = None) -> Tuple[str, Optional[ContextSelection]]:
+        """
+        按token预算挑选对比内容中与特征最相关的段落
+        
+        Args:
+            feature_text: 技术特征文本
+            compare_content: 对比文件内容
+            token_budget: token预算，None时使用配置，0或负数表示不挑选
+            reserved_tokens: 预算中已被其他内容（如检索到的文档）占用的token数，
+                对比内容至少保留一半预算
+            document_id: 已上传文档的ID，提供时使用存储的偏移索引，并以其作为词项统计的缓存键
+            
+        Returns:
+            (送入提示词的对比内容, 挑选结果)，未挑选时挑选结果为None
+        """
+        if token_budget is None:
+            token_budget = settings.COMPARE_CONTEXT_TOKEN_BUDGET
+        if token_budget <= 0:
+            return compare_content, None
+        
+        budget = max(token_budget - reserved_tokens, token_budget // 2)
+        if estimate_tokens(compare_content) <= budget:
+            selection = context_selector.select(feature_text, compare_content, budget)
+        else:
+            # 分句和BM25统计对长文档是CPU密集操作，放到线程中执行，不阻塞事件循环
+            selection = await asyncio.to_thread(
+                self._select_passages, feature_text, compare_content, budget, document_id
+            )
+        if selection.passages:
+            logger.info(f"对比内容超出预算，选取 {len(selection.passages)} 个段落，"
+                        f"节省约 {selection.tokens_saved} tokens")
+        return selection.content, selection
+    
+    @staticmethod
+    def _select_passages(feature_text: str,
+                         compare_content: str,
+                         budget: int,
+                         document_id: Optional[str]) -> ContextSelection:
+        """在线程中挑选段落：已上传文档读取存储的偏移索引，不再重新分句"""
+        segments = document_store.get_segments(document_id) if document_id else None
+        return context_selector.select(feature_text, compare_content, budget,
+                                       segments=segments, key=document_id)
+    
     def _build_prompt(self, feature_text: str, compare_content: str, user_input: str) -> str:
         """构建LLM提示词"""
         prompt = f"""
@@ -360,7 +472,7 @@ class FeatureComparator:
             docs = await self.doc_processor.retrieve_documents(
                 query=query,
                 dataset_ids=dataset_ids,
-                top_k=5
+                top_k=self.RETRIEVAL_TOP_K
             )
             
             return docs
@@ -369,6 +481,23 @@ class FeatureComparator:
             logger.error(f"文档检索失败: {str(e)}")
             return []
     
+    async def retrieve_related_batch(self, queries: List[str], dataset_ids: List[str]) -> Dict[str, List[Dict]]:
+        """
+        批量检索多个特征的相关文档（重复的特征只检索一次）
+        
+        Args:
+            queries: 特征文本列表
+            dataset_ids: 数据集ID列表
+            
+        Returns:
+            特征文本到检索结果的映射，结果可作为 compare 的 related_docs 传入
+        """
+        unique = list(dict.fromkeys(queries))
+        results = await self.doc_processor.retrieve_batch(
+            unique, dataset_ids or [settings.ZH_DATASET_ID], top_k=self.RETRIEVAL_TOP_K
+        )
+        return dict(zip(unique, results))
+    
     def _format_retrieved_docs(self, docs: List[Dict]) -> str:
         """
         格式化检索到的文档
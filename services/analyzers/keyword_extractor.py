@@ -0,0 +1,166 @@
+"""关键词提取 - 面向专利文本的中英文关键词切分"""
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+# 专利文本中高频但不区分技术方案的词
+PATENT_STOPWORDS = {
+    # 专利套话
+    '所述', '所述的', '其特征在于', '特征在于', '其中', '一种', '一个', '多个', '至少',
+    '用于', '用来', '以便', '使得', '进行', '通过', '根据', '按照', '基于', '对于', '关于',
+    '包括', '包含', '具有', '设置', '设置有', '设有', '配置', '配置为', '能够', '可以', '可',
+    '以及', '并且', '或者', '而且', '上述', '相应', '分别', '还', '步骤',
+    # 虚词
+    '的', '地', '得', '在', '中', '和', '与', '及', '或', '由', '被', '对', '将', '把', '于',
+    '为', '是', '有', '从', '向', '至', '并', '且', '以', '之', '其', '各', '该', '此', '所',
+    '个', '等', '使', '时', '上', '下', '内', '外', '后', '前',
+}
+
+# 含有停用字的常见词，切分时整体保留，避免被停用字拆开
+PROTECTED_WORDS = {
+    '中心', '中央', '中间', '中断', '存在', '所有', '对应', '对象', '对比', '对称', '是否',
+    '有效', '有线', '有源', '以太网', '其他', '其余', '上传', '下载', '上位机', '下位机',
+    '内存', '内部', '外部', '外壳', '后端', '前端', '时钟', '时间', '时序', '实时', '同时',
+    '在线', '为止', '和值', '由此', '使用', '向量', '至少一', '并行', '并联', '将来',
+    '上下文', '前缀', '后缀', '等效', '等于', '以上', '以下',
+}
+
+# 英文停用词
+ENGLISH_STOPWORDS = {
+    'the', 'and', 'for', 'with', 'said', 'wherein', 'which', 'that', 'from', 'into', 'are',
+    'comprising', 'comprises', 'configured', 'having', 'being', 'least', 'one', 'each',
+    'such', 'this', 'thereof', 'therein', 'whereby', 'plurality',
+}
+
+TOKEN_PATTERN = re.compile(r'[\u4e00-\u9fff]+|[A-Za-z][A-Za-z0-9\-]*|\d+')
+WHITESPACE = re.compile(r'\s+')
+
+# 中文片段长度超过该值时按窗口切分
+MAX_CHUNK_LENGTH = 6
+WINDOW_SIZE = 4
+WINDOW_STEP = 2
+
+
+class _Trie:
+    """词典字典树，支持从指定位置开始的最长匹配"""
+
+    def __init__(self):
+        self.root: Dict = {}
+
+    def add(self, word: str, value):
+        node = self.root
+        for char in word:
+            node = node.setdefault(char, {})
+        node[None] = value
+
+    def longest_match(self, text: str, start: int) -> Tuple[int, object]:
+        """
+        从start开始查找最长的词典词
+
+        Returns:
+            (匹配长度, 词的取值)，没有匹配时返回 (0, None)
+        """
+        node = self.root
+        best_length, best_value = 0, None
+        for i in range(start, len(text)):
+            node = node.get(text[i])
+            if node is None:
+                break
+            if None in node:
+                best_length, best_value = i - start + 1, node[None]
+        return best_length, best_value
+
+
+_STOP, _KEEP = 'stop', 'keep'
+_trie = _Trie()
+for _word in PROTECTED_WORDS:
+    _trie.add(_word, _KEEP)
+for _word in PATENT_STOPWORDS:
+    _trie.add(_word, _STOP)
+
+
+def normalize_text(text: str) -> str:
+    """
+    归一化文本：全角转半角并合并空白
+
+    Args:
+        text: 输入文本
+
+    Returns:
+        归一化后的文本
+    """
+    return WHITESPACE.sub(' ', unicodedata.normalize('NFKC', text)).strip()
+
+
+def _split_chinese(run: str) -> List[str]:
+    """按词典最长匹配切分中文连续片段，停用词作为分隔"""
+    chunks = []
+    current = []
+    i = 0
+    while i < len(run):
+        length, value = _trie.longest_match(run, i)
+        if value == _STOP:
+            if current:
+                chunks.append(''.join(current))
+                current = []
+            i += length
+        elif value == _KEEP:
+            current.append(run[i:i + length])
+            i += length
+        else:
+            current.append(run[i])
+            i += 1
+    if current:
+        chunks.append(''.join(current))
+    return chunks
+
+
+def _chunk_keywords(chunk: str) -> List[str]:
+    """将中文片段转换为关键词，过长的片段按重叠窗口切分"""
+    if len(chunk) < 2:
+        return []
+    if len(chunk) <= MAX_CHUNK_LENGTH:
+        return [chunk]
+
+    windows = [chunk[i:i + WINDOW_SIZE]
+               for i in range(0, len(chunk) - WINDOW_SIZE + 1, WINDOW_STEP)]
+    tail = chunk[-WINDOW_SIZE:]
+    if windows[-1] != tail:
+        windows.append(tail)
+    return windows
+
+
+@lru_cache(maxsize=4096)
+def _extract_normalized(text: str) -> Tuple[str, ...]:
+    """提取归一化文本的关键词（按特征文本缓存）"""
+    keywords = []
+    seen = set()
+    for token in TOKEN_PATTERN.findall(text):
+        if token.isdigit():
+            continue
+        if token.isascii():
+            candidates = [token] if len(token) > 2 and token.lower() not in ENGLISH_STOPWORDS else []
+        else:
+            candidates = [k for chunk in _split_chinese(token) for k in _chunk_keywords(chunk)]
+        for keyword in candidates:
+            if keyword not in seen:
+                seen.add(keyword)
+                keywords.append(keyword)
+    return tuple(keywords)
+
+
+def extract_keywords(text: str) -> List[str]:
+    """
+    提取技术特征文本中的关键词
+
+    中文按专利停用词词典切分为词块，英文按词切分并去除停用词，
+    同一特征文本的结果会被缓存。
+
+    Args:
+        text: 输入文本
+
+    Returns:
+        关键词列表（去重，保持出现顺序）
+    """
+    return list(_extract_normalized(normalize_text(text)))
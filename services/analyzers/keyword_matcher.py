@@ -0,0 +1,130 @@
+"""多关键词匹配 - 基于Aho–Corasick自动机的单遍扫描"""
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from processors.text_segmenter import SegmentIndex
+
+
+class KeywordAutomaton:
+    """Aho–Corasick自动机，一次扫描找出全部关键词的全部出现位置"""
+
+    def __init__(self, keywords: Iterable[str]):
+        """
+        构建自动机
+
+        Args:
+            keywords: 关键词（重复和空串会被忽略）
+        """
+        self.keywords: List[str] = []
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[int]] = [[]]
+
+        seen = set()
+        for keyword in keywords:
+            if keyword and keyword not in seen:
+                seen.add(keyword)
+                self._insert(keyword, len(self.keywords))
+                self.keywords.append(keyword)
+        self._build_failure_links()
+
+    def _insert(self, keyword: str, keyword_id: int):
+        """向字典树插入关键词"""
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append(keyword_id)
+
+    def _build_failure_links(self):
+        """按广度优先计算失配指针，并合并后缀状态的输出"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(char, 0)
+                self._fail[next_state] = fail
+                if self._output[fail]:
+                    self._output[next_state] = self._output[next_state] + self._output[fail]
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int]]:
+        """
+        扫描文本
+
+        Args:
+            text: 待扫描文本
+
+        Yields:
+            (起始位置, 关键词序号)
+        """
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        keywords = self.keywords
+        state = 0
+        for i, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                for keyword_id in output[state]:
+                    yield i - len(keywords[keyword_id]) + 1, keyword_id
+
+
+class FeatureMatcher:
+    """
+    多特征句子匹配器
+
+    将所有特征的关键词构建为一个自动机，每个文档只扫描一遍，
+    得到每个特征命中的句子列表。
+    """
+
+    def __init__(self, feature_keywords: List[List[str]]):
+        """
+        初始化匹配器
+
+        Args:
+            feature_keywords: 每个特征的关键词列表
+        """
+        self.feature_count = len(feature_keywords)
+        self.automaton = KeywordAutomaton(
+            keyword for keywords in feature_keywords for keyword in keywords
+        )
+
+        # 关键词序号 -> 使用该关键词的特征序号
+        keyword_ids = {keyword: i for i, keyword in enumerate(self.automaton.keywords)}
+        self._keyword_features: List[List[int]] = [[] for _ in self.automaton.keywords]
+        for feature_index, keywords in enumerate(feature_keywords):
+            for keyword_id in {keyword_ids[k] for k in keywords if k}:
+                self._keyword_features[keyword_id].append(feature_index)
+
+    def match(self, content: str, segments: SegmentIndex) -> List[List[int]]:
+        """
+        匹配一个文档
+
+        Args:
+            content: 文档正文
+            segments: 文档的句子偏移索引
+
+        Returns:
+            每个特征命中的句子序号（升序、去重）
+        """
+        hits = [set() for _ in range(self.feature_count)]
+
+        # 逐句扫描合并折行后的文本：关键词必须完整落在同一个句子内，跨折行的关键词也能命中
+        for sentence_index, sentence in enumerate(segments.sentences(content)):
+            for _, keyword_id in self.automaton.iter_matches(sentence):
+                for feature_index in self._keyword_features[keyword_id]:
+                    hits[feature_index].add(sentence_index)
+
+        return [sorted(sentence_ids) for sentence_ids in hits]
@@ -0,0 +1,266 @@
+"""并行特征匹配 - 按（文档, 特征块）分片到进程池执行"""
+import logging
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, List, Optional, Tuple
+
+from analyzers.keyword_matcher import FeatureMatcher
+from analyzers.passage_ranker import BM25Ranker
+from processors.text_segmenter import SegmentIndex
+from utils.process_pool import kill_pool, process_context
+
+logger = logging.getLogger(__name__)
+
+# 子进程内最近几次匹配任务的文档副本：任务文件路径 -> (文档列表, BM25排序器)
+# 每个进程每个任务只读取一次任务文件，词项统计也只计算一次
+_WORKER_JOB_CACHE_SIZE = 4
+_worker_jobs: "OrderedDict[str, Tuple[List[Tuple[str, SegmentIndex]], BM25Ranker]]" = OrderedDict()
+
+# 应用生命周期内共用的进程池
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def _load_job(job_path: str) -> Tuple[List[Tuple[str, SegmentIndex]], BM25Ranker]:
+    """
+    获取任务的文档（在子进程中执行），首次使用时从任务文件读取
+
+    Args:
+        job_path: 任务文件路径
+
+    Returns:
+        (正文, 句子偏移索引) 列表, BM25排序器
+    """
+    job = _worker_jobs.get(job_path)
+    if job is None:
+        with open(job_path, 'rb') as f:
+            docs = pickle.load(f)
+        job = (docs, BM25Ranker(cache_size=max(len(docs), 1)))
+        _worker_jobs[job_path] = job
+        while len(_worker_jobs) > _WORKER_JOB_CACHE_SIZE:
+            _worker_jobs.popitem(last=False)
+    else:
+        _worker_jobs.move_to_end(job_path)
+    return job
+
+
+def _match_unit(job_path: str,
+                doc_index: int,
+                feature_start: int,
+                features: List[str],
+                feature_keywords: List[List[str]],
+                ranking: str,
+                top_k: int) -> Tuple[int, int, List[List[int]]]:
+    """
+    匹配一个工作单元：一个文档 × 一块连续的特征（在子进程中执行）
+
+    Args:
+        job_path: 任务文件路径
+        doc_index: 文档序号
+        feature_start: 特征块在全部特征中的起始序号
+        features: 特征块的特征文本
+        feature_keywords: 特征块的关键词（first方式使用）
+        ranking: 片段选取方式，'bm25' 或 'first'
+        top_k: bm25方式下每个特征选取的句子数量
+
+    Returns:
+        (文档序号, 特征块起始序号, 每个特征命中的句子序号列表)
+    """
+    docs, ranker = _load_job(job_path)
+    content, segments = docs[doc_index]
+
+    if ranking == 'bm25':
+        key = str(doc_index)
+        hits = [[i for i, _ in ranker.rank(feature, content, segments, top_k, key=key)]
+                for feature in features]
+    else:
+        sentence_hits = FeatureMatcher(feature_keywords).match(content, segments)
+        hits = [ids if keywords else [] for ids, keywords in zip(sentence_hits, feature_keywords)]
+    return doc_index, feature_start, hits
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    获取（必要时创建）匹配进程池
+
+    Args:
+        workers: 进程数，与现有进程池不同时重建；现有进程池已损坏（子进程异常退出）时也重建
+
+    Returns:
+        进程池
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is not None and _pool._broken:
+            _pool.shutdown(wait=False)
+            _pool = None
+        if _pool is not None and _pool_workers != workers:
+            # 不取消旧进程池中其他请求已提交的工作单元
+            _pool.shutdown(wait=False)
+            _pool = None
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=process_context())
+            _pool_workers = workers
+        return _pool
+
+
+def _discard_pool(pool: ProcessPoolExecutor, kill: bool = False):
+    """
+    丢弃进程池，下次匹配时重建
+
+    Args:
+        pool: 要丢弃的进程池，已被其他请求替换时只关闭它
+        kill: 是否强制结束其子进程（工作单元卡住时）
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    if kill:
+        kill_pool(pool)
+    else:
+        pool.shutdown(wait=False)
+
+
+def shutdown_match_pool():
+    """关闭匹配进程池（应用关闭时调用）"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+class ParallelFeatureMatcher:
+    """
+    进程池特征匹配器
+
+    全部特征按块切分，与每个文档组成（文档, 特征块）工作单元分发到进程池；
+    进程池在应用生命周期内共用，使用 forkserver/spawn 方式启动子进程。
+    每次匹配的文档序列化为一个临时任务文件，子进程首次处理该任务时读取并缓存，
+    工作单元只携带任务文件路径和特征。结果按文档序号和特征序号写回，与串行匹配的顺序一致。
+    """
+
+    def __init__(self, max_workers: int, block_size: int = 16, top_k: int = 5,
+                 timeout: Optional[float] = None):
+        """
+        初始化匹配器
+
+        Args:
+            max_workers: 进程数
+            block_size: 每个工作单元包含的特征数
+            top_k: bm25方式下每个特征选取的句子数量
+            timeout: 一次匹配的超时时间（秒），None表示不限
+        """
+        self.max_workers = max_workers
+        self.block_size = max(block_size, 1)
+        self.top_k = top_k
+        self.timeout = timeout
+
+    def match(self,
+              features: List[str],
+              feature_keywords: List[List[str]],
+              compare_docs: List[Dict],
+              ranking: str,
+              progress: Optional[Callable[[int, int], None]] = None) -> List[List[List[int]]]:
+        """
+        并行匹配全部特征与文档
+
+        Args:
+            features: 技术特征文本列表
+            feature_keywords: 每个特征的关键词列表（first方式使用）
+            compare_docs: 对比文档列表，每个文档包含 'content' 和 'segments'
+            ranking: 片段选取方式，'bm25' 或 'first'
+            progress: 进度回调，参数为（已完成的特征×文档数, 总数）
+
+        Returns:
+            result[文档序号][特征序号] = 命中的句子序号列表（按拼接顺序排列）
+
+        Raises:
+            BrokenProcessPool: 进程池重建并重试一次后仍然损坏
+            TimeoutError: 超过timeout仍未完成，卡住的子进程已被结束
+        """
+        if not features or not compare_docs:
+            return [[[] for _ in features] for _ in compare_docs]
+
+        docs = [(doc['content'], doc['segments']) for doc in compare_docs]
+        fd, job_path = tempfile.mkstemp(prefix='match_', suffix='.pkl')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(docs, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+            for attempt in range(2):
+                pool = _get_pool(self.max_workers)
+                try:
+                    return self._run(pool, job_path, features, feature_keywords,
+                                     len(docs), ranking, progress)
+                except BrokenProcessPool:
+                    # 子进程异常退出（被杀死、内存不足等）：丢弃进程池，重建后重试一次
+                    _discard_pool(pool)
+                    if attempt:
+                        raise
+                    logger.warning("匹配进程池已损坏，重建后重试")
+                except TimeoutError:
+                    _discard_pool(pool, kill=True)
+                    raise TimeoutError(f"并行匹配超时({self.timeout}s)") from None
+        finally:
+            os.unlink(job_path)
+
+    def _run(self,
+             pool: ProcessPoolExecutor,
+             job_path: str,
+             features: List[str],
+             feature_keywords: List[List[str]],
+             doc_count: int,
+             ranking: str,
+             progress: Optional[Callable[[int, int], None]]) -> List[List[List[int]]]:
+        """
+        在进程池中执行一次匹配任务的全部工作单元
+
+        Args:
+            pool: 进程池
+            job_path: 任务文件路径
+            features: 技术特征文本列表
+            feature_keywords: 每个特征的关键词列表
+            doc_count: 文档数
+            ranking: 片段选取方式
+            progress: 进度回调
+
+        Returns:
+            result[文档序号][特征序号] = 命中的句子序号列表
+        """
+        result = [[[] for _ in features] for _ in range(doc_count)]
+        units = [(doc_index, start)
+                 for doc_index in range(doc_count)
+                 for start in range(0, len(features), self.block_size)]
+        total = len(features) * doc_count
+        done = 0
+
+        futures = []
+        try:
+            futures = [
+                pool.submit(_match_unit, job_path, doc_index, start,
+                            features[start:start + self.block_size],
+                            feature_keywords[start:start + self.block_size],
+                            ranking, self.top_k)
+                for doc_index, start in units
+            ]
+            for future in as_completed(futures, timeout=self.timeout):
+                doc_index, start, hits = future.result()
+                result[doc_index][start:start + len(hits)] = hits
+                done += len(hits)
+                if progress:
+                    progress(done, total)
+        finally:
+            # 出错时取消本次匹配尚未开始的工作单元，其他请求的不受影响
+            for future in futures:
+                future.cancel()
+
+        logger.debug(f"并行匹配完成: {len(units)} 个工作单元, {self.max_workers} 个进程")
+        return result
@@ -0,0 +1,165 @@
+"""BM25段落排序 - 按相关度为特征挑选文档片段"""
+import re
+import math
+import hashlib
+import threading
+from collections import Counter, OrderedDict, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from processors.text_segmenter import SegmentIndex
+
+# 中文连续片段切为二字组，英文/数字按词切分
+TOKEN_PATTERN = re.compile(r'[\u4e00-\u9fff]+|[A-Za-z0-9]+')
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    切分检索词项：中文取相邻二字组（单字保留原字），英文小写化后按词切分
+
+    Args:
+        text: 输入文本
+
+    Returns:
+        词项列表
+    """
+    tokens = []
+    for run in TOKEN_PATTERN.findall(text):
+        if run.isascii():
+            tokens.append(run.lower())
+        elif len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+class DocumentTermStats:
+    """单个文档的BM25词项统计：以句子为段落，记录倒排表、段落长度和文档频率"""
+
+    __slots__ = ('postings', 'lengths', 'avg_length')
+
+    def __init__(self, content: str, segments: SegmentIndex):
+        """
+        统计文档词项
+
+        Args:
+            content: 文档正文
+            segments: 句子偏移索引
+        """
+        self.postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        self.lengths: List[int] = []
+        for passage_index, sentence in enumerate(segments.sentences(content)):
+            counts = Counter(tokenize(sentence))
+            self.lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self.postings[term].append((passage_index, tf))
+        self.postings = dict(self.postings)
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+
+
+class BM25Ranker:
+    """
+    BM25段落排序器
+
+    文档的词项统计在首次使用时计算，并按文档键缓存（LRU），
+    同一文档与多个特征比对时只统计一次。
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, cache_size: int = 64):
+        """
+        初始化排序器
+
+        Args:
+            k1: 词频饱和参数
+            b: 段落长度归一化参数
+            cache_size: 缓存的文档统计数量
+        """
+        self.k1 = k1
+        self.b = b
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, DocumentTermStats]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key_for(content: str) -> str:
+        """
+        按正文计算文档键（未提供文档ID时使用）
+
+        Args:
+            content: 文档正文
+
+        Returns:
+            正文的SHA-1十六进制字符串
+        """
+        return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+    def get_stats(self,
+                  content: str,
+                  segments: SegmentIndex,
+                  key: Optional[str] = None) -> DocumentTermStats:
+        """
+        获取（必要时计算）文档的词项统计
+
+        Args:
+            content: 文档正文
+            segments: 句子偏移索引
+            key: 文档键，默认使用正文哈希
+
+        Returns:
+            词项统计
+        """
+        key = key or self.key_for(content)
+        with self._lock:
+            stats = self._cache.get(key)
+            if stats is not None:
+                self._cache.move_to_end(key)
+                return stats
+
+        stats = DocumentTermStats(content, segments)
+        with self._lock:
+            self._cache[key] = stats
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return stats
+
+    def rank(self,
+             query: str,
+             content: str,
+             segments: SegmentIndex,
+             top_k: int = 5,
+             key: Optional[str] = None) -> List[Tuple[int, float]]:
+        """
+        对文档的句子按与查询的相关度排序
+
+        Args:
+            query: 查询文本（技术特征）
+            content: 文档正文
+            segments: 句子偏移索引
+            top_k: 返回数量
+            key: 文档键
+
+        Returns:
+            [(句子序号, 得分)]，按得分从高到低排列，只包含得分大于0的句子
+        """
+        stats = self.get_stats(content, segments, key)
+        passage_count = len(stats.lengths)
+        if not passage_count:
+            return []
+
+        k1 = self.k1
+        b = self.b
+        avg_length = stats.avg_length or 1.0
+        scores: Dict[int, float] = defaultdict(float)
+
+        for term in set(tokenize(query)):
+            postings = stats.postings.get(term)
+            if not postings:
+                continue
+            df = len(postings)
+            idf = math.log(1 + (passage_count - df + 0.5) / (df + 0.5))
+            for passage_index, tf in postings:
+                norm = k1 * (1 - b + b * stats.lengths[passage_index] / avg_length)
+                scores[passage_index] += idf * tf * (k1 + 1) / (tf + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:top_k]
@@ -0,0 +1,103 @@
+"""特征与匹配结果记录 - 分析流程内部使用的轻量数据模型"""
+from typing import Any, Dict, Union
+
+# 字段名 -> 中文列名
+COLUMN_NAMES = {
+    'claim': '权利要求',
+    'feature_seq': '技术特征序号',
+    'feature_content': '技术特征详情',
+    'compare_file': '对比文件',
+    'relation_paragraph': '相关片段',
+    'relation_core_paragraph': '相关核心片段',
+    'analysis_process': '分析过程',
+    'analysis_result': '分析结果',
+}
+
+
+def _field_value(data: Dict[str, Any], field: str) -> str:
+    """按字段名或中文列名取值"""
+    value = data.get(field)
+    if value is None:
+        value = data.get(COLUMN_NAMES[field])
+    return '' if value is None else str(value)
+
+
+class FeatureRecord:
+    """技术特征"""
+
+    __slots__ = ('claim', 'feature_seq', 'feature_content')
+
+    def __init__(self, claim: str, feature_seq: str, feature_content: str):
+        self.claim = claim
+        self.feature_seq = feature_seq
+        self.feature_content = feature_content
+
+    @classmethod
+    def from_dict(cls, data: Union[Dict[str, Any], "FeatureRecord"]) -> "FeatureRecord":
+        """
+        从字典创建，字段名（claim）和中文列名（权利要求）均可
+
+        Args:
+            data: 特征字典或特征记录
+
+        Returns:
+            特征记录
+        """
+        if isinstance(data, cls):
+            return data
+        return cls(*(_field_value(data, field) for field in cls.__slots__))
+
+    def to_dict(self) -> Dict[str, str]:
+        """转换为字典（字段名与数据库列一致）"""
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    def __repr__(self) -> str:
+        return f"FeatureRecord({self.claim!r}, {self.feature_seq!r}, {self.feature_content[:20]!r})"
+
+
+class MatchRecord:
+    """特征与一个对比文件的匹配及分析结果"""
+
+    __slots__ = ('claim', 'feature_seq', 'feature_content', 'compare_file',
+                 'relation_paragraph', 'relation_core_paragraph',
+                 'analysis_process', 'analysis_result')
+
+    def __init__(self,
+                 feature: FeatureRecord,
+                 compare_file: str,
+                 relation_paragraph: str = '',
+                 relation_core_paragraph: str = '',
+                 analysis_process: str = '',
+                 analysis_result: str = ''):
+        self.claim = feature.claim
+        self.feature_seq = feature.feature_seq
+        self.feature_content = feature.feature_content
+        self.compare_file = compare_file
+        self.relation_paragraph = relation_paragraph
+        self.relation_core_paragraph = relation_core_paragraph
+        self.analysis_process = analysis_process
+        self.analysis_result = analysis_result
+
+    @classmethod
+    def from_dict(cls, data: Union[Dict[str, Any], "MatchRecord"]) -> "MatchRecord":
+        """
+        从字典创建，字段名和中文列名均可
+
+        Args:
+            data: 匹配结果字典或匹配记录
+
+        Returns:
+            匹配记录
+        """
+        if isinstance(data, cls):
+            return data
+        return cls(FeatureRecord.from_dict(data),
+                   *(_field_value(data, field) for field in cls.__slots__[3:]))
+
+    def to_dict(self) -> Dict[str, str]:
+        """转换为字典（字段名与数据库列一致）"""
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    def __repr__(self) -> str:
+        return f"MatchRecord({self.claim!r}, {self.feature_seq!r}, {self.compare_file!r})"
+
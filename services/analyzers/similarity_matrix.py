@@ -0,0 +1,145 @@
+"""批量特征匹配 - 基于字符n-gram TF-IDF稀疏矩阵的相似度计算"""
+import re
+from typing import Dict, List, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from processors.text_segmenter import SegmentIndex
+
+WHITESPACE = re.compile(r'\s+')
+
+
+def char_ngrams(text: str, ngram_range: Tuple[int, int] = (2, 3)) -> List[str]:
+    """
+    提取字符n-gram（小写化并合并空白）
+
+    Args:
+        text: 输入文本
+        ngram_range: n-gram长度范围（包含两端）
+
+    Returns:
+        n-gram列表
+    """
+    text = WHITESPACE.sub(' ', text.lower())
+    grams = []
+    for n in range(ngram_range[0], ngram_range[1] + 1):
+        grams.extend(text[i:i + n] for i in range(len(text) - n + 1))
+    return grams
+
+
+class TfidfMatrixMatcher:
+    """
+    特征 × 段落相似度矩阵
+
+    所有文档的句子作为段落向量化为TF-IDF字符n-gram稀疏矩阵，特征向量化后
+    与段落矩阵做稀疏矩阵乘法，得到全部余弦相似度，再按文档取top-k。
+    相似度结果保持稀疏，只在非零得分中选取，内存占用与段落总数无关。
+    """
+
+    def __init__(self, ngram_range: Tuple[int, int] = (2, 3), top_k: int = 5, block_size: int = 256):
+        """
+        初始化匹配器
+
+        Args:
+            ngram_range: 字符n-gram长度范围
+            top_k: 每个（特征, 文档）返回的段落数量
+            block_size: 每次参与矩阵乘法的特征数，限制单次乘积的内存占用
+        """
+        self.ngram_range = ngram_range
+        self.top_k = top_k
+        self.block_size = block_size
+
+    def match(self,
+              features: List[str],
+              compare_docs: List[Dict]) -> List[List[List[Tuple[int, float]]]]:
+        """
+        计算每个特征在每个文档中最相似的句子
+
+        Args:
+            features: 技术特征文本列表
+            compare_docs: 对比文档列表，每个文档包含 'content'，可选 'segments'
+
+        Returns:
+            result[特征序号][文档序号] = [(句子序号, 相似度)]，按相似度从高到低排列
+        """
+        passages = []
+        doc_bounds = []
+        for doc in compare_docs:
+            content = doc['content']
+            segments = doc.get('segments') or SegmentIndex.build(content)
+            start = len(passages)
+            passages.extend(segments.sentences(content))
+            doc_bounds.append((start, len(passages)))
+
+        result = [[[] for _ in compare_docs] for _ in features]
+        if not passages or not features:
+            return result
+
+        vocabulary: Dict[str, int] = {}
+        passage_matrix = self._vectorize(passages, vocabulary, grow=True)
+
+        # 平滑IDF，与常见TF-IDF实现一致
+        df = np.bincount(passage_matrix.indices, minlength=len(vocabulary))
+        idf = np.log((1 + len(passages)) / (1 + df)) + 1
+        passage_matrix = self._normalize(passage_matrix @ sparse.diags(idf))
+        passage_matrix_t = passage_matrix.T.tocsr()
+
+        feature_matrix = self._vectorize(features, vocabulary, grow=False)
+        feature_matrix = self._normalize(feature_matrix @ sparse.diags(idf))
+
+        for block_start in range(0, len(features), self.block_size):
+            block = feature_matrix[block_start:block_start + self.block_size]
+            similarity = (block @ passage_matrix_t).tocsr()
+            similarity.sort_indices()
+
+            for offset in range(similarity.shape[0]):
+                row_start, row_end = similarity.indptr[offset], similarity.indptr[offset + 1]
+                columns = similarity.indices[row_start:row_end]
+                scores = similarity.data[row_start:row_end]
+                # 非零得分的段落序号已排序，按文档边界切分
+                cuts = np.searchsorted(columns, [bound for bounds in doc_bounds for bound in bounds])
+                for doc_index, (start, _) in enumerate(doc_bounds):
+                    lo, hi = cuts[2 * doc_index], cuts[2 * doc_index + 1]
+                    result[block_start + offset][doc_index] = self._top_k(columns[lo:hi] - start, scores[lo:hi])
+        return result
+
+    def _vectorize(self, texts: List[str], vocabulary: Dict[str, int], grow: bool) -> sparse.csr_matrix:
+        """将文本列表转换为词频稀疏矩阵"""
+        indptr = [0]
+        indices = []
+        for text in texts:
+            for gram in char_ngrams(text, self.ngram_range):
+                column = vocabulary.get(gram)
+                if column is None:
+                    if not grow:
+                        continue
+                    column = vocabulary[gram] = len(vocabulary)
+                indices.append(column)
+            indptr.append(len(indices))
+
+        data = np.ones(len(indices), dtype=np.float64)
+        matrix = sparse.csr_matrix(
+            (data, np.asarray(indices, dtype=np.int64), np.asarray(indptr, dtype=np.int64)),
+            shape=(len(texts), len(vocabulary))
+        )
+        # 合并同一行重复的n-gram得到词频
+        matrix.sum_duplicates()
+        return matrix
+
+    @staticmethod
+    def _normalize(matrix: sparse.spmatrix) -> sparse.csr_matrix:
+        """按行L2归一化"""
+        matrix = sparse.csr_matrix(matrix)
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        return sparse.diags(1.0 / norms) @ matrix
+
+    def _top_k(self, columns: np.ndarray, scores: np.ndarray) -> List[Tuple[int, float]]:
+        """从非零得分中取得分最高的k个段落（只保留得分大于0的）"""
+        if scores.size == 0:
+            return []
+        k = min(self.top_k, scores.size)
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        candidates = candidates[np.lexsort((columns[candidates], -scores[candidates]))]
+        return [(int(columns[i]), float(scores[i])) for i in candidates if scores[i] > 0]
@@ -1,8 +1,17 @@
 """技术特征分析器"""
 import re
-import pandas as pd
+import asyncio
 from typing import Dict, Tuple, List, Optional, Callable, Union
 import logging
+from concurrent.futures.process import BrokenProcessPool
+
+from processors.text_segmenter import SegmentIndex
+from analyzers.keyword_matcher import FeatureMatcher
+from analyzers.keyword_extractor import extract_keywords
+from analyzers.passage_ranker import BM25Ranker
+from analyzers.parallel_matcher import ParallelFeatureMatcher
+from analyzers.records import FeatureRecord, MatchRecord
+from config import settings
 
 logger = logging.getLogger(__name__)
 
@@ -10,19 +19,47 @@ logger = logging.getLogger(__name__)
 class TechFeatureAnalyzer:
     """技术特征分析器 - 负责特征解析、匹配和分析"""
     
-    def __init__(self, llm_client=None):
+    # 比对器的公开结论 -> 分析结果
+    DISCLOSURE_RESULTS = {'是': '公开', '否': '未公开'}
+    
+    # 支持的相关片段选取方式
+    RANKINGS = ('bm25', 'tfidf', 'first')
+    
+    def __init__(self,
+                 llm_client=None,
+                 ranking: Optional[str] = None,
+                 top_k: Optional[int] = None,
+                 comparator=None):
         """
         初始化分析器
         
         Args:
             llm_client: LLM客户端（可选）
+            ranking: 相关片段选取方式，'bm25' 按相关度排序，'tfidf' 按字符n-gram TF-IDF相似度批量排序，
+                'first' 取最先出现的命中句子
+            top_k: bm25方式下每个特征选取的句子数量
+            comparator: 特征比对器（FeatureComparator），用于LLM深度分析
+            
+        Raises:
+            ValueError: 片段选取方式不受支持
         """
-        self.features_df = None
+        self.features: List[FeatureRecord] = []
         self.comparison_texts = []
         self.processed_docs = []
         self.llm_client = llm_client
-        
-    def parse_features(self, text: str) -> Tuple[pd.DataFrame, str]:
+        self.comparator = comparator
+        self.ranking = self._check_ranking(ranking or settings.MATCH_RANKING)
+        self.top_k = top_k or settings.MATCH_TOP_K
+        self.passage_ranker = BM25Ranker(cache_size=settings.MATCH_STATS_CACHE_SIZE)
+        
+    @classmethod
+    def _check_ranking(cls, ranking: str) -> str:
+        """校验片段选取方式"""
+        if ranking not in cls.RANKINGS:
+            raise ValueError(f"不支持的片段选取方式: {ranking}，可选值为 {', '.join(cls.RANKINGS)}")
+        return ranking
+    
+    def parse_features(self, text: str) -> Tuple[List[FeatureRecord], str]:
         """
         解析技术特征文本
         
@@ -30,22 +67,22 @@ class TechFeatureAnalyzer:
             text: 包含技术特征的文本
             
         Returns:
-            (DataFrame, 消息) 特征数据框和处理消息
+            (特征列表, 消息) 特征记录和处理消息
         """
         try:
             features = self._split_claims(text)
             
             if not features:
-                return pd.DataFrame(), "未能解析出技术特征"
+                return [], "未能解析出技术特征"
             
-            self.features_df = pd.DataFrame(features)
-            return self.features_df, f"成功解析 {len(features)} 个技术特征"
+            self.features = features
+            return self.features, f"成功解析 {len(features)} 个技术特征"
             
         except Exception as e:
             logger.error(f"解析特征失败: {str(e)}")
-            return pd.DataFrame(), f"解析失败: {str(e)}"
+            return [], f"解析失败: {str(e)}"
     
-    def _split_claims(self, text: str) -> List[Dict]:
+    def _split_claims(self, text: str) -> List[FeatureRecord]:
         """
         拆分权利要求和技术特征
         
@@ -66,11 +103,11 @@ class TechFeatureAnalyzer:
             feature_list = self._extract_features(claim_text)
             
             for seq, feature_content in enumerate(feature_list, 1):
-                features.append({
-                    '权利要求': f"权利要求{claim_num}",
-                    '技术特征序号': str(seq),
-                    '技术特征详情': feature_content.strip()
-                })
+                features.append(FeatureRecord(
+                    claim=f"权利要求{claim_num}",
+                    feature_seq=str(seq),
+                    feature_content=feature_content.strip()
+                ))
         
         # 如果没有找到标准格式，尝试其他分割方式
         if not features:
@@ -78,11 +115,11 @@ class TechFeatureAnalyzer:
             lines = text.strip().split('\n')
             for i, line in enumerate(lines, 1):
                 if line.strip():
-                    features.append({
-                        '权利要求': '权利要求1',
-                        '技术特征序号': str(i),
-                        '技术特征详情': line.strip()
-                    })
+                    features.append(FeatureRecord(
+                        claim='权利要求1',
+                        feature_seq=str(i),
+                        feature_content=line.strip()
+                    ))
         
         return features
     
@@ -125,84 +162,144 @@ class TechFeatureAnalyzer:
     
     def match_features(self, 
                       compare_docs: List[Dict[str, str]], 
-                      progress: Optional[Callable] = None) -> Tuple[pd.DataFrame, str]:
+                      progress: Optional[Callable] = None,
+                      ranking: Optional[str] = None,
+                      workers: Optional[int] = None,
+                      features: Optional[List[FeatureRecord]] = None) -> Tuple[List[MatchRecord], str]:
         """
         将特征与对比文档进行匹配
         
         Args:
             compare_docs: 对比文档列表，每个文档包含 'filename' 和 'content'
             progress: 进度回调函数
+            ranking: 本次匹配使用的片段选取方式，默认使用实例配置；
+                'tfidf' 为批量模式，一次稀疏矩阵乘法算出全部特征与段落的相似度
+            workers: 并行匹配的进程数，默认使用配置中的MATCH_WORKERS，0或1表示串行；
+                'tfidf' 方式始终在当前进程内计算
+            features: 本次匹配的技术特征，默认使用已解析的特征
             
         Returns:
-            (DataFrame, 消息) 匹配结果数据框和处理消息
+            (匹配结果列表, 消息) 按文档、特征顺序排列的匹配记录和处理消息
+            
+        Raises:
+            ValueError: 片段选取方式不受支持
         """
-        if self.features_df is None or self.features_df.empty:
-            return pd.DataFrame(), "请先解析技术特征"
+        ranking = self._check_ranking(ranking or self.ranking)
+        feature_records = self.features if features is None else features
+        if not feature_records:
+            return [], "请先解析技术特征"
         
         if not compare_docs:
-            return pd.DataFrame(), "没有提供对比文档"
+            return [], "没有提供对比文档"
         
         results = []
-        total_features = len(self.features_df)
+        total_features = len(feature_records)
         total_docs = len(compare_docs)
         total_steps = total_features * total_docs
         current_step = 0
         
+        workers = settings.MATCH_WORKERS if workers is None else workers
+        features = [record.feature_content for record in feature_records]
+        
+        # 每个文档只分句一次，所有特征共用
+        compare_docs = [
+            doc if doc.get('segments') else {**doc, 'segments': SegmentIndex.build(doc['content'])}
+            for doc in compare_docs
+        ]
+        
+        if ranking == 'first':
+            # 所有特征的关键词构建为一个自动机，每个文档只扫描一遍
+            feature_keywords = [self._extract_keywords(feature) for feature in features]
+            matcher = FeatureMatcher(feature_keywords)
+        elif ranking == 'tfidf':
+            # 全部特征 × 全部段落的相似度一次算出（numpy/scipy按需导入）
+            from analyzers.similarity_matrix import TfidfMatrixMatcher
+            tfidf_hits = TfidfMatrixMatcher(top_k=self.top_k).match(features, compare_docs)
+        
+        parallel_hits = None
+        if ranking != 'tfidf' and workers > 1 and total_steps >= settings.MATCH_PARALLEL_MIN_PAIRS:
+            def report(done, total):
+                if progress:
+                    progress(done / total, f"并行匹配 {done}/{total}")
+            
+            try:
+                parallel_hits = ParallelFeatureMatcher(
+                    max_workers=workers,
+                    block_size=settings.MATCH_FEATURE_BLOCK_SIZE,
+                    top_k=self.top_k,
+                    timeout=settings.MATCH_PARALLEL_TIMEOUT or None
+                ).match(features,
+                        feature_keywords if ranking == 'first' else [[] for _ in features],
+                        compare_docs, ranking, report)
+            except (BrokenProcessPool, TimeoutError) as e:
+                # 进程池不可用时退回串行匹配，不让分析失败
+                logger.warning(f"并行匹配失败，改为串行匹配: {str(e) or type(e).__name__}")
+        
         for doc_index, doc in enumerate(compare_docs, 1):
-            for feature_index, (_, row) in enumerate(self.features_df.iterrows(), 1):
-                feature = row['技术特征详情']
+            content = doc['content']
+            segments = doc['segments']
+            # 内联文档没有ID时按正文计算一次文档键，不在每个特征的排序中重复哈希全文
+            doc_key = (doc.get('document_id') or doc.get('content_hash')
+                       or (BM25Ranker.key_for(content) if ranking == 'bm25' and parallel_hits is None
+                           else None))
+            sentence_hits = (matcher.match(content, segments)
+                             if ranking == 'first' and parallel_hits is None else None)
+            
+            for feature_index, record in enumerate(feature_records, 1):
+                feature = record.feature_content
                 
-                # 更新进度
-                if progress:
+                # 更新进度（并行匹配的进度已按完成的工作单元汇报）
+                if progress and parallel_hits is None:
                     progress_msg = f"匹配特征 {feature_index}/{total_features}, 文档 {doc_index}/{total_docs}"
                     current_step += 1
                     progress(current_step/total_steps, progress_msg)
                 
-                # 执行匹配
-                matches = self._find_relevant_content(feature, doc['content'])
+                # 拼接命中句子
+                if parallel_hits is not None:
+                    matches = self._build_snippet(content, segments,
+                                                  parallel_hits[doc_index - 1][feature_index - 1])
+                elif ranking == 'bm25':
+                    ranked = self.passage_ranker.rank(feature, content, segments, self.top_k, key=doc_key)
+                    matches = self._build_snippet(content, segments, [i for i, _ in ranked])
+                elif ranking == 'tfidf':
+                    ranked = tfidf_hits[feature_index - 1][doc_index - 1]
+                    matches = self._build_snippet(content, segments, [i for i, _ in ranked])
+                elif feature_keywords[feature_index - 1]:
+                    matches = self._build_snippet(content, segments, sentence_hits[feature_index - 1])
+                else:
+                    matches = self._build_snippet(content, segments, [])
                 
-                results.append({
-                    '权利要求': row['权利要求'],
-                    '技术特征序号': row['技术特征序号'],
-                    '技术特征详情': feature,
-                    '对比文件': doc['filename'],
-                    '相关片段': matches,
-                    '相关核心片段': '',
-                    '分析过程': '',
-                    '分析结果': ''
-                })
-        
-        result_df = pd.DataFrame(results)
+                results.append(MatchRecord(record, doc['filename'], relation_paragraph=matches))
+        
         msg = f"匹配完成！共处理 {total_features} 个特征，{total_docs} 个文档"
-        return result_df, msg
+        return results, msg
     
-    def _find_relevant_content(self, feature: str, content: str, max_length: int = 500) -> str:
+    def _build_snippet(self,
+                       content: str,
+                       segments: SegmentIndex,
+                       sentence_ids: List[int],
+                       max_length: int = 500) -> str:
         """
-        查找与特征相关的内容片段
+        按给定顺序拼接命中句子，超出长度上限时截断
         
         Args:
-            feature: 技术特征
             content: 文档内容
+            segments: 文档的句子偏移索引
+            sentence_ids: 命中的句子序号（按拼接顺序排列）
             max_length: 返回片段的最大长度
             
         Returns:
-            相关内容片段
+            相关内容片段，没有命中句子时返回文档开头
         """
-        # 提取特征关键词
-        keywords = self._extract_keywords(feature)
-        
-        if not keywords:
-            return content[:max_length] if len(content) > max_length else content
-        
-        # 查找包含关键词的句子
-        sentences = re.split('[。！？]', content)
         relevant_sentences = []
+        total_length = 0
         
-        for sentence in sentences:
-            if any(keyword in sentence for keyword in keywords):
-                relevant_sentences.append(sentence)
-                if len('。'.join(relevant_sentences)) > max_length:
-                    break
+        for sentence_index in sentence_ids:
+            sentence = segments.sentence(content, sentence_index)
+            relevant_sentences.append(sentence)
+            total_length += len(sentence) + 1
+            if total_length > max_length:
+                break
         
         if relevant_sentences:
             return '。'.join(relevant_sentences)[:max_length]
@@ -220,63 +317,116 @@ class TechFeatureAnalyzer:
         Returns:
             关键词列表
         """
-        # 简单的关键词提取逻辑
-        # 可以根据需要增强（如使用jieba分词）
-        
-        # 移除标点符号
-        text = re.sub(r'[^\w\s]', ' ', text)
-        
-        # 提取较长的词（可能是技术术语）
-        words = text.split()
-        keywords = [w for w in words if len(w) > 2]
-        
-        return keywords
+        # 中文按专利停用词切分，结果按特征文本缓存
+        return extract_keywords(text)
     
-    def analyze_with_llm(self, 
-                        features_df: pd.DataFrame,
-                        progress: Optional[Callable] = None) -> Tuple[pd.DataFrame, str]:
+    async def analyze_with_llm(self, 
+                              records: List[MatchRecord],
+                              progress: Optional[Callable] = None,
+                              concurrency: Optional[int] = None,
+                              use_rag: bool = False,
+                              dataset_ids: Optional[List[str]] = None) -> Tuple[List[MatchRecord], str]:
         """
         使用LLM进行深度分析
         
+        各特征×文档的分析并发执行，同时进行的LLM调用数不超过concurrency；
+        每个分析完成后立即写回对应的记录，记录顺序不变。
+        启用RAG时先并发批量检索全部特征的相关文档，再开始分析。
+        
         Args:
-            features_df: 包含特征和匹配结果的DataFrame
-            progress: 进度回调函数
+            records: 匹配结果记录
+            progress: 进度回调函数，按完成的分析数更新
+            concurrency: 最大并发LLM调用数，默认使用配置中的LLM_ANALYSIS_CONCURRENCY
+            use_rag: 是否附加RAG检索到的相关文档
+            dataset_ids: RAG数据集ID列表
             
         Returns:
-            (DataFrame, 消息) 分析结果数据框和处理消息
+            (匹配结果列表, 消息) 填入分析结果的记录和处理消息
         """
-        if self.llm_client is None:
-            return features_df, "未配置LLM客户端"
+        if self.comparator is None:
+            return records, "未配置特征比对器"
         
-        total = len(features_df)
+        total = len(records)
+        if not total:
+            return records, "没有需要分析的特征"
         
-        for index, row in features_df.iterrows():
+        related = None
+        if use_rag and dataset_ids:
             if progress:
-                progress((index + 1) / total, f"分析特征 {index + 1}/{total}")
-            
-            # 构建分析请求
-            analysis = self._analyze_single_feature(row)
-            
-            # 更新结果
-            features_df.at[index, '相关核心片段'] = analysis.get('core_content', '')
-            features_df.at[index, '分析过程'] = analysis.get('process', '')
-            features_df.at[index, '分析结果'] = analysis.get('result', '')
+                progress(0.0, "检索相关文档")
+            related = await self.comparator.retrieve_related_batch(
+                [record.feature_content for record in records], dataset_ids
+            )
         
-        return features_df, f"LLM分析完成，共处理 {total} 个特征"
+        semaphore = asyncio.Semaphore(max(concurrency or settings.LLM_ANALYSIS_CONCURRENCY, 1))
+        
+        async def analyze(index: int) -> Tuple[int, Dict]:
+            record = records[index]
+            related_docs = related.get(record.feature_content) if related is not None else None
+            async with semaphore:
+                return index, await self._analyze_single_feature(record, related_docs, dataset_ids)
+        
+        failed = 0
+        tasks = [asyncio.ensure_future(analyze(index)) for index in range(total)]
+        try:
+            for done, task in enumerate(asyncio.as_completed(tasks), 1):
+                index, analysis = await task
+                
+                # 更新结果
+                record = records[index]
+                record.relation_core_paragraph = analysis.get('core_content', '')
+                record.analysis_process = analysis.get('process', '')
+                record.analysis_result = analysis.get('result', '')
+                if analysis.get('status') == 'error':
+                    failed += 1
+                
+                if progress:
+                    progress(done / total, f"分析特征 {done}/{total}")
+        finally:
+            for task in tasks:
+                task.cancel()
+        
+        msg = f"LLM分析完成，共处理 {total} 个特征"
+        if failed:
+            msg += f"，其中 {failed} 个分析失败"
+        return records, msg
     
-    def _analyze_single_feature(self, feature_row: pd.Series) -> Dict:
+    async def _analyze_single_feature(self,
+                                      record: MatchRecord,
+                                      related_docs: Optional[List[Dict]] = None,
+                                      dataset_ids: Optional[List[str]] = None) -> Dict:
         """
-        分析单个特征
+        分析单个特征：以匹配到的相关片段作为对比内容调用特征比对器
         
         Args:
-            feature_row: 特征行数据
+            record: 匹配结果记录
+            related_docs: 预先检索到的相关文档，为None时不使用RAG
+            dataset_ids: RAG数据集ID列表
             
         Returns:
-            分析结果字典
+            分析结果字典，包含 core_content、process、result 和 status
         """
-        # TODO: 实现具体的LLM分析逻辑
+        comparison = await self.comparator.compare(
+            feature_text=record.feature_content,
+            compare_content=record.relation_paragraph,
+            use_rag=related_docs is not None,
+            dataset_ids=dataset_ids,
+            related_docs=related_docs
+        )
+        
+        if comparison.get('status') == 'error':
+            logger.warning(f"特征分析失败 {record.claim}-{record.feature_seq} / {record.compare_file}: "
+                           f"{comparison.get('message')}")
+            return {
+                'status': 'error',
+                'core_content': '',
+                'process': comparison.get('message', '分析失败'),
+                'result': '分析失败'
+            }
+        
         return {
-            'core_content': '核心内容待分析',
-            'process': '分析过程待完善',
-            'result': '未公开'
+            'status': 'success',
+            'core_content': comparison.get('core_content', ''),
+            'process': comparison.get('analysis_process', ''),
+            'result': self.DISCLOSURE_RESULTS.get(comparison.get('is_disclosed'), '待分析')
         }
\ No newline at end of file
@@ -1,22 +1,29 @@
 """特征分析API接口"""
-from typing import List, Optional, Any
+from typing import List, Dict, Optional, Any, Tuple
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, BackgroundTasks
 from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
-import pandas as pd
 import io
+import os
+import asyncio
 import json
+import hashlib
+import tempfile
 
+from config import settings
 from database.session import get_db
-from database.crud import FeatureCRUD
+from database.crud import FeatureCRUD, DocumentCRUD
 from schemas.feature_schema import (
     FeatureCreate, FeatureUpdate, FeatureResponse,
     FeatureBatchResponse, FeatureCompareRequest,
-    FeatureAnalysisRequest, AnalysisProgressResponse
+    FeatureAnalysisRequest, AnalysisProgressResponse, DocumentIndexRequest
 )
 from analyzers.tech_analyzer import TechFeatureAnalyzer
+from analyzers.records import FeatureRecord
 from analyzers.feature_comparator import FeatureComparator
 from processors.document_processor import DocumentProcessor
+from processors.document_store import document_store
 from utils.llm_utils import LLMClient
 
 router = APIRouter(prefix="/api/v1/features", tags=["features"])
@@ -26,6 +33,7 @@ llm_client = None
 analyzer = None
 comparator = None
 doc_processor = DocumentProcessor()
+doc_executor = None
 
 # 任务缓存
 analysis_tasks = {}
@@ -43,15 +51,34 @@ def get_analyzer():
     """获取分析器实例"""
     global analyzer
     if analyzer is None:
-        analyzer = TechFeatureAnalyzer(llm_client=get_llm_client())
+        analyzer = TechFeatureAnalyzer(llm_client=get_llm_client(), comparator=get_comparator())
     return analyzer
 
 
+def get_doc_executor() -> ThreadPoolExecutor:
+    """获取文档处理线程池"""
+    global doc_executor
+    if doc_executor is None:
+        doc_executor = ThreadPoolExecutor(
+            max_workers=settings.DOC_PROCESS_WORKERS,
+            thread_name_prefix='doc-processor'
+        )
+    return doc_executor
+
+
+def shutdown_doc_executor():
+    """关闭文档处理线程池"""
+    global doc_executor
+    if doc_executor is not None:
+        doc_executor.shutdown(wait=False, cancel_futures=True)
+        doc_executor = None
+
+
 def get_comparator():
     """获取比对器实例"""
     global comparator
     if comparator is None:
-        comparator = FeatureComparator(llm_client=get_llm_client())
+        comparator = FeatureComparator()
     return comparator
 
 
@@ -73,9 +100,9 @@ async def parse_features(
     """
     try:
         analyzer = get_analyzer()
-        features_df, message = analyzer.parse_features(text)
+        feature_records, message = analyzer.parse_features(text)
         
-        if features_df.empty:
+        if not feature_records:
             return FeatureBatchResponse(
                 features=[],
                 total=0,
@@ -84,13 +111,8 @@ async def parse_features(
         
         # 转换为响应格式
         features = []
-        for _, row in features_df.iterrows():
-            feature_data = {
-                'claim': row.get('权利要求', ''),
-                'feature_seq': row.get('技术特征序号', ''),
-                'feature_content': row.get('技术特征详情', ''),
-                'status': 'pending'
-            }
+        for record in feature_records:
+            feature_data = {**record.to_dict(), 'status': 'pending'}
             
             # 如果需要保存到数据库
             if save_to_db:
@@ -124,15 +146,24 @@ async def compare_features(request: FeatureCompareRequest):
         比对结果
     """
     try:
+        compare_content = document_store.resolve_content(
+            request.compare_content, request.compare_document_id
+        )
+        
         comparator = get_comparator()
-        result = comparator.compare(
+        result = await comparator.compare(
             feature_text=request.feature_text,
-            compare_content=request.compare_content,
-            user_input=request.user_input
+            compare_content=compare_content,
+            user_input=request.user_input,
+            document_id=request.compare_document_id
         )
         
         return JSONResponse(content=result)
         
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -154,6 +185,16 @@ async def analyze_features(
         任务ID和初始状态
     """
     try:
+        if not request.compare_files and not request.compare_document_ids:
+            raise HTTPException(status_code=400, detail="需要提供对比文件或文档ID")
+        
+        # 提前校验文档ID，避免任务提交后才失败
+        if request.compare_document_ids:
+            found = {doc.document_id for doc in DocumentCRUD.get_by_ids(db, request.compare_document_ids)}
+            missing = [doc_id for doc_id in request.compare_document_ids if doc_id not in found]
+            if missing:
+                raise HTTPException(status_code=404, detail=f"文档不存在: {', '.join(missing)}")
+        
         import uuid
         task_id = str(uuid.uuid4())
         
@@ -180,6 +221,8 @@ async def analyze_features(
             message='分析任务已提交'
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -209,9 +252,102 @@ async def get_analysis_progress(task_id: str):
     )
 
 
+async def save_upload_file(file: UploadFile) -> Tuple[str, int, str]:
+    """
+    分块将上传文件写入临时文件，写入过程中校验大小并计算哈希
+    
+    请求体总大小已由 BodySizeLimitMiddleware 在读取时限制，这里校验单个文件的大小。
+    
+    Args:
+        file: 上传的文件
+        
+    Returns:
+        (临时文件路径, 文件大小, 内容SHA-256)
+    """
+    if file.size is not None and file.size > settings.MAX_UPLOAD_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"文件过大: {file.filename}，上限 {settings.MAX_UPLOAD_SIZE} 字节"
+        )
+    
+    digest = hashlib.sha256()
+    size = 0
+    tmp_file = tempfile.NamedTemporaryFile(delete=False, suffix=file.filename)
+    try:
+        with tmp_file:
+            while True:
+                chunk = await file.read(settings.UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                
+                size += len(chunk)
+                if size > settings.MAX_UPLOAD_SIZE:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"文件过大: {file.filename}，上限 {settings.MAX_UPLOAD_SIZE} 字节"
+                    )
+                
+                digest.update(chunk)
+                tmp_file.write(chunk)
+    except BaseException:
+        os.unlink(tmp_file.name)
+        raise
+    
+    return tmp_file.name, size, digest.hexdigest()
+
+
+def process_and_store(tmp_path: str, content_hash: str) -> Dict[str, Any]:
+    """
+    处理文档并将正文写入文档存储（在文档处理线程池中执行）
+    
+    Args:
+        tmp_path: 临时文件路径
+        content_hash: 文件内容SHA-256，同时作为文档ID
+        
+    Returns:
+        处理后的文档数据，失败时包含error字段
+    """
+    doc_data = doc_processor.process_file_safe(tmp_path, content_hash=content_hash)
+    if 'error' not in doc_data:
+        document_store.put(content_hash, doc_data['content'])
+        # 偏移索引读自文档存储时无需重写
+        if not doc_data.get('segments_stored'):
+            document_store.put_segments(content_hash, doc_data['segments'])
+    return doc_data
+
+
+def load_compare_documents(db: Session, document_ids: List[str]) -> List[Dict[str, str]]:
+    """
+    按文档ID加载对比文档
+    
+    Args:
+        db: 数据库会话
+        document_ids: 文档ID列表
+        
+    Returns:
+        对比文档列表，每个文档包含 'filename' 和 'content'，顺序与输入一致
+    """
+    documents = {doc.document_id: doc for doc in DocumentCRUD.get_by_ids(db, document_ids)}
+    
+    compare_docs = []
+    for document_id in document_ids:
+        document = documents.get(document_id)
+        content = document_store.get(document_id) if document else None
+        if content is None:
+            raise FileNotFoundError(f"文档不存在: {document_id}")
+        compare_docs.append({
+            'filename': document.filename,
+            'content': content,
+            'document_id': document_id,
+            'segments': document_store.get_segments(document_id)
+        })
+    return compare_docs
+
+
 @router.post("/upload")
 async def upload_documents(
-    files: List[UploadFile] = File(...)
+    files: List[UploadFile] = File(...),
+    db: Session = Depends(get_db)
 ):
     """
     上传对比文档
@@ -220,41 +356,142 @@ async def upload_documents(
         files: 上传的文件列表
         
     Returns:
-        处理结果
+        处理结果，成功的文档包含document_id，可在比对和分析接口中引用
     """
+    tmp_files = []
     try:
-        processed_docs = []
-        
+        # 分块保存文件到临时位置
         for file in files:
-            # 保存文件到临时位置
-            import tempfile
-            import os
-            
-            with tempfile.NamedTemporaryFile(delete=False, suffix=file.filename) as tmp_file:
-                content = await file.read()
-                tmp_file.write(content)
-                tmp_path = tmp_file.name
+            tmp_path, _, content_hash = await save_upload_file(file)
+            tmp_files.append((tmp_path, content_hash))
+        
+        # 在独立线程池中并发处理文档，避免阻塞事件循环；单个文件失败不影响其他文件
+        loop = asyncio.get_running_loop()
+        executor = get_doc_executor()
+        results = await asyncio.gather(*[
+            loop.run_in_executor(executor, process_and_store, tmp_path, content_hash)
+            for tmp_path, content_hash in tmp_files
+        ], return_exceptions=True)
+        
+        processed_docs = []
+        for file, doc_data in zip(files, results):
+            if isinstance(doc_data, Exception):
+                doc_data = {'filename': file.filename, 'error': str(doc_data) or type(doc_data).__name__}
+            if 'error' in doc_data:
+                processed_docs.append({
+                    'filename': doc_data['filename'],
+                    'status': 'error',
+                    'error': doc_data['error']
+                })
+                continue
             
+            # 登记文档，后续请求通过document_id引用正文
             try:
-                # 处理文档
-                doc_data = doc_processor.process_file(tmp_path)
+                document = DocumentCRUD.get_or_create(db, {
+                    'document_id': doc_data['content_hash'],
+                    'filename': file.filename,
+                    'file_type': doc_data['file_type'],
+                    'language': doc_data['language'],
+                    'length': doc_data['length']
+                })
+            except Exception as e:
+                db.rollback()
                 processed_docs.append({
                     'filename': doc_data['filename'],
-                    'content_length': doc_data['length'],
-                    'language': doc_data['language']
+                    'status': 'error',
+                    'error': f"文档登记失败: {str(e)}"
                 })
-            finally:
-                # 清理临时文件
-                os.unlink(tmp_path)
+                continue
+            processed_docs.append({
+                'filename': doc_data['filename'],
+                'status': 'success',
+                'document_id': document.document_id,
+                'content_length': doc_data['length'],
+                'language': doc_data['language']
+            })
         
+        success_count = sum(1 for doc in processed_docs if doc['status'] == 'success')
         return JSONResponse(content={
-            'status': 'success',
-            'message': f'成功处理 {len(processed_docs)} 个文档',
+            'status': 'success' if success_count == len(processed_docs) else 'partial',
+            'message': f'成功处理 {success_count}/{len(processed_docs)} 个文档',
             'documents': processed_docs
         })
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        # 清理临时文件
+        for tmp_path, _ in tmp_files:
+            os.unlink(tmp_path)
+
+
+@router.get("/documents/stats")
+async def get_document_stats():
+    """
+    获取文档处理的内存与缓存统计
+    
+    Returns:
+        已处理文档的常驻字节数及提取缓存命中情况
+    """
+    return {
+        'processed_docs': doc_processor.memory_stats(),
+        'extraction_cache': doc_processor.cache_stats()
+    }
+
+
+@router.post("/documents/index")
+async def index_documents(request: DocumentIndexRequest, db: Session = Depends(get_db)):
+    """
+    将已上传的文档批量上传到RAG数据集
+    
+    正文直接从文档存储流式发送；同一数据集中已上传过的内容会被跳过。
+    
+    Args:
+        request: 入库请求
+        db: 数据库会话
+        
+    Returns:
+        每个文档的入库结果，上传、跳过和失败的数量，以及该数据集已记录的入库文档总数
+    """
+    from utils.llm_clients import doc_processor as rag_processor
+    
+    documents = {doc.document_id: doc for doc in DocumentCRUD.get_by_ids(db, request.document_ids)}
+    uploads = []
+    for document_id in request.document_ids:
+        document = documents.get(document_id)
+        if document is None or not document_store.exists(document_id):
+            raise HTTPException(status_code=404, detail=f"文档不存在: {document_id}")
+        uploads.append({
+            'filename': f"{os.path.splitext(document.filename)[0]}.txt",
+            'path': str(document_store.path_for(document_id))
+        })
+    
+    results = await rag_processor.upload_documents(request.dataset_id, uploads, force=request.force)
+    
+    items = []
+    for document_id, result in zip(request.document_ids, results):
+        if result is None:
+            status = 'failed'
+        elif result.get('duplicate'):
+            status = 'skipped'
+        else:
+            status = 'uploaded'
+        items.append({
+            'document_id': document_id,
+            'status': status,
+            'ragflow_document_ids': result.get('document_ids', []) if result else []
+        })
+    
+    return {
+        'dataset_id': request.dataset_id,
+        'uploaded': sum(item['status'] == 'uploaded' for item in items),
+        'skipped': sum(item['status'] == 'skipped' for item in items),
+        'failed': sum(item['status'] == 'failed' for item in items),
+        'indexed': await asyncio.to_thread(rag_processor.upload_registry.count, request.dataset_id),
+        'documents': items
+    }
 
 
 @router.get("/{feature_id}", response_model=FeatureResponse)
@@ -367,7 +604,7 @@ async def list_features(
     )
 
 
-def run_analysis_task(task_id: str, request: FeatureAnalysisRequest, db: Session):
+async def run_analysis_task(task_id: str, request: FeatureAnalysisRequest, db: Session):
     """
     后台运行分析任务
     
@@ -383,18 +620,25 @@ def run_analysis_task(task_id: str, request: FeatureAnalysisRequest, db: Session
         analysis_tasks[task_id]['status'] = 'processing'
         analysis_tasks[task_id]['message'] = '正在解析特征...'
         
-        # 解析特征
-        features_df = pd.DataFrame(request.features)
+        # 解析特征（字段名和中文列名均可）
+        feature_records = [FeatureRecord.from_dict(feature) for feature in request.features]
         
         # 处理对比文件
-        compare_docs = request.compare_files
+        compare_docs = list(request.compare_files or [])
+        if request.compare_document_ids:
+            compare_docs.extend(load_compare_documents(db, request.compare_document_ids))
         
         # 执行匹配
         def update_progress(progress, message):
             analysis_tasks[task_id]['progress'] = int(progress * 50)
             analysis_tasks[task_id]['message'] = message
         
-        result_df, _ = analyzer.match_features(compare_docs, update_progress)
+        # 匹配为CPU密集计算，放到线程池执行，避免阻塞事件循环
+        loop = asyncio.get_running_loop()
+        match_records, _ = await loop.run_in_executor(
+            None,
+            lambda: analyzer.match_features(compare_docs, update_progress, features=feature_records)
+        )
         
         # 如果需要LLM分析
         if request.analysis_type in ['all', 'llm_only']:
@@ -402,25 +646,17 @@ def run_analysis_task(task_id: str, request: FeatureAnalysisRequest, db: Session
                 analysis_tasks[task_id]['progress'] = 50 + int(progress * 50)
                 analysis_tasks[task_id]['message'] = message
             
-            result_df, _ = analyzer.analyze_with_llm(result_df, update_llm_progress)
+            match_records, _ = await analyzer.analyze_with_llm(
+                match_records,
+                update_llm_progress,
+                use_rag=request.use_rag,
+                dataset_ids=request.dataset_ids
+            )
         
         # 保存结果到数据库
         results = []
-        for _, row in result_df.iterrows():
-            feature_data = row.to_dict()
-            # 转换列名
-            feature_data = {
-                'claim': feature_data.get('权利要求'),
-                'feature_seq': feature_data.get('技术特征序号'),
-                'feature_content': feature_data.get('技术特征详情'),
-                'compare_file': feature_data.get('对比文件'),
-                'relation_paragraph': feature_data.get('相关片段'),
-                'relation_core_paragraph': feature_data.get('相关核心片段'),
-                'analysis_process': feature_data.get('分析过程'),
-                'analysis_result': feature_data.get('分析结果'),
-                'status': 'completed'
-            }
-            
+        for record in match_records:
+            feature_data = {**record.to_dict(), 'status': 'completed'}
             db_feature = FeatureCRUD.create(db, feature_data)
             results.append(db_feature.to_dict())
         
@@ -428,7 +664,7 @@ def run_analysis_task(task_id: str, request: FeatureAnalysisRequest, db: Session
         analysis_tasks[task_id]['status'] = 'completed'
         analysis_tasks[task_id]['progress'] = 100
         analysis_tasks[task_id]['message'] = '分析完成'
-        analysis_tasks[task_id]['result'] = results
+        analysis_tasks[task_id]['result'] = {'features': results, 'total': len(results)}
         
     except Exception as e:
         analysis_tasks[task_id]['status'] = 'failed'
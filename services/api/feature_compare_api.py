@@ -2,12 +2,15 @@
 from fastapi import APIRouter, HTTPException, Body
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
+import asyncio
 import logging
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from analyzers.feature_comparator import FeatureComparator
+from utils.llm_clients import llm_client, doc_processor
+from processors.document_store import document_store
 from config import settings
 
 logger = logging.getLogger(__name__)
@@ -17,19 +20,26 @@ router = APIRouter(prefix="/api/v1/feature", tags=["feature_compare"])
 class FeatureCompareRequest(BaseModel):
     """特征比对请求模型"""
     feature_text: str
-    compare_content: str
+    compare_content: Optional[str] = None  # 与compare_document_id二选一
+    compare_document_id: Optional[str] = None  # 已上传文档的ID
     user_input: Optional[str] = ""
     model_id: Optional[str] = None
     use_rag: Optional[bool] = False
     dataset_ids: Optional[List[str]] = None
+    hedge: Optional[bool] = None  # 慢请求是否向等效模型发出对冲请求，默认使用配置
+    bypass_cache: Optional[bool] = False  # 跳过LLM响应缓存，强制重新分析
+    context_token_budget: Optional[int] = None  # 对比内容的token预算，超出时只发送最相关的段落，默认使用配置
 
 
 class FeatureCompareImageRequest(BaseModel):
     """图文特征比对请求模型"""
     feature_text: str
-    compare_content: str
+    compare_content: Optional[str] = None
+    compare_document_id: Optional[str] = None
     image_paths: List[str]
     user_input: Optional[str] = ""
+    bypass_cache: Optional[bool] = False
+    context_token_budget: Optional[int] = None
 
 
 class FeatureCompareResponse(BaseModel):
@@ -42,8 +52,12 @@ class FeatureCompareResponse(BaseModel):
     similarity: Optional[float] = None
     main_differences: Optional[str] = None
     model_used: Optional[str] = None
+    hedged: Optional[bool] = None  # 结果是否来自对冲请求
+    cached: Optional[bool] = None  # 结果是否来自LLM响应缓存
+    coalesced: Optional[bool] = None  # 结果是否共享了同时进行的相同请求
     analysis_type: Optional[str] = None
     retrieved_docs: Optional[int] = None
+    context: Optional[Dict[str, Any]] = None  # 对比内容挑选报告：所选段落的偏移、得分和节省的token数
     message: Optional[str] = None
 
 
@@ -59,20 +73,32 @@ async def compare_features(request: FeatureCompareRequest):
         特征比对结果
     """
     try:
+        compare_content = document_store.resolve_content(
+            request.compare_content, request.compare_document_id
+        )
+        
         # 创建比对器实例
         comparator = FeatureComparator(model_id=request.model_id)
         
         # 执行比对
         result = await comparator.compare(
             feature_text=request.feature_text,
-            compare_content=request.compare_content,
+            compare_content=compare_content,
             user_input=request.user_input,
             use_rag=request.use_rag,
-            dataset_ids=request.dataset_ids
+            dataset_ids=request.dataset_ids,
+            hedge=request.hedge,
+            bypass_cache=request.bypass_cache,
+            context_token_budget=request.context_token_budget,
+            document_id=request.compare_document_id
         )
         
         return FeatureCompareResponse(**result)
         
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"特征比对API错误: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -90,19 +116,30 @@ async def compare_features_with_image(request: FeatureCompareImageRequest):
         特征比对结果
     """
     try:
+        compare_content = document_store.resolve_content(
+            request.compare_content, request.compare_document_id
+        )
+        
         # 创建比对器实例
         comparator = FeatureComparator()
         
         # 执行图文比对
         result = await comparator.compare_with_image(
             feature_text=request.feature_text,
-            compare_content=request.compare_content,
+            compare_content=compare_content,
             image_paths=request.image_paths,
-            user_input=request.user_input
+            user_input=request.user_input,
+            bypass_cache=request.bypass_cache,
+            context_token_budget=request.context_token_budget,
+            document_id=request.compare_document_id
         )
         
         return FeatureCompareResponse(**result)
         
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"图文特征比对API错误: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -111,9 +148,11 @@ async def compare_features_with_image(request: FeatureCompareImageRequest):
 @router.post("/compare_stream")
 async def compare_features_streaming(
     feature_text: str = Body(...),
-    compare_content: str = Body(...),
+    compare_content: Optional[str] = Body(default=None),
+    compare_document_id: Optional[str] = Body(default=None),
     user_input: str = Body(default=""),
-    model_id: Optional[str] = Body(default=None)
+    model_id: Optional[str] = Body(default=None),
+    context_token_budget: Optional[int] = Body(default=None)
 ):
     """
     流式执行特征比对分析
@@ -121,8 +160,10 @@ async def compare_features_streaming(
     Args:
         feature_text: 技术特征文本
         compare_content: 对比文件内容
+        compare_document_id: 已上传文档的ID（与compare_content二选一）
         user_input: 用户额外需求
         model_id: 模型ID
+        context_token_budget: 对比内容的token预算，超出时只发送最相关的段落
         
     Returns:
         Server-Sent Events流
@@ -130,6 +171,13 @@ async def compare_features_streaming(
     from fastapi.responses import StreamingResponse
     import json
     
+    try:
+        compare_content = document_store.resolve_content(compare_content, compare_document_id)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
     async def generate():
         try:
             # 创建比对器实例
@@ -139,7 +187,9 @@ async def compare_features_streaming(
             async for chunk in comparator.compare_streaming(
                 feature_text=feature_text,
                 compare_content=compare_content,
-                user_input=user_input
+                user_input=user_input,
+                context_token_budget=context_token_budget,
+                document_id=compare_document_id
             ):
                 # 转换为SSE格式
                 data = json.dumps(chunk, ensure_ascii=False)
@@ -206,6 +256,58 @@ async def get_available_models():
     }
 
 
+@router.get("/llm/limits")
+async def get_llm_rate_limits():
+    """
+    获取各LLM服务商的限流状态
+    
+    Returns:
+        每个服务商的并发上限、在途请求数、剩余配额和最近一分钟的实际吞吐，
+        各模型的p95延迟（对冲请求的等待时间），以及相同请求的合并统计
+    """
+    return {
+        "providers": llm_client.rate_limit_stats(),
+        "models": llm_client.latency_stats(),
+        "single_flight": llm_client.single_flight.stats()
+    }
+
+
+@router.get("/llm/cache")
+async def get_llm_cache_stats():
+    """
+    获取LLM响应缓存统计
+    
+    Returns:
+        两级缓存的条目数、命中次数和命中率
+    """
+    if llm_client.response_cache is None:
+        return {"enabled": False}
+    # 首次统计会打开SQLite，放到线程中执行
+    return {"enabled": True, **await asyncio.to_thread(llm_client.response_cache.stats)}
+
+
+@router.get("/rag/pool")
+async def get_rag_pool_stats():
+    """
+    获取RAGFlow HTTP连接池状态
+    
+    Returns:
+        连接池配置、在途请求数、客户端创建/关闭次数以及按HTTP版本统计的请求数
+    """
+    return doc_processor.pool_stats()
+
+
+@router.get("/rag/cache")
+async def get_rag_cache_stats():
+    """
+    获取RAG检索缓存统计
+    
+    Returns:
+        缓存条目数、命中次数、命中率以及合并的重复检索数
+    """
+    return doc_processor.retrieval_cache_stats()
+
+
 @router.get("/datasets")
 async def get_available_datasets():
     """
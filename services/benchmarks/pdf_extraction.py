@@ -0,0 +1,125 @@
+"""PDF并行提取基准测试
+
+统计不同进程数下 DocumentProcessor._extract_pdf 的吞吐（页/秒）。
+
+用法:
+    python benchmarks/pdf_extraction.py path/to/doc.pdf --workers 1 2 4 8
+    python benchmarks/pdf_extraction.py --generate 200   # 生成200页的测试PDF
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pdfplumber
+
+from processors.document_processor import DocumentProcessor
+
+
+def write_sample_pdf(path: str, pages: int, lines_per_page: int = 40):
+    """
+    生成仅包含文本的测试PDF
+
+    Args:
+        path: 输出路径
+        pages: 页数
+        lines_per_page: 每页文本行数
+    """
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # 页树，所有页面生成后回填
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_ids = []
+    for page_no in range(pages):
+        lines = [
+            f"({page_no + 1}-{line_no}: a processor executes program instructions "
+            f"stored in the memory) Tj T*".encode()
+            for line_no in range(lines_per_page)
+        ]
+        stream = b"BT /F1 9 Tf 11 TL 40 800 Td " + b" ".join(lines) + b" ET"
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects))
+    kids = b" ".join(b"%d 0 R" % pid for pid in page_ids)
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, pages)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for obj_id, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (obj_id, body)
+    xref_offset = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1, xref_offset
+    )
+    Path(path).write_bytes(bytes(out))
+
+
+def run(pdf_path: str, workers_list, repeat: int):
+    """执行基准测试并打印结果表"""
+    with pdfplumber.open(pdf_path) as pdf:
+        page_count = len(pdf.pages)
+
+    print(f"文件: {pdf_path}  页数: {page_count}  CPU: {os.cpu_count()}")
+    print(f"{'workers':>8} {'seconds':>10} {'pages/sec':>10} {'speedup':>8}")
+
+    baseline = None
+    for workers in workers_list:
+        processor = DocumentProcessor(pdf_workers=workers, pdf_parallel_min_pages=1)
+        try:
+            # 预热 forkserver 和文件缓存；每次提取独占一个进程池，计时包含子进程启动
+            processor._extract_pdf(Path(pdf_path))
+            elapsed = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                processor._extract_pdf(Path(pdf_path))
+                elapsed.append(time.perf_counter() - start)
+        finally:
+            processor.close()
+
+        best = min(elapsed)
+        baseline = baseline or best
+        print(f"{workers:>8} {best:>10.3f} {page_count / best:>10.1f} {baseline / best:>7.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PDF并行提取基准测试")
+    parser.add_argument("pdf", nargs="?", help="待测试的PDF文件")
+    parser.add_argument("--generate", type=int, default=0, help="生成指定页数的测试PDF")
+    parser.add_argument("--workers", type=int, nargs="+",
+                        help="要测试的进程数列表，默认 1 2 4 ... CPU核数")
+    parser.add_argument("--repeat", type=int, default=3, help="每组重复次数，取最快一次")
+    args = parser.parse_args()
+
+    workers_list = args.workers
+    if not workers_list:
+        cpu_count = os.cpu_count() or 1
+        workers_list = [1]
+        while workers_list[-1] * 2 <= cpu_count:
+            workers_list.append(workers_list[-1] * 2)
+
+    if args.pdf:
+        run(args.pdf, workers_list, args.repeat)
+    elif args.generate:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            pdf_path = os.path.join(tmp_dir, "sample.pdf")
+            write_sample_pdf(pdf_path, args.generate)
+            run(pdf_path, workers_list, args.repeat)
+    else:
+        parser.error("需要指定PDF文件或 --generate 页数")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""启动耗时报告
+
+在子进程中以 python -X importtime 导入应用入口，汇总总耗时、耗时最多的模块，
+并检查应当按需加载的重依赖是否在启动时被导入。
+
+用法:
+    python benchmarks/startup_report.py                # 默认导入 main
+    python benchmarks/startup_report.py --top 30
+    python benchmarks/startup_report.py --module api.feature_compare_api
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 应当在首次使用时才导入的依赖
+LAZY_MODULES = ('pandas', 'numpy', 'scipy', 'pdfplumber', 'docx', 'openai')
+
+
+def collect_import_times(module: str):
+    """
+    在子进程中导入模块并解析 -X importtime 输出
+
+    Args:
+        module: 要导入的模块名
+
+    Returns:
+        [(模块名, 自身耗时us, 累计耗时us, 嵌套层级)]，按导入完成顺序排列
+    """
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=SERVICE_DIR,
+        capture_output=True,
+        text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"导入 {module} 失败:\n{proc.stderr[-2000:]}")
+
+    records = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        records.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return records
+
+
+def run(module: str, top: int):
+    """输出启动耗时报告"""
+    records = collect_import_times(module)
+    loaded = {name for name, _, _, _ in records}
+    total_us = next((cumulative for name, _, cumulative, _ in records if name == module), 0)
+
+    print(f"导入 {module}: {total_us / 1000:.1f} ms, 共 {len(records)} 个模块")
+
+    print(f"\n累计耗时最多的 {top} 个顶层包:")
+    top_level = {}
+    for name, _, cumulative, depth in records:
+        if '.' not in name:
+            top_level[name] = max(top_level.get(name, 0), cumulative)
+    for name, cumulative in sorted(top_level.items(), key=lambda item: -item[1])[:top]:
+        print(f"  {cumulative / 1000:9.1f} ms  {name}")
+
+    print(f"\n自身耗时最多的 {top} 个模块:")
+    for name, self_us, _, _ in sorted(records, key=lambda r: -r[1])[:top]:
+        print(f"  {self_us / 1000:9.1f} ms  {name}")
+
+    eager = [name for name in LAZY_MODULES if name in loaded]
+    print("\n按需加载的依赖:", "全部未在启动时导入" if not eager else f"启动时已导入 {', '.join(eager)}")
+    return 1 if eager else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="应用启动导入耗时报告")
+    parser.add_argument('--module', default='main', help="要导入的模块（默认 main）")
+    parser.add_argument('--top', type=int, default=15, help="列出的模块数量")
+    args = parser.parse_args()
+    sys.exit(run(args.module, args.top))
+
+
+if __name__ == '__main__':
+    main()
@@ -55,8 +55,85 @@ class Settings(BaseSettings):
     
     # 文件上传配置
     MAX_UPLOAD_SIZE: int = 50 * 1024 * 1024  # 50MB
+    MAX_REQUEST_BODY_SIZE: int = 200 * 1024 * 1024  # 单个请求体上限（多文件上传合计），读取请求体时校验
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024  # 上传文件分块写盘大小
+    DOC_PROCESS_WORKERS: int = 4  # 文档处理线程池大小，上传的多个文件并发处理
     UPLOAD_DIR: str = "./uploads"
     ALLOWED_EXTENSIONS: set = {'.pdf', '.docx', '.doc', '.txt'}
+
+    # PDF并行提取配置
+    PDF_EXTRACT_WORKERS: int = 0  # 进程数，0或1表示逐页串行提取
+    PDF_PARALLEL_MIN_PAGES: int = 20  # 页数达到该值才启用并行提取
+    PDF_EXTRACT_TIMEOUT: float = 120.0  # 单个文档并行提取的超时时间（秒）
+
+    # 文档提取缓存配置（以文件内容哈希为键）
+    EXTRACTION_CACHE_ENABLED: bool = True
+    EXTRACTION_CACHE_DIR: str = "./cache/extraction"
+    EXTRACTION_CACHE_MAX_BYTES: int = 1024 * 1024 * 1024  # 1GB
+
+    # 文档存储配置（正文按内容哈希保存）
+    DOCUMENT_STORE_DIR: str = "./data/documents"
+
+    # 已处理文档保留配置（超出常驻上限的正文转存到文档存储）
+    PROCESSED_DOCS_MAX_RESIDENT_BYTES: int = 256 * 1024 * 1024  # 256MB，正文与其检索索引合计
+    PROCESSED_DOCS_MAX_ENTRIES: int = 1000
+    PROCESSED_DOCS_MAX_AGE: float = 24 * 3600  # 秒，0表示不限
+
+    # 特征匹配配置
+    MATCH_RANKING: str = "bm25"  # bm25: 按相关度排序; tfidf: 稀疏矩阵批量计算相似度; first: 取最先出现的命中句子
+    MATCH_TOP_K: int = 5  # bm25方式下每个特征选取的句子数量
+    MATCH_STATS_CACHE_SIZE: int = 64  # 缓存词项统计的文档数量
+    MATCH_WORKERS: int = 0  # 并行匹配的进程数，0或1表示串行匹配
+    MATCH_FEATURE_BLOCK_SIZE: int = 16  # 每个并行工作单元包含的特征数
+    MATCH_PARALLEL_MIN_PAIRS: int = 200  # 特征×文档数达到该值才启用并行匹配
+    MATCH_PARALLEL_TIMEOUT: float = 300.0  # 一次并行匹配的超时时间（秒），超时后结束子进程并改为串行，0表示不限
+    COMPARE_CONTEXT_TOKEN_BUDGET: int = 0  # 特征比对时对比内容的token预算，超出时只发送最相关的段落；0表示发送全文
+
+    # LLM分析配置
+    LLM_ANALYSIS_CONCURRENCY: int = 8  # 批量分析时同时进行的LLM调用数
+
+    # LLM限流配置（按服务商，RPM/TPM为0表示不限；并发上限遇到429或延迟突增时自动收缩）
+    LLM_MAIN_RPM: int = 600
+    LLM_MAIN_TPM: int = 0
+    LLM_MAIN_MAX_CONCURRENCY: int = 16
+    LLM_QWEN_RPM: int = 600
+    LLM_QWEN_TPM: int = 0
+    LLM_QWEN_MAX_CONCURRENCY: int = 16
+    LLM_DS_RPM: int = 600
+    LLM_DS_TPM: int = 0
+    LLM_DS_MAX_CONCURRENCY: int = 16
+    LLM_IMAGE_RPM: int = 120
+    LLM_IMAGE_TPM: int = 0
+    LLM_IMAGE_MAX_CONCURRENCY: int = 4
+    LLM_LATENCY_SPIKE_FACTOR: float = 2.0  # 延迟超过平均值的该倍数时收缩并发
+
+    # LLM重试与对冲配置（429、5xx、连接错误和超时按指数退避重试）
+    LLM_MAX_RETRIES: int = 3
+    LLM_RETRY_BASE_DELAY: float = 0.5  # 秒
+    LLM_RETRY_MAX_DELAY: float = 8.0  # 秒
+    LLM_HEDGE_ENABLED: bool = False  # 主请求超过p95延迟时向其他服务商的等效模型发出对冲请求
+    LLM_HEDGE_MIN_SAMPLES: int = 20  # 计算p95所需的最少样本数
+    LLM_HEDGE_DEFAULT_DELAY: float = 15.0  # 样本不足时的对冲等待时间（秒）
+
+    # LLM响应缓存配置（以模型、归一化消息和采样参数为键）
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_DB: str = "./cache/llm_responses.db"
+    LLM_CACHE_MEMORY_ENTRIES: int = 512
+    LLM_CACHE_TTL: float = 7 * 24 * 3600  # 秒，0表示不过期
+    LLM_CACHE_MAX_BYTES: int = 256 * 1024 * 1024  # 256MB
+
+    # RAGFlow HTTP连接池配置（进程内共用一个长连接客户端）
+    DOCUMENT_API_HTTP2: bool = True  # 需要安装h2，未安装时退回HTTP/1.1
+    DOCUMENT_API_MAX_CONNECTIONS: int = 20
+    DOCUMENT_API_MAX_KEEPALIVE: int = 10
+    DOCUMENT_API_KEEPALIVE_EXPIRY: float = 30.0  # 空闲连接保留时间（秒）
+
+    # RAGFlow检索配置（结果按查询、数据集和top_k缓存）
+    RAG_RETRIEVAL_CACHE_TTL: float = 600  # 秒，0表示不缓存
+    RAG_RETRIEVAL_CACHE_ENTRIES: int = 1024
+    RAG_RETRIEVAL_CONCURRENCY: int = 8  # 批量检索的最大并发请求数
+    RAG_UPLOAD_REGISTRY_DB: str = "./cache/ragflow_uploads.db"  # 各数据集已上传内容的哈希记录
+    RAG_UPLOAD_CONCURRENCY: int = 4  # 批量上传的最大并发请求数
     
     # 日志配置
     LOG_LEVEL: str = "INFO"
@@ -75,6 +152,3 @@ class Settings(BaseSettings):
 
 # 创建全局配置实例
 settings = Settings()
-
-# 确保上传目录存在
-os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
\ No newline at end of file
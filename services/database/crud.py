@@ -5,6 +5,7 @@ from sqlalchemy.orm import Session
 from sqlalchemy import func
 
 from models.feature import TechnicalFeature
+from models.document import Document
 
 
 class FeatureCRUD:
@@ -191,4 +192,62 @@ class FeatureCRUD:
             'total_features': total_count,
             'status_distribution': dict(status_counts),
             'claim_distribution': dict(claim_counts)
-        }
\ No newline at end of file
+        }
+
+
+class DocumentCRUD:
+    """对比文档CRUD操作"""
+    
+    @staticmethod
+    def get_or_create(db: Session, document_data: Dict[str, Any]) -> Document:
+        """
+        按文档ID获取文档，不存在时创建
+        
+        Args:
+            db: 数据库会话
+            document_data: 文档数据字典，必须包含document_id
+            
+        Returns:
+            文档对象
+        """
+        document = DocumentCRUD.get_by_id(db, document_data['document_id'])
+        if document:
+            return document
+        
+        db_obj = Document(**document_data)
+        db.add(db_obj)
+        db.commit()
+        db.refresh(db_obj)
+        return db_obj
+    
+    @staticmethod
+    def get_by_id(db: Session, document_id: str) -> Optional[Document]:
+        """
+        根据文档ID获取文档
+        
+        Args:
+            db: 数据库会话
+            document_id: 文档ID
+            
+        Returns:
+            文档对象或None
+        """
+        return db.query(Document).filter(
+            Document.document_id == document_id
+        ).first()
+    
+    @staticmethod
+    def get_by_ids(db: Session, document_ids: List[str]) -> List[Document]:
+        """
+        根据文档ID列表批量获取文档
+        
+        Args:
+            db: 数据库会话
+            document_ids: 文档ID列表
+            
+        Returns:
+            文档对象列表（不保证顺序）
+        """
+        return db.query(Document).filter(
+            Document.document_id.in_(document_ids)
+        ).all()
@@ -48,6 +48,7 @@ def get_db() -> Generator[Session, None, None]:
 def init_db():
     """初始化数据库，创建所有表"""
     from models.feature import Base
+    import models.document  # noqa: F401  注册documents表
     Base.metadata.create_all(bind=engine)
 
 
@@ -1,4 +1,5 @@
 """主程序入口"""
+import os
 import logging
 import uvicorn
 from fastapi import FastAPI
@@ -7,9 +8,12 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.responses import JSONResponse
 
 from config import settings
-from api.feature_api import router as feature_router
+from api.feature_api import router as feature_router, doc_processor, shutdown_doc_executor
 from api.feature_compare_api import router as feature_compare_router
+from analyzers.parallel_matcher import shutdown_match_pool
 from database.session import init_db
+from utils.llm_clients import llm_client, doc_processor as rag_processor
+from utils.body_limit import BodySizeLimitMiddleware
 
 # 配置日志
 logging.basicConfig(
@@ -41,6 +45,9 @@ app.add_middleware(
     allow_headers=settings.CORS_ALLOW_HEADERS,
 )
 
+# 请求体大小限制（multipart在进入路由前会被完整读取，需在读取时计数）
+app.add_middleware(BodySizeLimitMiddleware, max_body_size=settings.MAX_REQUEST_BODY_SIZE)
+
 # 注册路由
 app.include_router(feature_router)
 app.include_router(feature_compare_router)
@@ -54,6 +61,9 @@ async def startup_event():
     """应用启动事件"""
     logger.info(f"Starting {settings.APP_NAME} v{settings.APP_VERSION}")
     
+    # 确保上传目录存在
+    os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+    
     # 初始化数据库
     try:
         init_db()
@@ -72,6 +82,12 @@ async def startup_event():
 async def shutdown_event():
     """应用关闭事件"""
     logger.info("Shutting down application")
+    shutdown_doc_executor()
+    shutdown_match_pool()
+    doc_processor.close()
+    if llm_client.response_cache is not None:
+        llm_client.response_cache.close()
+    await rag_processor.aclose()
 
 
 @app.get("/")
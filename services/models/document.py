@@ -0,0 +1,35 @@
+"""文档数据模型"""
+from typing import Dict
+from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy.sql import func
+
+from models.feature import Base
+
+
+class Document(Base):
+    """已上传的对比文档，正文保存在文本存储中，以内容哈希作为文档ID"""
+    __tablename__ = 'documents'
+
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(String(64), index=True, unique=True)  # 文件内容SHA-256
+    
+    # 基础信息
+    filename = Column(String(255))  # 原始文件名
+    file_type = Column(String(20))  # 文件类型
+    language = Column(String(10))  # 语言
+    length = Column(Integer)  # 正文字符数
+    
+    # 时间戳
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    def to_dict(self) -> Dict:
+        """转换为字典"""
+        return {
+            'id': self.id,
+            'document_id': self.document_id,
+            'filename': self.filename,
+            'file_type': self.file_type,
+            'language': self.language,
+            'length': self.length,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
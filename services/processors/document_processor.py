@@ -1,32 +1,102 @@
 """文档处理器 - 处理各种格式的文档"""
 import os
+import math
+import codecs
 import logging
-from typing import Dict, List, Optional, Any
-import pdfplumber
-import docx
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Any, Tuple
 from pathlib import Path
 
+from config import settings
+from processors.extraction_cache import ExtractionCache
+from processors.document_store import document_store
+from processors.processed_docs import ProcessedDocs
+from processors.ngram_index import NGramIndex
+from processors.text_segmenter import SegmentIndex
+from utils.process_pool import kill_pool, process_context
+
 logger = logging.getLogger(__name__)
 
 
+def _extract_pdf_pages(file_path: str, start: int, end: int) -> List[str]:
+    """
+    提取PDF指定页码范围的文本（在子进程中执行）
+    
+    Args:
+        file_path: PDF文件路径
+        start: 起始页索引（包含）
+        end: 结束页索引（不包含）
+        
+    Returns:
+        按页顺序排列的文本列表
+    """
+    import pdfplumber
+    
+    texts = []
+    with pdfplumber.open(file_path) as pdf:
+        for page in pdf.pages[start:end]:
+            texts.append(page.extract_text() or '')
+    return texts
+
+
 class DocumentProcessor:
     """文档处理器，支持PDF、Word、TXT等格式"""
     
     SUPPORTED_FORMATS = {'.pdf', '.docx', '.doc', '.txt', '.text'}
+    ENCODING_SAMPLE_SIZE = 64 * 1024
     
-    def __init__(self):
-        """初始化文档处理器"""
-        self.processed_docs = []
+    def __init__(self,
+                 pdf_workers: Optional[int] = None,
+                 pdf_timeout: Optional[float] = None,
+                 pdf_parallel_min_pages: Optional[int] = None,
+                 extraction_cache: Optional[ExtractionCache] = None):
+        """
+        初始化文档处理器
+        
+        Args:
+            pdf_workers: PDF并行提取的进程数，默认使用配置中的PDF_EXTRACT_WORKERS
+            pdf_timeout: 单个PDF并行提取的超时时间（秒）
+            pdf_parallel_min_pages: 启用并行提取的最小页数
+            extraction_cache: 提取结果缓存，默认按配置创建
+        """
+        self.search_index = NGramIndex(n=2)
+        self.processed_docs = ProcessedDocs(
+            store=document_store,
+            max_resident_bytes=settings.PROCESSED_DOCS_MAX_RESIDENT_BYTES,
+            max_entries=settings.PROCESSED_DOCS_MAX_ENTRIES,
+            max_age=settings.PROCESSED_DOCS_MAX_AGE,
+            on_remove=self.search_index.remove,
+            # 正文转存后索引随之释放，检索时改为扫描磁盘上的正文
+            on_spill=self.search_index.remove
+        )
+        self.pdf_workers = settings.PDF_EXTRACT_WORKERS if pdf_workers is None else pdf_workers
+        self.pdf_timeout = settings.PDF_EXTRACT_TIMEOUT if pdf_timeout is None else pdf_timeout
+        self.pdf_parallel_min_pages = (
+            settings.PDF_PARALLEL_MIN_PAGES if pdf_parallel_min_pages is None
+            else pdf_parallel_min_pages
+        )
+        # 正在进行并行提取的进程池，每个文档独占一个，关闭时全部结束
+        self._pdf_pools = set()
+        self._pdf_pools_lock = threading.Lock()
+        
+        if extraction_cache is None and settings.EXTRACTION_CACHE_ENABLED:
+            extraction_cache = ExtractionCache(
+                settings.EXTRACTION_CACHE_DIR,
+                settings.EXTRACTION_CACHE_MAX_BYTES
+            )
+        self.extraction_cache = extraction_cache
         
-    def process_file(self, file_path: str) -> Dict[str, Any]:
+    def process_file(self, file_path: str, content_hash: Optional[str] = None) -> Dict[str, Any]:
         """
         处理单个文件
         
         Args:
             file_path: 文件路径
+            content_hash: 文件内容的SHA-256（可选，调用方已计算时传入以免重复读取）
             
         Returns:
-            处理后的文档数据
+            处理后的文档数据；命中提取缓存且文档存储中已有偏移索引时 segments_stored 为True
         """
         file_path = Path(file_path)
         
@@ -39,56 +109,106 @@ class DocumentProcessor:
             raise ValueError(f"不支持的文件格式: {file_ext}")
         
         try:
-            # 根据文件类型选择处理方法
-            if file_ext == '.pdf':
-                content = self._extract_pdf(file_path)
-            elif file_ext in ['.docx', '.doc']:
-                content = self._extract_word(file_path)
-            elif file_ext in ['.txt', '.text']:
-                content = self._extract_text(file_path)
+            cached = None
+            if self.extraction_cache is not None:
+                content_hash = content_hash or ExtractionCache.hash_file(file_path)
+                cached = self.extraction_cache.get(content_hash)
+            
+            if cached is not None:
+                content = cached['content']
+                language = cached['language']
             else:
-                content = ""
+                # 根据文件类型选择处理方法
+                if file_ext == '.pdf':
+                    content = self._extract_pdf(file_path)
+                elif file_ext in ['.docx', '.doc']:
+                    content = self._extract_word(file_path)
+                elif file_ext in ['.txt', '.text']:
+                    content = self._extract_text(file_path)
+                else:
+                    content = ""
+                language = self._detect_language(content)
+                
+                if self.extraction_cache is not None:
+                    self.extraction_cache.put(content_hash, {
+                        'content': content,
+                        'language': language,
+                        'length': len(content)
+                    })
+            
+            # 重复上传时复用文档存储中已保存的偏移索引
+            segments = document_store.load_segments(content_hash) if cached is not None else None
+            segments_stored = segments is not None
             
             doc_data = {
                 'filename': file_path.name,
                 'filepath': str(file_path),
                 'content': content,
                 'file_type': file_ext,
-                'language': self._detect_language(content),
-                'length': len(content)
+                'language': language,
+                'length': len(content),
+                'content_hash': content_hash,
+                'cached': cached is not None,
+                'segments': segments if segments_stored else SegmentIndex.build(content),
+                'segments_stored': segments_stored
             }
             
-            self.processed_docs.append(doc_data)
+            # 索引先建好，其字节数与正文一起计入保留区的常驻上限；已索引的相同内容直接复用
+            key = ProcessedDocs.content_key(doc_data)
+            index_bytes = self.search_index.doc_bytes(key)
+            if index_bytes is None:
+                index_bytes = self.search_index.add(key, content)
+            self.processed_docs.add(doc_data, extra_bytes=index_bytes)
             return doc_data
             
         except Exception as e:
             logger.error(f"处理文件失败 {file_path}: {str(e)}")
             raise
     
-    def process_files(self, file_paths: List[str]) -> List[Dict[str, Any]]:
+    def process_files(self,
+                      file_paths: List[str],
+                      parallel: bool = False,
+                      max_workers: Optional[int] = None) -> List[Dict[str, Any]]:
         """
         批量处理文件
         
         Args:
             file_paths: 文件路径列表
+            parallel: 是否并发处理多个文件
+            max_workers: 并发线程数，默认使用配置中的DOC_PROCESS_WORKERS
             
         Returns:
-            处理后的文档数据列表
+            处理后的文档数据列表，顺序与输入一致，单个文件失败时对应项包含error字段
         """
-        results = []
-        for file_path in file_paths:
-            try:
-                doc_data = self.process_file(file_path)
-                results.append(doc_data)
-            except Exception as e:
-                logger.error(f"处理文件失败 {file_path}: {str(e)}")
-                results.append({
-                    'filename': os.path.basename(file_path),
-                    'filepath': file_path,
-                    'content': '',
-                    'error': str(e)
-                })
-        return results
+        if parallel and len(file_paths) > 1:
+            max_workers = min(max_workers or settings.DOC_PROCESS_WORKERS, len(file_paths))
+            with ThreadPoolExecutor(max_workers=max_workers,
+                                    thread_name_prefix='doc-processor') as executor:
+                return list(executor.map(self.process_file_safe, file_paths))
+        
+        return [self.process_file_safe(file_path) for file_path in file_paths]
+    
+    def process_file_safe(self, file_path: str, content_hash: Optional[str] = None) -> Dict[str, Any]:
+        """
+        处理单个文件，失败时返回包含错误信息的结果而不抛出异常
+        
+        Args:
+            file_path: 文件路径
+            content_hash: 文件内容的SHA-256（可选）
+            
+        Returns:
+            处理后的文档数据
+        """
+        try:
+            return self.process_file(file_path, content_hash=content_hash)
+        except Exception as e:
+            logger.error(f"处理文件失败 {file_path}: {str(e)}")
+            return {
+                'filename': os.path.basename(file_path),
+                'filepath': file_path,
+                'content': '',
+                'error': str(e)
+            }
     
     def _extract_pdf(self, file_path: Path) -> str:
         """
@@ -100,19 +220,92 @@ class DocumentProcessor:
         Returns:
             提取的文本内容
         """
+        import pdfplumber
+        
         text = []
         try:
             with pdfplumber.open(file_path) as pdf:
-                for page in pdf.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text.append(page_text)
+                page_count = len(pdf.pages)
+                use_parallel = (self.pdf_workers > 1
+                                and page_count >= self.pdf_parallel_min_pages)
+                if not use_parallel:
+                    for page in pdf.pages:
+                        page_text = page.extract_text()
+                        if page_text:
+                            text.append(page_text)
+            
+            # 页数较多时按页码范围分发到进程池
+            if use_parallel:
+                text = [t for t in self._extract_pdf_parallel(file_path, page_count) if t]
         except Exception as e:
             logger.error(f"PDF提取失败: {str(e)}")
             raise
         
         return '\n'.join(text)
     
+    def _extract_pdf_parallel(self, file_path: Path, page_count: int) -> List[str]:
+        """
+        使用进程池并行提取PDF文本
+        
+        Args:
+            file_path: PDF文件路径
+            page_count: PDF总页数
+            
+        Returns:
+            按页顺序排列的文本列表
+        """
+        # 每个进程分配两段页码范围，避免页面耗时不均导致个别进程拖尾
+        chunk_count = min(page_count, self.pdf_workers * 2)
+        chunk_size = math.ceil(page_count / chunk_count)
+        ranges = [(start, min(start + chunk_size, page_count))
+                  for start in range(0, page_count, chunk_size)]
+        
+        try:
+            chunks = self._run_in_pool(_extract_pdf_pages,
+                                       [(str(file_path), start, end) for start, end in ranges])
+        except TimeoutError as e:
+            raise TimeoutError(
+                f"PDF提取超时({self.pdf_timeout}s): {file_path.name}, 已完成 {e} 个页码段"
+            ) from None
+        
+        texts = []
+        for chunk in chunks:
+            texts.extend(chunk)
+        return texts
+    
+    def _run_in_pool(self, fn: Callable, arg_list: List[Tuple]) -> List[Any]:
+        """
+        在本次调用独占的进程池中执行一组任务
+        
+        进程池使用 forkserver/spawn 方式启动；超时后直接结束该进程池的全部子进程，
+        卡住的任务随之终止，其他文档的提取不受影响。
+        
+        Args:
+            fn: 在子进程中执行的函数
+            arg_list: 每个任务的参数
+            
+        Returns:
+            按arg_list顺序排列的结果
+            
+        Raises:
+            TimeoutError: 超过pdf_timeout仍未全部完成，异常信息为“已完成数/总数”
+        """
+        pool = ProcessPoolExecutor(max_workers=min(self.pdf_workers, len(arg_list)),
+                                   mp_context=process_context())
+        with self._pdf_pools_lock:
+            self._pdf_pools.add(pool)
+        try:
+            futures = [pool.submit(fn, *args) for args in arg_list]
+            done, not_done = wait(futures, timeout=self.pdf_timeout)
+            if not_done:
+                kill_pool(pool)
+                raise TimeoutError(f"{len(done)}/{len(futures)}")
+            return [future.result() for future in futures]
+        finally:
+            with self._pdf_pools_lock:
+                self._pdf_pools.discard(pool)
+            pool.shutdown(wait=False, cancel_futures=True)
+    
     def _extract_word(self, file_path: Path) -> str:
         """
         提取Word文档文本
@@ -123,6 +316,8 @@ class DocumentProcessor:
         Returns:
             提取的文本内容
         """
+        import docx
+        
         try:
             doc = docx.Document(file_path)
             text = []
@@ -152,6 +347,8 @@ class DocumentProcessor:
         """
         提取纯文本文件内容
         
+        只读取一次文件：先根据开头的样本检测编码，再整体解码一次。
+        
         Args:
             file_path: 文本文件路径
             
@@ -159,24 +356,88 @@ class DocumentProcessor:
             文件内容
         """
         try:
-            # 尝试不同的编码
-            encodings = ['utf-8', 'gbk', 'gb2312', 'gb18030', 'big5', 'latin1']
+            data = file_path.read_bytes()
+            encoding, bom_length = self._detect_encoding(data[:self.ENCODING_SAMPLE_SIZE])
+            data = data[bom_length:]
+            
+            try:
+                return data.decode(encoding)
+            except UnicodeDecodeError as e:
+                # 样本之后才出现的非ASCII内容与样本编码不符（如开头是纯ASCII的GBK/Big5文件），
+                # 从出错位置重新取样检测，再依次退回到更宽松的编码
+                retry, _ = self._detect_encoding(data[e.start:e.start + self.ENCODING_SAMPLE_SIZE])
             
-            for encoding in encodings:
+            fallbacks = [retry] + [e for e in ('gb18030', 'latin1') if e not in (retry, encoding)]
+            for candidate in fallbacks:
                 try:
-                    with open(file_path, 'r', encoding=encoding) as f:
-                        return f.read()
+                    return data.decode(candidate)
                 except UnicodeDecodeError:
                     continue
-            
-            # 如果所有编码都失败，使用错误处理
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                return f.read()
+            return data.decode('utf-8', errors='ignore')
                 
         except Exception as e:
             logger.error(f"文本文件提取失败: {str(e)}")
             raise
     
+    @staticmethod
+    def _detect_encoding(sample: bytes) -> Tuple[str, int]:
+        """
+        根据文件开头的样本检测编码
+        
+        依次检查BOM、UTF-8合法性，再根据双字节统计区分GB18030与Big5。
+        
+        Args:
+            sample: 文件开头的字节
+            
+        Returns:
+            (编码名称, BOM长度)
+        """
+        for bom, encoding in ((codecs.BOM_UTF8, 'utf-8'),
+                              (codecs.BOM_UTF32_LE, 'utf-32'),
+                              (codecs.BOM_UTF32_BE, 'utf-32'),
+                              (codecs.BOM_UTF16_LE, 'utf-16'),
+                              (codecs.BOM_UTF16_BE, 'utf-16')):
+            if sample.startswith(bom):
+                # utf-16/utf-32 解码器自行处理BOM
+                return encoding, len(bom) if encoding == 'utf-8' else 0
+        
+        if sample.isascii():
+            return 'utf-8', 0
+        
+        # 样本末尾可能截断多字节字符，使用增量解码器容忍不完整的结尾
+        try:
+            codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+            return 'utf-8', 0
+        except UnicodeDecodeError:
+            pass
+        
+        # 统计双字节字符：Big5约四成常用字的尾字节落在0x40-0x7E，
+        # 而GB2312/GBK文本中该区间只出现在罕用的扩展字符里
+        pairs = 0
+        low_trail_pairs = 0
+        i = 0
+        length = len(sample) - 1
+        while i < length:
+            if sample[i] >= 0x81:
+                pairs += 1
+                if 0x40 <= sample[i + 1] <= 0x7E:
+                    low_trail_pairs += 1
+                i += 2
+            else:
+                i += 1
+        
+        candidates = ['gb18030', 'big5']
+        if pairs and low_trail_pairs / pairs > 0.2:
+            candidates.reverse()
+        
+        for encoding in candidates:
+            try:
+                codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+                return encoding, 0
+            except UnicodeDecodeError:
+                continue
+        return 'latin1', 0
+    
     def _detect_language(self, text: str) -> str:
         """
         检测文本语言
@@ -195,40 +456,115 @@ class DocumentProcessor:
         else:
             return 'en'
     
+    def cache_stats(self) -> Dict[str, Any]:
+        """获取提取缓存的命中统计"""
+        if self.extraction_cache is None:
+            return {'enabled': False}
+        return {'enabled': True, **self.extraction_cache.stats()}
+    
+    def close(self):
+        """释放进程池等资源，结束仍在进行的并行提取"""
+        with self._pdf_pools_lock:
+            pools = list(self._pdf_pools)
+        for pool in pools:
+            kill_pool(pool)
+    
     def clear(self):
         """清空已处理的文档"""
-        self.processed_docs = []
+        self.processed_docs.clear()
     
     def get_processed_docs(self) -> List[Dict[str, Any]]:
-        """获取所有已处理的文档"""
-        return self.processed_docs
+        """获取所有已处理的文档（已转存到磁盘的正文会被重新读入）"""
+        return list(self.processed_docs)
+    
+    def memory_stats(self) -> Dict[str, Any]:
+        """获取已处理文档的内存占用统计"""
+        return {
+            **self.processed_docs.stats(),
+            'search_index_bytes': self.search_index.memory_bytes(),
+            'indexed_docs': len(self.search_index)
+        }
     
-    def search_in_docs(self, keyword: str) -> List[Dict[str, Any]]:
+    def search_in_docs(self, keyword: str, context_chars: int = 100) -> List[Dict[str, Any]]:
         """
         在已处理的文档中搜索关键词
         
         Args:
             keyword: 搜索关键词
+            context_chars: 命中位置前后截取的上下文字符数
             
         Returns:
-            包含关键词的文档列表
+            包含关键词的文档列表，每个文档包含全部命中位置及其上下文
         """
+        if not keyword:
+            return []
+        
+        if len(keyword) < self.search_index.n:
+            hits_by_doc = self._scan_keyword(keyword)
+        else:
+            hits_by_doc = self.search_index.search(keyword)
+            # 正文已转存到磁盘的文档不保留索引，逐个扫描
+            unindexed = [key for key in self.processed_docs.keys() if key not in self.search_index]
+            if unindexed:
+                hits_by_doc.update(self._scan_keyword(keyword, unindexed))
+        
         results = []
-        for doc in self.processed_docs:
-            if keyword.lower() in doc.get('content', '').lower():
-                # 找到关键词前后的上下文
-                content = doc['content']
-                keyword_pos = content.lower().find(keyword.lower())
-                
-                # 提取上下文（前后各100个字符）
-                start = max(0, keyword_pos - 100)
-                end = min(len(content), keyword_pos + len(keyword) + 100)
-                context = content[start:end]
+        for key in self.processed_docs.keys():
+            positions = hits_by_doc.get(key)
+            if not positions:
+                continue
+            doc = self.processed_docs.get(key)
+            if doc is None:
+                continue
+            
+            content = doc['content']
+            segments = doc.get('segments')
+            hits = []
+            for position in positions:
+                # 提取上下文（前后各context_chars个字符）
+                start = max(0, position - context_chars)
+                end = min(len(content), position + len(keyword) + context_chars)
+                hit = {'position': position, 'context': content[start:end]}
                 
-                results.append({
-                    'filename': doc['filename'],
-                    'context': context,
-                    'position': keyword_pos
-                })
+                # 附带命中位置所在的完整句子
+                if segments is not None:
+                    sentence_index = segments.sentence_at(position)
+                    if sentence_index >= 0:
+                        hit['sentence'] = segments.sentence(content, sentence_index)
+                hits.append(hit)
+            
+            results.append({
+                'filename': doc['filename'],
+                'context': hits[0]['context'],
+                'position': hits[0]['position'],
+                'hits': hits
+            })
+        
+        return results
+    
+    def _scan_keyword(self, keyword: str, keys: Optional[List[str]] = None) -> Dict[str, List[int]]:
+        """
+        线性扫描查找关键词（关键词过短无法使用n-gram索引，或文档索引已随正文转存释放）
         
-        return results
\ No newline at end of file
+        Args:
+            keyword: 搜索关键词
+            keys: 要扫描的文档键，默认扫描全部文档
+            
+        Returns:
+            {文档键: 命中位置列表}
+        """
+        keyword = keyword.lower()
+        hits_by_doc = {}
+        for key in self.processed_docs.keys() if keys is None else keys:
+            doc = self.processed_docs.get(key)
+            if doc is None:
+                continue
+            content = doc['content'].lower()
+            positions = []
+            position = content.find(keyword)
+            while position != -1:
+                positions.append(position)
+                position = content.find(keyword, position + 1)
+            if positions:
+                hits_by_doc[key] = positions
+        return hits_by_doc
@@ -0,0 +1,163 @@
+"""文档文本存储 - 以内容哈希为键的磁盘正文存储"""
+import os
+import logging
+from pathlib import Path
+from typing import Optional
+
+from config import settings
+from processors.text_segmenter import SegmentIndex
+
+logger = logging.getLogger(__name__)
+
+
+class DocumentStore:
+    """
+    文档正文的磁盘存储
+
+    正文以UTF-8保存为 <root>/<id前两位>/<id>.txt，句子/段落偏移索引保存在同名 .seg 文件中。
+    """
+
+    def __init__(self, root_dir: str):
+        """
+        初始化存储
+
+        Args:
+            root_dir: 存储根目录
+        """
+        self.root_dir = Path(root_dir)
+
+    def put(self, document_id: str, content: str) -> Path:
+        """
+        保存文档正文，已存在时直接返回
+
+        Args:
+            document_id: 文档ID（内容哈希）
+            content: 文档正文
+
+        Returns:
+            正文文件路径
+        """
+        path = self.path_for(document_id)
+        if path.exists():
+            return path
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+        tmp_path.write_bytes(content.encode('utf-8'))
+        os.replace(tmp_path, path)
+        return path
+
+    def get(self, document_id: str) -> Optional[str]:
+        """
+        读取文档正文
+
+        Args:
+            document_id: 文档ID
+
+        Returns:
+            文档正文，不存在时返回None
+        """
+        path = self.path_for(document_id)
+        try:
+            # 按字节读取后解码，不做换行符转换，保证与写入的正文逐字符一致
+            return path.read_bytes().decode('utf-8')
+        except FileNotFoundError:
+            return None
+
+    def put_segments(self, document_id: str, segments: SegmentIndex) -> Path:
+        """
+        保存文档的句子/段落偏移索引
+
+        Args:
+            document_id: 文档ID
+            segments: 偏移索引
+
+        Returns:
+            索引文件路径
+        """
+        path = self.path_for(document_id).with_suffix('.seg')
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+        tmp_path.write_bytes(segments.to_bytes())
+        os.replace(tmp_path, path)
+        return path
+
+    def load_segments(self, document_id: str) -> Optional[SegmentIndex]:
+        """
+        读取已保存的句子/段落偏移索引，不重新计算
+
+        Args:
+            document_id: 文档ID
+
+        Returns:
+            偏移索引，不存在或格式过期时返回None
+        """
+        path = self.path_for(document_id).with_suffix('.seg')
+        try:
+            return SegmentIndex.from_bytes(path.read_bytes())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def get_segments(self, document_id: str) -> Optional[SegmentIndex]:
+        """
+        读取文档的句子/段落偏移索引，不存在或格式过期时根据正文重新计算并保存
+
+        Args:
+            document_id: 文档ID
+
+        Returns:
+            偏移索引，文档不存在时返回None
+        """
+        segments = self.load_segments(document_id)
+        if segments is not None:
+            return segments
+
+        content = self.get(document_id)
+        if content is None:
+            return None
+        segments = SegmentIndex.build(content)
+        self.put_segments(document_id, segments)
+        return segments
+
+    def resolve_content(self, content: Optional[str], document_id: Optional[str]) -> str:
+        """
+        解析请求中的对比文件正文：优先使用文档ID，其次使用内联正文
+
+        Args:
+            content: 内联正文
+            document_id: 文档ID
+
+        Returns:
+            文档正文
+        """
+        if document_id:
+            text = self.get(document_id)
+            if text is None:
+                raise FileNotFoundError(f"文档不存在: {document_id}")
+            return text
+
+        if content is None:
+            raise ValueError("需要提供对比文件内容或文档ID")
+        return content
+
+    def exists(self, document_id: str) -> bool:
+        """判断文档正文是否存在"""
+        return self.path_for(document_id).exists()
+
+    def path_for(self, document_id: str) -> Path:
+        """
+        获取文档正文文件路径
+
+        Args:
+            document_id: 文档ID
+
+        Returns:
+            正文文件路径
+        """
+        if not document_id or not document_id.isalnum():
+            raise ValueError(f"非法的文档ID: {document_id}")
+        return self.root_dir / document_id[:2] / f"{document_id}.txt"
+
+
+# 创建全局实例
+document_store = DocumentStore(settings.DOCUMENT_STORE_DIR)
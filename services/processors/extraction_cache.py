@@ -0,0 +1,179 @@
+"""文档提取结果缓存 - 以文件内容哈希为键的磁盘缓存"""
+import os
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ExtractionCache:
+    """
+    文档提取结果的磁盘缓存
+
+    以文件字节的SHA-256为键保存提取出的文本、语言和长度，
+    总大小超过上限时按最近最少使用（LRU）顺序淘汰。
+    """
+
+    HASH_CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        """
+        初始化缓存
+
+        Args:
+            cache_dir: 缓存目录
+            max_bytes: 缓存文件总大小上限（字节）
+        """
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+        self._load_index()
+
+    @classmethod
+    def hash_file(cls, file_path: str) -> str:
+        """
+        计算文件内容的SHA-256
+
+        Args:
+            file_path: 文件路径
+
+        Returns:
+            十六进制哈希值
+        """
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(cls.HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        读取缓存
+
+        Args:
+            key: 文件内容哈希
+
+        Returns:
+            缓存的提取结果，未命中时返回None
+        """
+        path = self._entry_path(key)
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            # 更新修改时间，重启后据此恢复LRU顺序
+            os.utime(path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取提取缓存失败 {key}: {str(e)}")
+            with self._lock:
+                self._drop(key)
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key: str, data: Dict[str, Any]):
+        """
+        写入缓存
+
+        Args:
+            key: 文件内容哈希
+            data: 提取结果（content、language、length等）
+        """
+        payload = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        if len(payload) > self.max_bytes:
+            return
+
+        path = self._entry_path(key)
+        tmp_path = path.with_suffix('.tmp')
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path.write_bytes(payload)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"写入提取缓存失败 {key}: {str(e)}")
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._total_bytes -= self._entries[key]
+            self._entries[key] = len(payload)
+            self._entries.move_to_end(key)
+            self._total_bytes += len(payload)
+            self._evict()
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            for key in list(self._entries):
+                self._drop(key)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'total_bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+    def _entry_path(self, key: str) -> Path:
+        """缓存条目的文件路径"""
+        return self.cache_dir / f"{key}.json"
+
+    def _load_index(self):
+        """扫描缓存目录，按修改时间恢复LRU顺序"""
+        if not self.cache_dir.is_dir():
+            return
+
+        entries = []
+        for path in self.cache_dir.glob('*.json'):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, path.stem, stat.st_size))
+
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+            self._total_bytes += size
+        self._evict()
+
+    def _evict(self):
+        """淘汰最久未使用的条目直到总大小不超过上限（需持有锁）"""
+        while self._total_bytes > self.max_bytes and self._entries:
+            key = next(iter(self._entries))
+            self._drop(key)
+            self.evictions += 1
+
+    def _drop(self, key: str):
+        """删除单个条目（需持有锁）"""
+        size = self._entries.pop(key, None)
+        if size is not None:
+            self._total_bytes -= size
+        try:
+            self._entry_path(key).unlink()
+        except OSError:
+            pass
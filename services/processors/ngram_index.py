@@ -0,0 +1,186 @@
+"""字符n-gram倒排索引 - 支持中文的增量关键词检索"""
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+
+class _DocPostings:
+    """
+    单个文档的倒排表（紧凑存储）
+
+    n-gram按字典序存放在一个列表中，全部位置拼接为一个数组，starts[i]:starts[i+1]
+    为第i个n-gram的位置区间；相比每个n-gram一个字典和一个数组，省去了大量对象开销。
+    """
+
+    __slots__ = ('grams', 'starts', 'offsets', 'nbytes')
+
+    def __init__(self, positions: Dict[str, List[int]]):
+        """
+        构建倒排表
+
+        Args:
+            positions: {n-gram: 升序位置列表}
+        """
+        self.grams = sorted(positions)
+        self.starts = array('I', [0])
+        self.offsets = array('I')
+        for gram in self.grams:
+            self.offsets.extend(positions[gram])
+            self.starts.append(len(self.offsets))
+        self.nbytes = (sys.getsizeof(self) + sys.getsizeof(self.grams)
+                       + sum(sys.getsizeof(gram) for gram in self.grams)
+                       + sys.getsizeof(self.starts) + sys.getsizeof(self.offsets))
+
+    def span(self, gram: str) -> Optional[Tuple[int, int]]:
+        """n-gram的位置区间，不存在时返回None"""
+        i = bisect_left(self.grams, gram)
+        if i < len(self.grams) and self.grams[i] == gram:
+            return self.starts[i], self.starts[i + 1]
+        return None
+
+
+class NGramIndex:
+    """
+    字符n-gram倒排索引
+
+    每个n-gram记录它在各文档（小写化后）中出现的全部起始位置。检索时取关键词中
+    覆盖全部字符的若干n-gram，以最稀有的n-gram为锚点，用二分查找校验其余n-gram
+    是否出现在对应偏移上，无需扫描文档正文。
+    """
+
+    def __init__(self, n: int = 2):
+        """
+        初始化索引
+
+        Args:
+            n: n-gram长度
+        """
+        self.n = n
+        self._docs: Dict[str, _DocPostings] = {}
+        self._lock = threading.Lock()
+
+    def add(self, key: str, text: str) -> int:
+        """
+        将文档加入索引，已存在时替换旧索引
+
+        Args:
+            key: 文档键
+            text: 文档正文
+
+        Returns:
+            该文档索引占用的字节数
+        """
+        text = self._normalize(text)
+        n = self.n
+        positions = defaultdict(list)
+        for i in range(len(text) - n + 1):
+            positions[text[i:i + n]].append(i)
+        postings = _DocPostings(positions)
+
+        with self._lock:
+            self._docs[key] = postings
+        return postings.nbytes
+
+    def remove(self, key: str):
+        """
+        从索引中移除文档
+
+        Args:
+            key: 文档键
+        """
+        with self._lock:
+            self._docs.pop(key, None)
+
+    def search(self, keyword: str) -> Dict[str, List[int]]:
+        """
+        检索关键词的全部出现位置
+
+        Args:
+            keyword: 关键词，长度需不小于n
+
+        Returns:
+            {文档键: 升序排列的字符位置列表}
+        """
+        keyword = self._normalize(keyword)
+        n = self.n
+        if len(keyword) < n:
+            raise ValueError(f"关键词长度不能小于 {n}")
+
+        # 选取覆盖关键词全部字符的n-gram偏移
+        offsets = list(range(0, len(keyword) - n + 1, n))
+        if offsets[-1] != len(keyword) - n:
+            offsets.append(len(keyword) - n)
+        grams = [(offset, keyword[offset:offset + n]) for offset in offsets]
+
+        # 倒排表建成后不再修改，取快照后在锁外检索
+        with self._lock:
+            docs = list(self._docs.items())
+
+        results = {}
+        for key, postings in docs:
+            spans = []
+            for offset, gram in grams:
+                span = postings.span(gram)
+                if span is None:
+                    break
+                spans.append((offset, span[0], span[1]))
+            else:
+                spans.sort(key=lambda item: item[2] - item[1])
+                anchor_offset, lo, hi = spans[0]
+                positions = postings.offsets
+                hits = []
+                for pos in positions[lo:hi]:
+                    start = pos - anchor_offset
+                    if start < 0:
+                        continue
+                    if all(self._contains(positions, lo2, hi2, start + offset)
+                           for offset, lo2, hi2 in spans[1:]):
+                        hits.append(start)
+                if hits:
+                    results[key] = hits
+        return results
+
+    def doc_bytes(self, key: str) -> Optional[int]:
+        """
+        已索引文档占用的字节数
+
+        Args:
+            key: 文档键
+
+        Returns:
+            字节数，文档未索引时返回None
+        """
+        with self._lock:
+            postings = self._docs.get(key)
+        return None if postings is None else postings.nbytes
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._docs
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def memory_bytes(self) -> int:
+        """估算索引占用的字节数（含列表、n-gram字符串和位置数组）"""
+        with self._lock:
+            return sys.getsizeof(self._docs) + sum(
+                sys.getsizeof(key) + postings.nbytes for key, postings in self._docs.items()
+            )
+
+    @staticmethod
+    def _contains(positions: array, lo: int, hi: int, value: int) -> bool:
+        """在升序位置数组的[lo, hi)区间中查找"""
+        i = bisect_left(positions, value, lo, hi)
+        return i < hi and positions[i] == value
+
+    @staticmethod
+    def _normalize(text: str) -> str:
+        """小写化，保证与原文逐字符对齐"""
+        lowered = text.lower()
+        if len(lowered) == len(text):
+            return lowered
+        # 个别字符小写后长度变化时逐字符处理，保持位置不变
+        return ''.join(c if len(c.lower()) != 1 else c.lower() for c in text)
@@ -0,0 +1,229 @@
+"""已处理文档的有界保留区"""
+import sys
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Iterator, List, Optional, Callable
+
+from processors.document_store import DocumentStore
+
+logger = logging.getLogger(__name__)
+
+
+class _Entry:
+    """保留区条目：元数据常驻内存，正文可能已转存到磁盘"""
+
+    __slots__ = ('key', 'meta', 'content', 'size', 'added_at')
+
+    def __init__(self, key: str, meta: Dict[str, Any], content: str, extra_bytes: int = 0):
+        self.key = key
+        self.meta = meta
+        self.content = content
+        # 正文和随正文一起释放的附属数据（如检索索引）
+        self.size = sys.getsizeof(content) + extra_bytes
+        self.added_at = time.monotonic()
+
+
+class ProcessedDocs:
+    """
+    已处理文档的有界保留区
+
+    - 常驻内存的正文（连同加入时登记的附属数据字节数）超过上限时，最早加入的正文
+      转存到文档存储，仅保留元数据，并通过 on_spill 通知释放附属数据
+    - 条目数超过上限或存活时间超过上限时整条淘汰
+    上传接口已按内容哈希写入文档存储时，转存不会产生额外写盘。
+    """
+
+    def __init__(self,
+                 store: DocumentStore,
+                 max_resident_bytes: int,
+                 max_entries: int,
+                 max_age: float,
+                 on_remove: Optional[Callable[[str], None]] = None,
+                 on_spill: Optional[Callable[[str], None]] = None):
+        """
+        初始化保留区
+
+        Args:
+            store: 正文转存使用的文档存储
+            max_resident_bytes: 常驻内存正文及附属数据的字节上限
+            max_entries: 最大条目数
+            max_age: 条目最长保留时间（秒），0表示不限
+            on_remove: 条目被移除或淘汰时的回调，参数为条目键
+            on_spill: 条目正文转存到磁盘后的回调，参数为条目键
+        """
+        self.store = store
+        self.max_resident_bytes = max_resident_bytes
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.on_remove = on_remove
+        self.on_spill = on_spill
+        self.spills = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._resident_bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def resident_bytes(self) -> int:
+        """常驻内存的正文及附属数据字节数"""
+        return self._resident_bytes
+
+    @staticmethod
+    def content_key(doc_data: Dict[str, Any]) -> str:
+        """
+        文档的条目键
+
+        Args:
+            doc_data: process_file 返回的文档数据
+
+        Returns:
+            内容哈希，未提供时按正文计算
+        """
+        return (doc_data.get('content_hash')
+                or hashlib.sha256(doc_data.get('content', '').encode('utf-8')).hexdigest())
+
+    def add(self, doc_data: Dict[str, Any], extra_bytes: int = 0) -> str:
+        """
+        加入一个已处理文档，相同内容重复加入时只刷新位置
+
+        Args:
+            doc_data: process_file 返回的文档数据
+            extra_bytes: 随正文常驻、转存时一并释放的附属数据字节数（计入常驻上限）
+
+        Returns:
+            条目键（内容哈希）
+        """
+        content = doc_data.get('content', '')
+        key = self.content_key(doc_data)
+        meta = {k: v for k, v in doc_data.items() if k != 'content'}
+
+        with self._lock:
+            # 键即内容哈希，替换同键条目时内容不变，不触发 on_remove
+            old = self._entries.pop(key, None)
+            if old is not None and old.content is not None:
+                self._resident_bytes -= old.size
+            entry = _Entry(key, meta, content, extra_bytes)
+            self._entries[key] = entry
+            self._resident_bytes += entry.size
+            self._expire()
+            self._spill()
+        return key
+
+    def remove(self, key: str) -> bool:
+        """
+        移除条目
+
+        Args:
+            key: 条目键
+
+        Returns:
+            是否存在并已移除
+        """
+        with self._lock:
+            return self._remove(key) is not None
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        获取单个文档，正文已转存时从磁盘读取
+
+        Args:
+            key: 条目键
+
+        Returns:
+            文档数据，不存在时返回None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return None
+        return self._materialize(entry)
+
+    def keys(self) -> List[str]:
+        """当前保留的条目键（按加入顺序）"""
+        with self._lock:
+            self._expire()
+            return list(self._entries)
+
+    def clear(self):
+        """清空保留区"""
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取内存占用统计"""
+        with self._lock:
+            resident = sum(1 for entry in self._entries.values() if entry.content is not None)
+            return {
+                'entries': len(self._entries),
+                'resident_entries': resident,
+                'spilled_entries': len(self._entries) - resident,
+                'resident_bytes': self._resident_bytes,
+                'max_resident_bytes': self.max_resident_bytes,
+                'spills': self.spills,
+                'evictions': self.evictions
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        """按加入顺序遍历文档，转存到磁盘的正文按需读取"""
+        with self._lock:
+            self._expire()
+            entries = list(self._entries.values())
+        for entry in entries:
+            yield self._materialize(entry)
+
+    def _materialize(self, entry: _Entry) -> Dict[str, Any]:
+        """组装包含正文的文档数据"""
+        content = entry.content
+        if content is None:
+            content = self.store.get(entry.key) or ''
+        return {**entry.meta, 'content': content}
+
+    def _remove(self, key: str) -> Optional[_Entry]:
+        """移除条目（需持有锁）"""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        if entry.content is not None:
+            self._resident_bytes -= entry.size
+        if self.on_remove is not None:
+            self.on_remove(key)
+        return entry
+
+    def _expire(self):
+        """淘汰超龄和超出数量上限的条目（需持有锁）"""
+        now = time.monotonic()
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            expired = self.max_age and now - entry.added_at > self.max_age
+            if not expired and len(self._entries) <= self.max_entries:
+                break
+            self._remove(key)
+            self.evictions += 1
+
+    def _spill(self):
+        """将最早加入的正文转存到磁盘直到常驻字节数不超过上限（需持有锁）"""
+        if self._resident_bytes <= self.max_resident_bytes:
+            return
+
+        for entry in self._entries.values():
+            if self._resident_bytes <= self.max_resident_bytes:
+                break
+            if entry.content is None:
+                continue
+            try:
+                self.store.put(entry.key, entry.content)
+            except OSError as e:
+                logger.warning(f"文档正文转存失败 {entry.key}: {str(e)}")
+                continue
+            entry.content = None
+            self._resident_bytes -= entry.size
+            self.spills += 1
+            if self.on_spill is not None:
+                self.on_spill(entry.key)
@@ -0,0 +1,176 @@
+"""文本分句 - 文档入库时一次性计算句子/段落偏移索引"""
+import re
+from array import array
+from bisect import bisect_right
+from typing import Iterator, List, Tuple
+
+# 句子结束符：中文句号/叹号/问号/分号、英文叹号/问号、后接空白或位于结尾的英文句号，以及空行。
+# 单个换行是排版折行（pdfplumber每个视觉行都以换行结束），不结束句子
+SENTENCE_BOUNDARY = re.compile(r'[。！？；!?]|\.(?=\s|$)|\n[ \t\r\f\v]*\n')
+# 段落分隔：空行
+PARAGRAPH_BOUNDARY = re.compile(r'\n[ \t\r\f\v]*\n\s*')
+# 句内折行
+LINE_BREAK = re.compile(r'[ \t\r\f\v]*\n[ \t\r\f\v]*')
+
+# 序列化格式标识，分句规则变化时递增，旧格式的索引读取时重新计算
+FORMAT_MAGIC = 0x53454702
+
+
+def join_lines(text: str) -> str:
+    """
+    合并句内折行：两侧都是中文等非ASCII字符时直接相连，否则替换为一个空格
+
+    Args:
+        text: 句子文本
+
+    Returns:
+        去除折行后的文本
+    """
+    if '\n' not in text:
+        return text
+    return LINE_BREAK.sub(_join_line, text)
+
+
+def _join_line(match: re.Match) -> str:
+    text = match.string
+    before = text[match.start() - 1] if match.start() > 0 else ' '
+    after = text[match.end()] if match.end() < len(text) else ' '
+    return '' if not before.isascii() and not after.isascii() else ' '
+
+
+class SegmentIndex:
+    """
+    文档的句子与段落偏移索引
+
+    句子区间不包含结束符，且去除首尾空白；所有偏移均为原文中的字符位置。
+    按序号取出的句子文本已合并句内折行。
+    """
+
+    __slots__ = ('sentence_starts', 'sentence_ends', 'paragraph_starts', 'paragraph_ends')
+
+    def __init__(self,
+                 sentence_starts: array,
+                 sentence_ends: array,
+                 paragraph_starts: array,
+                 paragraph_ends: array):
+        self.sentence_starts = sentence_starts
+        self.sentence_ends = sentence_ends
+        self.paragraph_starts = paragraph_starts
+        self.paragraph_ends = paragraph_ends
+
+    @classmethod
+    def build(cls, text: str) -> "SegmentIndex":
+        """
+        对文本分句并建立索引
+
+        Args:
+            text: 文档正文
+
+        Returns:
+            句子/段落偏移索引
+        """
+        sentence_starts, sentence_ends = cls._spans(text, SENTENCE_BOUNDARY)
+
+        paragraph_starts, paragraph_ends = cls._spans(text, PARAGRAPH_BOUNDARY)
+
+        return cls(sentence_starts, sentence_ends, paragraph_starts, paragraph_ends)
+
+    @staticmethod
+    def _spans(text: str, boundary: re.Pattern) -> Tuple[array, array]:
+        """按分隔符切分并去除首尾空白，返回非空区间的起止偏移"""
+        starts = array('I')
+        ends = array('I')
+        position = 0
+        for match in boundary.finditer(text):
+            SegmentIndex._append_span(text, position, match.start(), starts, ends)
+            position = match.end()
+        SegmentIndex._append_span(text, position, len(text), starts, ends)
+        return starts, ends
+
+    @staticmethod
+    def _append_span(text: str, start: int, end: int, starts: array, ends: array):
+        """去除首尾空白后追加非空区间"""
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        if start < end:
+            starts.append(start)
+            ends.append(end)
+
+    @property
+    def sentence_count(self) -> int:
+        """句子数量"""
+        return len(self.sentence_starts)
+
+    def sentence(self, text: str, i: int) -> str:
+        """获取第i个句子（已合并折行）"""
+        return join_lines(text[self.sentence_starts[i]:self.sentence_ends[i]])
+
+    def sentences(self, text: str) -> Iterator[str]:
+        """按顺序遍历全部句子（已合并折行）"""
+        for start, end in zip(self.sentence_starts, self.sentence_ends):
+            yield join_lines(text[start:end])
+
+    def sentence_at(self, position: int) -> int:
+        """
+        查找包含指定字符位置的句子
+
+        Args:
+            position: 字符位置
+
+        Returns:
+            句子序号，位置落在句间分隔符上时返回-1
+        """
+        i = bisect_right(self.sentence_starts, position) - 1
+        if i >= 0 and position < self.sentence_ends[i]:
+            return i
+        return -1
+
+    def paragraph_at(self, position: int) -> int:
+        """
+        查找包含指定字符位置的段落
+
+        Args:
+            position: 字符位置
+
+        Returns:
+            段落序号，位置落在段间分隔符上时返回-1
+        """
+        i = bisect_right(self.paragraph_starts, position) - 1
+        if i >= 0 and position < self.paragraph_ends[i]:
+            return i
+        return -1
+
+    def paragraph_spans(self) -> List[Tuple[int, int]]:
+        """全部段落的起止偏移"""
+        return list(zip(self.paragraph_starts, self.paragraph_ends))
+
+    def to_bytes(self) -> bytes:
+        """序列化为字节（四个数组依次排列，头部记录格式标识和各自长度）"""
+        arrays = (self.sentence_starts, self.sentence_ends,
+                  self.paragraph_starts, self.paragraph_ends)
+        header = array('I', [FORMAT_MAGIC] + [len(a) for a in arrays])
+        return header.tobytes() + b''.join(a.tobytes() for a in arrays)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "SegmentIndex":
+        """
+        从字节反序列化
+
+        Raises:
+            ValueError: 数据不是当前格式（旧分句规则生成的索引）
+        """
+        header = array('I')
+        header.frombytes(data[:5 * header.itemsize])
+        if len(header) < 5 or header[0] != FORMAT_MAGIC:
+            raise ValueError("偏移索引格式已过期")
+        offset = len(header) * header.itemsize
+        arrays = []
+        for length in header[1:]:
+            a = array('I')
+            size = length * a.itemsize
+            a.frombytes(data[offset:offset + size])
+            offset += size
+            arrays.append(a)
+        return cls(*arrays)
@@ -32,15 +32,26 @@ class FeatureUpdate(BaseModel):
 class FeatureCompareRequest(BaseModel):
     """特征比对请求"""
     feature_text: str
-    compare_content: str
+    compare_content: Optional[str] = None  # 对比文件内容，与compare_document_id二选一
+    compare_document_id: Optional[str] = None  # 已上传文档的ID
     user_input: Optional[str] = ""
 
 
 class FeatureAnalysisRequest(BaseModel):
     """特征分析请求"""
     features: List[Dict[str, Any]]  # 特征列表
-    compare_files: List[Dict[str, str]]  # 对比文件列表
+    compare_files: Optional[List[Dict[str, str]]] = None  # 对比文件列表（内联正文）
+    compare_document_ids: Optional[List[str]] = None  # 已上传文档的ID列表
     analysis_type: Optional[str] = "all"  # all, match_only, llm_only
+    use_rag: Optional[bool] = False  # LLM分析时附加RAG检索到的相关文档
+    dataset_ids: Optional[List[str]] = None  # RAG数据集ID列表
+
+
+class DocumentIndexRequest(BaseModel):
+    """文档入库（上传到RAG数据集）请求"""
+    dataset_id: str  # RAG数据集ID
+    document_ids: List[str]  # 已上传文档的ID列表
+    force: Optional[bool] = False  # 忽略上传记录，重新上传已入库的内容
 
 
 class FeatureResponse(FeatureBase):
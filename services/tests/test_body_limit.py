@@ -0,0 +1,60 @@
+"""BodySizeLimitMiddleware 请求体大小限制测试"""
+import asyncio
+from typing import List
+
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+
+from utils.body_limit import BodySizeLimitMiddleware
+
+LIMIT = 1024
+
+
+def _client() -> TestClient:
+    app = FastAPI()
+    app.add_middleware(BodySizeLimitMiddleware, max_body_size=LIMIT)
+
+    @app.post('/upload')
+    async def upload(files: List[UploadFile] = File(...)):
+        return {'sizes': [len(await file.read()) for file in files]}
+
+    return TestClient(app)
+
+
+def test_request_within_limit_is_accepted():
+    response = _client().post('/upload', files=[('files', ('a.txt', b'x' * 100))])
+
+    assert response.status_code == 200
+    assert response.json() == {'sizes': [100]}
+
+
+def test_declared_content_length_over_limit_is_rejected():
+    response = _client().post('/upload', files=[('files', ('a.txt', b'x' * (LIMIT * 4)))])
+
+    assert response.status_code == 413
+
+
+def test_streamed_body_without_content_length_is_cut_off():
+    app = _client().app
+    body = (b'--b\r\nContent-Disposition: form-data; name="files"; filename="a.txt"\r\n'
+            b'Content-Type: text/plain\r\n\r\n' + b'x' * (LIMIT * 16) + b'\r\n--b--\r\n')
+    chunks = [body[i:i + 256] for i in range(0, len(body), 256)]
+    received = []
+    sent = []
+
+    async def receive():
+        received.append(1)
+        return {'type': 'http.request', 'body': chunks[len(received) - 1],
+                'more_body': len(received) < len(chunks)}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'method': 'POST', 'path': '/upload', 'raw_path': b'/upload',
+             'query_string': b'', 'root_path': '', 'scheme': 'http', 'http_version': '1.1',
+             'server': ('test', 80), 'client': ('test', 1234),
+             'headers': [(b'content-type', b'multipart/form-data; boundary=b')]}
+    asyncio.run(app(scope, receive, send))
+
+    assert sent[0]['status'] == 413
+    assert len(received) == LIMIT // 256 + 1
@@ -0,0 +1,83 @@
+"""ContextSelector 上下文挑选测试"""
+import asyncio
+import threading
+
+from analyzers.context_selector import ContextSelector
+from processors.text_segmenter import SegmentIndex
+
+DOC_ID = 'a' * 64
+
+
+def _document():
+    paragraphs = [f"第{i}段介绍外壳的组装方法，与散热无关。" * 3 for i in range(40)]
+    paragraphs[17] = "所述散热片通过导热硅脂贴合在处理器表面，风扇设置在散热片上方。"
+    return "\n\n".join(paragraphs)
+
+
+def test_content_within_budget_is_sent_whole():
+    selection = ContextSelector().select('处理器', '处理器和存储器。', 500)
+
+    assert selection.content == '处理器和存储器。'
+    assert not selection.truncated
+    assert selection.passages == []
+
+
+def test_relevant_paragraph_is_selected_within_budget():
+    selection = ContextSelector().select('散热片贴合在处理器表面', _document(), 200)
+
+    assert '导热硅脂' in selection.content
+    assert selection.truncated
+    assert selection.selected_tokens <= 200
+    assert selection.tokens_saved == selection.original_tokens - selection.selected_tokens
+
+
+def test_unsplittable_text_is_cut_to_budget_instead_of_dropped():
+    selection = ContextSelector().select('处理器', 'a' * 5000, 500)
+
+    assert selection.content
+    assert 0 < selection.selected_tokens <= 500
+    assert selection.to_dict()['truncated'] is True
+    assert len(selection.passages) == 1
+
+
+def test_document_key_and_stored_segments_are_reused():
+    content = _document()
+    selector = ContextSelector()
+    segments = SegmentIndex.build(content)
+
+    selection = selector.select('散热片贴合在处理器表面', content, 200, segments=segments, key=DOC_ID)
+
+    assert '导热硅脂' in selection.content
+    assert list(selector.ranker._cache) == [DOC_ID]
+
+
+def test_comparator_selects_stored_document_off_the_event_loop(tmp_path, monkeypatch):
+    from analyzers import feature_comparator
+    from processors.document_store import DocumentStore
+
+    store = DocumentStore(str(tmp_path))
+    content = _document()
+    store.put(DOC_ID, content)
+    store.put_segments(DOC_ID, SegmentIndex.build(content))
+    monkeypatch.setattr(feature_comparator, 'document_store', store)
+    threads = []
+    select = feature_comparator.context_selector.select
+
+    def spy(*args, **kwargs):
+        threads.append((threading.current_thread(), kwargs))
+        return select(*args, **kwargs)
+
+    monkeypatch.setattr(feature_comparator.context_selector, 'select', spy)
+
+    async def scenario():
+        return await feature_comparator.FeatureComparator()._select_context(
+            '散热片贴合在处理器表面', content, 200, document_id=DOC_ID
+        )
+
+    selected, selection = asyncio.run(scenario())
+
+    assert '导热硅脂' in selected
+    thread, kwargs = threads[0]
+    assert thread is not threading.main_thread()
+    assert kwargs['key'] == DOC_ID
+    assert kwargs['segments'] is not None
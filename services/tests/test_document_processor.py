@@ -0,0 +1,106 @@
+"""DocumentProcessor 并行提取进程池测试"""
+import asyncio
+import io
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from processors.document_processor import DocumentProcessor
+
+
+def test_results_keep_task_order():
+    processor = DocumentProcessor(pdf_workers=2, pdf_timeout=30)
+
+    assert processor._run_in_pool(pow, [(2, 3), (3, 2), (10, 0)]) == [8, 9, 1]
+
+
+def test_timeout_kills_only_the_stuck_document_pool():
+    processor = DocumentProcessor(pdf_workers=2, pdf_timeout=2)
+    results = {}
+
+    def healthy():
+        time.sleep(0.2)
+        results['healthy'] = processor._run_in_pool(time.sleep, [(0.1,)] * 3)
+
+    thread = threading.Thread(target=healthy)
+    thread.start()
+
+    started = time.monotonic()
+    with pytest.raises(TimeoutError, match='1/2'):
+        processor._run_in_pool(time.sleep, [(0,), (60,)])
+    elapsed = time.monotonic() - started
+    thread.join()
+
+    assert elapsed < 10
+    assert results['healthy'] == [None] * 3
+    assert not processor._pdf_pools
+
+
+@pytest.mark.parametrize('encoding', ['utf-8', 'gb18030', 'big5'])
+def test_text_with_ascii_head_decodes_after_the_sample(tmp_path, encoding):
+    processor = DocumentProcessor()
+    head = 'a' * (DocumentProcessor.ENCODING_SAMPLE_SIZE + 100)
+    path = tmp_path / 'doc.txt'
+    path.write_bytes((head + '處理器與記憶體').encode(encoding))
+
+    assert processor._extract_text(path) == head + '處理器與記憶體'
+
+
+def test_repeat_upload_reuses_stored_segments_and_index(tmp_path, monkeypatch):
+    from api import feature_api
+    from processors import document_processor
+    from processors.document_store import DocumentStore
+    from processors.extraction_cache import ExtractionCache
+    from processors.text_segmenter import SegmentIndex
+
+    store = DocumentStore(str(tmp_path / 'store'))
+    monkeypatch.setattr(document_processor, 'document_store', store)
+    monkeypatch.setattr(feature_api, 'document_store', store)
+    processor = DocumentProcessor(extraction_cache=ExtractionCache(str(tmp_path / 'cache'), 1 << 30))
+    monkeypatch.setattr(feature_api, 'doc_processor', processor)
+
+    path = tmp_path / 'doc.txt'
+    path.write_text('终端包括处理器。处理器连接存储器。' * 100, encoding='utf-8')
+    content_hash = ExtractionCache.hash_file(path)
+    first = feature_api.process_and_store(str(path), content_hash)
+    seg_mtime = store.path_for(content_hash).with_suffix('.seg').stat().st_mtime_ns
+
+    calls = []
+    monkeypatch.setattr(SegmentIndex, 'build', classmethod(lambda cls, text: calls.append('segments')))
+    monkeypatch.setattr(processor.search_index, 'add', lambda key, text: calls.append('index'))
+    second = feature_api.process_and_store(str(path), content_hash)
+
+    assert not first['segments_stored'] and second['segments_stored']
+    assert second['cached']
+    assert calls == []
+    assert store.path_for(content_hash).with_suffix('.seg').stat().st_mtime_ns == seg_mtime
+    assert processor.search_in_docs('存储器')
+
+
+def test_upload_reports_per_file_status_when_one_file_fails_to_store(monkeypatch):
+    from fastapi import UploadFile
+
+    from api import feature_api
+
+    def process_and_store(tmp_path, content_hash):
+        with open(tmp_path, 'rb') as f:
+            if f.read() == b'broken':
+                raise OSError('磁盘已满')
+        return {'filename': 'ok.txt', 'content_hash': content_hash, 'file_type': 'txt',
+                'language': 'zh', 'length': 2}
+
+    monkeypatch.setattr(feature_api, 'process_and_store', process_and_store)
+    monkeypatch.setattr(feature_api.DocumentCRUD, 'get_or_create',
+                        staticmethod(lambda db, data: SimpleNamespace(document_id=data['document_id'])))
+    files = [UploadFile(file=io.BytesIO('正文'.encode('utf-8')), filename='ok.txt'),
+             UploadFile(file=io.BytesIO(b'broken'), filename='broken.txt')]
+
+    response = asyncio.run(feature_api.upload_documents(files=files, db=None))
+    body = json.loads(response.body)
+
+    assert body['status'] == 'partial'
+    assert [doc['status'] for doc in body['documents']] == ['success', 'error']
+    assert body['documents'][1] == {'filename': 'broken.txt', 'status': 'error', 'error': '磁盘已满'}
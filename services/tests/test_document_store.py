@@ -0,0 +1,20 @@
+"""DocumentStore 正文存储测试"""
+from processors.document_store import DocumentStore
+
+DOC_ID = 'b' * 64
+
+
+def test_content_round_trips_without_newline_translation(tmp_path):
+    store = DocumentStore(str(tmp_path))
+    content = '第一行\r\n第二行\r第三行\n'
+    store.put(DOC_ID, content)
+
+    assert store.get(DOC_ID) == content
+
+
+def test_empty_and_missing_documents(tmp_path):
+    store = DocumentStore(str(tmp_path))
+    store.put(DOC_ID, '')
+
+    assert store.get(DOC_ID) == ''
+    assert store.get('c' * 64) is None
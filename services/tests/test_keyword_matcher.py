@@ -0,0 +1,56 @@
+"""KeywordAutomaton / FeatureMatcher 多关键词匹配测试"""
+import random
+
+from analyzers.keyword_matcher import FeatureMatcher, KeywordAutomaton
+from processors.text_segmenter import SegmentIndex
+
+
+def _naive_matches(keywords, text):
+    """逐个关键词用 str.find 查找全部出现位置（含重叠）"""
+    matches = set()
+    for keyword_id, keyword in enumerate(keywords):
+        start = text.find(keyword)
+        while start >= 0:
+            matches.add((start, keyword_id))
+            start = text.find(keyword, start + 1)
+    return matches
+
+
+def test_overlapping_and_nested_keywords_are_all_reported():
+    automaton = KeywordAutomaton(['he', 'she', 'his', 'hers'])
+    text = 'ushers'
+
+    assert set(automaton.iter_matches(text)) == _naive_matches(automaton.keywords, text)
+    assert {automaton.keywords[k] for _, k in automaton.iter_matches(text)} == {'she', 'he', 'hers'}
+
+
+def test_duplicate_and_empty_keywords_are_ignored():
+    automaton = KeywordAutomaton(['处理器', '', '处理器', '存储器'])
+
+    assert automaton.keywords == ['处理器', '存储器']
+    assert sorted(automaton.iter_matches('处理器和存储器')) == [(0, 0), (4, 1)]
+
+
+def test_matches_agree_with_naive_search_on_random_text():
+    rng = random.Random(7)
+    alphabet = '处理器存储显示屏'
+    keywords = [''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 4))) for _ in range(30)]
+    automaton = KeywordAutomaton(keywords)
+    text = ''.join(rng.choice(alphabet) for _ in range(2000))
+
+    assert set(automaton.iter_matches(text)) == _naive_matches(automaton.keywords, text)
+
+
+def test_feature_matcher_reports_sentences_per_feature():
+    content = '终端包括处理器。处理器连接存储器。显示屏位于正面。'
+    segments = SegmentIndex.build(content)
+    matcher = FeatureMatcher([['处理器'], ['存储器', '显示屏'], [], ['散热片']])
+
+    assert matcher.match(content, segments) == [[0, 1], [1, 2], [], []]
+
+
+def test_keyword_must_fall_inside_one_sentence():
+    content = '包括处理。器件位于底部。'
+    segments = SegmentIndex.build(content)
+
+    assert FeatureMatcher([['处理器']]).match(content, segments) == [[]]
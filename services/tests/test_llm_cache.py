@@ -0,0 +1,49 @@
+"""LLMResponseCache 两级缓存测试"""
+import asyncio
+import sqlite3
+
+from utils.llm_cache import LLMResponseCache
+
+
+def _table_totals(path):
+    with sqlite3.connect(str(path)) as conn:
+        return conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache').fetchone()
+
+
+def test_async_lookup_hits_memory_then_disk(tmp_path):
+    async def scenario():
+        cache = LLMResponseCache(str(tmp_path / 'cache.db'), memory_entries=1)
+        await cache.aput('a', 'model', '处理器')
+        await cache.aput('b', 'model', '存储器')
+        results = [await cache.aget('b'), await cache.aget('a'), await cache.aget('missing')]
+        cache.close()
+        return results
+
+    assert asyncio.run(scenario()) == [('存储器', 'memory'), ('处理器', 'disk'), (None, None)]
+
+
+def test_running_totals_match_table_after_replace_and_evict(tmp_path):
+    path = tmp_path / 'cache.db'
+    cache = LLMResponseCache(str(path), max_bytes=1000)
+    for i in range(30):
+        cache.put(f'k{i % 20}', 'model', 'x' * (50 + i))
+
+    stats = cache.stats()
+    cache.close()
+    entries, total = _table_totals(path)
+
+    assert (stats['disk_entries'], stats['disk_bytes']) == (entries, total)
+    assert total <= 1000
+    assert stats['evictions'] > 0
+
+
+def test_totals_are_restored_when_reopened(tmp_path):
+    path = tmp_path / 'cache.db'
+    cache = LLMResponseCache(str(path))
+    cache.put('a', 'model', 'abc')
+    cache.put('b', 'model', '处理器')
+    cache.close()
+
+    stats = LLMResponseCache(str(path)).stats()
+
+    assert (stats['disk_entries'], stats['disk_bytes']) == (2, 3 + 9)
@@ -0,0 +1,74 @@
+"""NGramIndex / ProcessedDocs 检索索引内存测试"""
+import random
+import tracemalloc
+
+from config import settings
+from processors.document_processor import DocumentProcessor
+from processors.document_store import DocumentStore
+from processors.ngram_index import NGramIndex
+from processors.processed_docs import ProcessedDocs
+
+
+def _naive_positions(keyword, text):
+    keyword, text = keyword.lower(), text.lower()
+    positions = []
+    start = text.find(keyword)
+    while start >= 0:
+        positions.append(start)
+        start = text.find(keyword, start + 1)
+    return positions
+
+
+def test_search_agrees_with_naive_find():
+    rng = random.Random(3)
+    alphabet = '处理器存储显示屏AbC'
+    docs = {f'd{i}': ''.join(rng.choice(alphabet) for _ in range(3000)) for i in range(3)}
+    index = NGramIndex(n=2)
+    for key, text in docs.items():
+        index.add(key, text)
+
+    for _ in range(50):
+        keyword = ''.join(rng.choice(alphabet) for _ in range(rng.randint(2, 5)))
+        expected = {key: _naive_positions(keyword, text) for key, text in docs.items()}
+        assert index.search(keyword) == {key: hits for key, hits in expected.items() if hits}
+
+
+def test_memory_bytes_matches_allocated_memory():
+    rng = random.Random(5)
+    chars = [chr(c) for c in range(0x4e00, 0x4e00 + 3000)]
+    text = ''.join(rng.choice(chars) for _ in range(50_000))
+
+    tracemalloc.start()
+    try:
+        index = NGramIndex(n=2)
+        before = tracemalloc.get_traced_memory()[0]
+        doc_bytes = index.add('doc', text)
+        allocated = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+    assert abs(index.memory_bytes() - allocated) < allocated * 0.05
+    assert doc_bytes <= index.memory_bytes()
+
+
+def test_spilled_document_drops_its_index_but_stays_searchable(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, 'EXTRACTION_CACHE_ENABLED', False)
+    processor = DocumentProcessor()
+    processor.processed_docs = ProcessedDocs(
+        store=DocumentStore(str(tmp_path)),
+        max_resident_bytes=200_000,
+        max_entries=10,
+        max_age=0,
+        on_remove=processor.search_index.remove,
+        on_spill=processor.search_index.remove
+    )
+    for name in ('a', 'b', 'c'):
+        path = tmp_path / f'{name}.txt'
+        path.write_text(f'{name}文档：所述散热片贴合在处理器表面。' * 2000, encoding='utf-8')
+        processor.process_file(str(path))
+
+    stats = processor.memory_stats()
+    assert stats['spilled_entries'] > 0
+    assert stats['indexed_docs'] == stats['resident_entries']
+    assert stats['resident_bytes'] <= 200_000
+    assert sorted(r['filename'] for r in processor.search_in_docs('散热片')) == ['a.txt', 'b.txt', 'c.txt']
@@ -0,0 +1,85 @@
+"""ParallelFeatureMatcher 并行匹配测试"""
+import pytest
+
+from analyzers import parallel_matcher
+from analyzers.parallel_matcher import ParallelFeatureMatcher, shutdown_match_pool
+from analyzers.records import FeatureRecord
+from analyzers.tech_analyzer import TechFeatureAnalyzer
+from config import settings
+from processors.text_segmenter import SegmentIndex
+
+FEATURES = ['终端包括处理器', '处理器连接存储器', '显示屏位于正面', '散热片贴合处理器', '电池']
+DOCS = [
+    {'filename': 'a', 'content': '终端包括处理器。处理器连接存储器。显示屏位于正面。'},
+    {'filename': 'b', 'content': '散热片通过导热硅脂贴合在处理器表面。\n\n电池位于背面。存储器容量较大。'},
+]
+
+
+@pytest.fixture
+def pool():
+    yield
+    shutdown_match_pool()
+
+
+@pytest.mark.parametrize('ranking', ['first', 'bm25'])
+def test_parallel_result_equals_serial(pool, monkeypatch, ranking):
+    monkeypatch.setattr(settings, 'MATCH_PARALLEL_MIN_PAIRS', 0)
+    monkeypatch.setattr(settings, 'MATCH_FEATURE_BLOCK_SIZE', 2)
+    records = [FeatureRecord(str(i), str(i), text) for i, text in enumerate(FEATURES, 1)]
+    analyzer = TechFeatureAnalyzer(ranking=ranking, top_k=2)
+
+    serial, _ = analyzer.match_features(DOCS, features=records, workers=1)
+    parallel, _ = analyzer.match_features(DOCS, features=records, workers=2)
+
+    assert [r.relation_paragraph for r in parallel] == [r.relation_paragraph for r in serial]
+
+
+def test_pool_is_reused_across_calls(pool):
+    docs = [{'content': doc['content'], 'segments': SegmentIndex.build(doc['content'])}
+            for doc in DOCS]
+    matcher = ParallelFeatureMatcher(max_workers=2, block_size=2)
+
+    first = matcher.match(FEATURES, [[f] for f in FEATURES], docs, 'first')
+    pool_after_first = parallel_matcher._pool
+    second = matcher.match(FEATURES, [[f] for f in FEATURES], docs, 'first')
+
+    assert first == second
+    assert parallel_matcher._pool is pool_after_first
+    assert pool_after_first._mp_context.get_start_method() in ('forkserver', 'spawn')
+
+
+def _docs_with_segments():
+    return [{'content': doc['content'], 'segments': SegmentIndex.build(doc['content'])}
+            for doc in DOCS]
+
+
+def test_pool_is_rebuilt_after_workers_die(pool):
+    docs = _docs_with_segments()
+    matcher = ParallelFeatureMatcher(max_workers=2, block_size=2)
+    expected = matcher.match(FEATURES, [[f] for f in FEATURES], docs, 'first')
+
+    for process in list(parallel_matcher._pool._processes.values()):
+        process.kill()
+        process.join()
+
+    assert matcher.match(FEATURES, [[f] for f in FEATURES], docs, 'first') == expected
+
+
+def test_timeout_raises_and_discards_pool(pool):
+    matcher = ParallelFeatureMatcher(max_workers=2, block_size=1, timeout=1e-6)
+
+    with pytest.raises(TimeoutError):
+        matcher.match(FEATURES, [[f] for f in FEATURES], _docs_with_segments(), 'first')
+    assert parallel_matcher._pool is None
+
+
+def test_analyzer_falls_back_to_serial_on_timeout(pool, monkeypatch):
+    monkeypatch.setattr(settings, 'MATCH_PARALLEL_MIN_PAIRS', 0)
+    monkeypatch.setattr(settings, 'MATCH_PARALLEL_TIMEOUT', 1e-6)
+    records = [FeatureRecord(str(i), str(i), text) for i, text in enumerate(FEATURES, 1)]
+    analyzer = TechFeatureAnalyzer(ranking='bm25', top_k=2)
+
+    serial, _ = analyzer.match_features(DOCS, features=records, workers=1)
+    fallback, _ = analyzer.match_features(DOCS, features=records, workers=2)
+
+    assert [r.relation_paragraph for r in fallback] == [r.relation_paragraph for r in serial]
@@ -0,0 +1,82 @@
+"""RAGFlow 文档处理器客户端测试"""
+import asyncio
+import threading
+
+import httpx
+
+from utils.llm_clients import DocumentProcessor
+from utils.upload_registry import UploadRegistry
+
+
+def test_client_is_closed_when_event_loop_changes():
+    processor = DocumentProcessor()
+
+    first = asyncio.run(processor._get_client())
+    second = asyncio.run(processor._get_client())
+
+    assert first is not second
+    assert first.is_closed
+    assert not second.is_closed
+    stats = processor.pool_stats()
+    assert stats['clients_created'] == 2
+    assert stats['clients_closed'] == 1
+
+    asyncio.run(processor.aclose())
+    assert second.is_closed
+    assert processor.pool_stats()['open'] is False
+
+
+def test_client_is_reused_within_one_event_loop():
+    async def scenario():
+        processor = DocumentProcessor()
+        first = await processor._get_client()
+        second = await processor._get_client()
+        await processor.aclose()
+        return processor, first, second
+
+    processor, first, second = asyncio.run(scenario())
+
+    assert first is second
+    assert processor.pool_stats()['clients_closed'] == 1
+
+
+def test_upload_file_hashes_and_records_off_the_event_loop(tmp_path, monkeypatch):
+    processor = DocumentProcessor()
+    processor.upload_registry = UploadRegistry(str(tmp_path / 'uploads.db'))
+    registry_threads = []
+    registry_get = processor.upload_registry.get
+    registry_record = processor.upload_registry.record
+
+    def get(*args):
+        registry_threads.append(threading.current_thread())
+        return registry_get(*args)
+
+    def record(*args):
+        registry_threads.append(threading.current_thread())
+        return registry_record(*args)
+
+    monkeypatch.setattr(processor.upload_registry, 'get', get)
+    monkeypatch.setattr(processor.upload_registry, 'record', record)
+
+    posts = []
+
+    async def post(url, **kwargs):
+        posts.append(url)
+        return httpx.Response(200, json={'code': 0, 'data': [{'id': 'rag-1'}]})
+
+    monkeypatch.setattr(processor, '_post', post)
+    path = tmp_path / 'doc.txt'
+    path.write_text('正文' * 1000, encoding='utf-8')
+
+    async def scenario():
+        first = await processor.upload_file('ds', str(path), 'doc.txt')
+        second = await processor.upload_file('ds', str(path), 'doc.txt')
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    processor.upload_registry.close()
+
+    assert len(posts) == 1
+    assert first['document_ids'] == ['rag-1'] and not first['duplicate']
+    assert second['duplicate'] and second['content_hash'] == first['content_hash']
+    assert registry_threads and threading.main_thread() not in registry_threads
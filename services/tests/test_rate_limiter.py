@@ -0,0 +1,130 @@
+"""AdaptiveRateLimiter 自适应限流测试"""
+import asyncio
+import time
+
+from utils.rate_limiter import AdaptiveRateLimiter
+
+
+class RateLimitError(Exception):
+    """模拟服务商返回的429异常"""
+    status_code = 429
+
+    def __init__(self, retry_after=None):
+        super().__init__('rate limited')
+        headers = {'retry-after': str(retry_after)} if retry_after is not None else {}
+        self.response = type('Response', (), {'headers': headers})()
+
+
+def test_concurrency_never_exceeds_limit():
+    async def scenario():
+        limiter = AdaptiveRateLimiter('test', max_concurrency=3)
+        active = peak = 0
+
+        async def request():
+            nonlocal active, peak
+            async with limiter.limit():
+                active += 1
+                peak = max(peak, active)
+                await asyncio.sleep(0.01)
+                active -= 1
+
+        await asyncio.gather(*(request() for _ in range(20)))
+        return limiter, peak
+
+    limiter, peak = asyncio.run(scenario())
+    assert peak == 3
+    assert limiter.in_flight == 0
+    assert limiter.completed == 20
+
+
+def test_rate_limit_error_halves_concurrency_once_per_cooldown():
+    async def scenario():
+        limiter = AdaptiveRateLimiter('test', max_concurrency=16, decrease_cooldown=60)
+        for _ in range(3):
+            permit = await limiter.acquire()
+            await limiter.release(permit, RateLimitError())
+        return limiter
+
+    limiter = asyncio.run(scenario())
+    assert limiter.concurrency_limit == 8
+    assert limiter.throttled == 3
+
+
+def test_successes_increase_concurrency_additively_up_to_max():
+    async def scenario():
+        limiter = AdaptiveRateLimiter('test', max_concurrency=8, decrease_cooldown=0)
+        permit = await limiter.acquire()
+        await limiter.release(permit, RateLimitError())
+        after_decrease = limiter.concurrency_limit
+
+        async def succeed():
+            permit = await limiter.acquire()
+            # 固定延迟，避免调度抖动被当作延迟突增
+            permit.latency = 0.01
+            await limiter.release(permit)
+
+        # 一轮（约等于当前上限个请求）成功后上限加一
+        for _ in range(int(after_decrease)):
+            await succeed()
+        after_round = limiter.concurrency_limit
+
+        for _ in range(200):
+            await succeed()
+        return after_decrease, after_round, limiter.concurrency_limit
+
+    after_decrease, after_round, final = asyncio.run(scenario())
+    assert after_decrease == 4
+    assert 4.9 < after_round < 5.1
+    assert final == 8
+
+
+def test_retry_after_pauses_new_requests():
+    async def scenario():
+        limiter = AdaptiveRateLimiter('test', max_concurrency=4)
+        permit = await limiter.acquire()
+        await limiter.release(permit, RateLimitError(retry_after=0.2))
+
+        started = time.monotonic()
+        permit = await limiter.acquire()
+        await limiter.release(permit)
+        return time.monotonic() - started
+
+    assert asyncio.run(scenario()) >= 0.18
+
+
+def test_requests_per_minute_bucket_spaces_requests():
+    async def scenario():
+        # 6000 RPM = 每10ms补充一个请求；清空令牌后3个请求约需30ms
+        limiter = AdaptiveRateLimiter('test', rpm=6000, max_concurrency=16)
+        limiter._requests.tokens = 0
+
+        started = time.monotonic()
+        for _ in range(3):
+            permit = await limiter.acquire()
+            await limiter.release(permit)
+        return time.monotonic() - started, limiter.stats()
+
+    elapsed, stats = asyncio.run(scenario())
+    assert elapsed >= 0.025
+    assert stats['rpm_limit'] == 6000
+    assert stats['requests_last_minute'] == 3
+
+
+def test_latency_spike_shrinks_concurrency():
+    async def scenario():
+        limiter = AdaptiveRateLimiter('test', max_concurrency=10, latency_spike_factor=2.0,
+                                      decrease_cooldown=0)
+        for _ in range(12):
+            permit = await limiter.acquire()
+            permit.latency = 0.1
+            await limiter.release(permit)
+        before = limiter.concurrency_limit
+
+        permit = await limiter.acquire()
+        permit.latency = 1.0
+        await limiter.release(permit)
+        return before, limiter
+
+    before, limiter = asyncio.run(scenario())
+    assert limiter.latency_spikes == 1
+    assert abs(limiter.concurrency_limit - before * 0.8) < 1e-9
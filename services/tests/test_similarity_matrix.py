@@ -0,0 +1,59 @@
+"""TF-IDF 稀疏矩阵匹配测试"""
+import numpy as np
+
+from analyzers.similarity_matrix import TfidfMatrixMatcher
+
+DOCS = [
+    {'content': '电池包包括多个电芯。电芯之间设置隔热垫。外壳采用铝合金制成。'},
+    {'content': '无关的说明文字。'},
+    {'content': '散热器与电池包相邻布置。隔热垫由气凝胶制成。电芯通过汇流排串联。'},
+]
+FEATURES = ['电芯之间设置隔热垫', '外壳采用铝合金', '汇流排串联电芯', '完全不相关xyz']
+
+
+def dense_reference(matcher, features, docs):
+    """逐个特征计算稠密相似度后取top-k，作为稀疏实现的对照"""
+    from processors.text_segmenter import SegmentIndex
+
+    passages, bounds = [], []
+    for doc in docs:
+        start = len(passages)
+        passages.extend(SegmentIndex.build(doc['content']).sentences(doc['content']))
+        bounds.append((start, len(passages)))
+    vocabulary = {}
+    passage_matrix = matcher._vectorize(passages, vocabulary, grow=True)
+    df = np.bincount(passage_matrix.indices, minlength=len(vocabulary))
+    idf = np.log((1 + len(passages)) / (1 + df)) + 1
+    passage_matrix = matcher._normalize(passage_matrix.multiply(idf)).toarray()
+    feature_matrix = matcher._normalize(matcher._vectorize(features, vocabulary, grow=False).multiply(idf)).toarray()
+
+    result = []
+    for scores in feature_matrix @ passage_matrix.T:
+        row = []
+        for start, end in bounds:
+            ranked = sorted(((i, s) for i, s in enumerate(scores[start:end]) if s > 0), key=lambda x: (-x[1], x[0]))
+            row.append(ranked[:matcher.top_k])
+        result.append(row)
+    return result
+
+
+def test_sparse_top_k_matches_dense_scores():
+    matcher = TfidfMatrixMatcher(top_k=2, block_size=3)
+
+    result = matcher.match(FEATURES, DOCS)
+    expected = dense_reference(matcher, FEATURES, DOCS)
+
+    for row, expected_row in zip(result, expected):
+        for hits, expected_hits in zip(row, expected_row):
+            assert [i for i, _ in hits] == [i for i, _ in expected_hits]
+            assert np.allclose([s for _, s in hits], [s for _, s in expected_hits])
+    assert result[0][0][0][0] == 1
+    assert result[0][1] == []
+    assert result[3] == [[], [], []]
+
+
+def test_passage_indices_are_relative_to_each_document():
+    result = TfidfMatrixMatcher(top_k=1).match(['汇流排串联'], DOCS)
+
+    assert result[0][2] == [(2, result[0][2][0][1])]
+    assert result[0][0] == []
@@ -0,0 +1,145 @@
+"""SingleFlight 请求合并测试"""
+import asyncio
+
+import pytest
+
+from utils.single_flight import SingleFlight
+
+
+def test_concurrent_identical_calls_share_one_upstream_call():
+    async def scenario():
+        flight = SingleFlight()
+        upstream = []
+
+        async def call():
+            upstream.append(1)
+            await asyncio.sleep(0.05)
+            return {'res': 'answer'}
+
+        results = await asyncio.gather(*(flight.do('key', call) for _ in range(5)))
+        return flight, upstream, results
+
+    flight, upstream, results = asyncio.run(scenario())
+
+    assert len(upstream) == 1
+    assert [result for result, _ in results] == [{'res': 'answer'}] * 5
+    assert [shared for _, shared in results] == [False, True, True, True, True]
+    assert flight.stats()['in_flight_calls'] == 0
+
+
+def test_different_keys_are_not_coalesced():
+    async def scenario():
+        flight = SingleFlight()
+        upstream = []
+
+        async def call():
+            upstream.append(1)
+            await asyncio.sleep(0.01)
+            return 'ok'
+
+        await asyncio.gather(flight.do('a', call), flight.do('b', call))
+        return upstream
+
+    assert len(asyncio.run(scenario())) == 2
+
+
+def test_leader_exception_reaches_every_waiter():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def call():
+            await asyncio.sleep(0.01)
+            raise RuntimeError('upstream failed')
+
+        return await asyncio.gather(flight.do('key', call), flight.do('key', call),
+                                    return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_cancelled_waiter_does_not_cancel_shared_call():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def call():
+            await asyncio.sleep(0.05)
+            return 'done'
+
+        first = asyncio.ensure_future(flight.do('key', call))
+        second = asyncio.ensure_future(flight.do('key', call))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(scenario()) == ('done', True)
+
+
+async def _source(chunks, started, finished, delay=0.02):
+    started.append(1)
+    try:
+        for chunk in chunks:
+            await asyncio.sleep(delay)
+            yield chunk
+    finally:
+        finished.append(1)
+
+
+def test_late_subscriber_receives_full_stream():
+    async def scenario():
+        flight = SingleFlight()
+        started, finished = [], []
+        chunks = ['a', 'b', 'c', 'd', 'e']
+
+        async def subscribe(delay):
+            await asyncio.sleep(delay)
+            stream = flight.stream('key', lambda: _source(chunks, started, finished))
+            return [chunk async for chunk in stream]
+
+        results = await asyncio.gather(subscribe(0), subscribe(0.05), subscribe(0.07))
+        return flight, started, results
+
+    flight, started, results = asyncio.run(scenario())
+
+    assert len(started) == 1
+    assert results == [['a', 'b', 'c', 'd', 'e']] * 3
+    assert flight.stats()['shared_streams'] == 2
+    assert flight.stats()['in_flight_streams'] == 0
+
+
+def test_early_aclose_of_last_subscriber_cancels_source():
+    async def scenario():
+        flight = SingleFlight()
+        started, finished = [], []
+
+        stream = flight.stream('key', lambda: _source(['a', 'b', 'c', 'd'], started, finished, 0.05))
+        first = await stream.__anext__()
+        await stream.aclose()
+        await asyncio.sleep(0.1)
+        return flight, first, finished
+
+    flight, first, finished = asyncio.run(scenario())
+
+    assert first == 'a'
+    assert finished == [1]
+    assert flight.stats()['in_flight_streams'] == 0
+
+
+def test_source_error_is_raised_to_every_subscriber():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def failing():
+            yield 'a'
+            raise ConnectionError('stream broken')
+
+        async def subscribe():
+            received = []
+            with pytest.raises(ConnectionError):
+                async for chunk in flight.stream('key', failing):
+                    received.append(chunk)
+            return received
+
+        return await asyncio.gather(subscribe(), subscribe())
+
+    assert asyncio.run(scenario()) == [['a'], ['a']]
@@ -0,0 +1,26 @@
+"""TechFeatureAnalyzer 特征匹配测试"""
+from analyzers.passage_ranker import BM25Ranker
+from analyzers.records import FeatureRecord
+from analyzers.tech_analyzer import TechFeatureAnalyzer
+
+
+def test_inline_documents_are_hashed_once_for_bm25(monkeypatch):
+    hashed = []
+    key_for = BM25Ranker.key_for
+
+    def spy(content):
+        hashed.append(content)
+        return key_for(content)
+
+    monkeypatch.setattr(BM25Ranker, 'key_for', staticmethod(spy))
+    docs = [{'filename': 'a', 'content': '终端包括处理器。处理器连接存储器。'},
+            {'filename': 'b', 'content': '显示屏位于正面。散热片贴合处理器。'}]
+    features = [FeatureRecord(str(i), str(i), text)
+                for i, text in enumerate(['处理器', '存储器', '显示屏', '散热片'], 1)]
+    analyzer = TechFeatureAnalyzer(ranking='bm25', top_k=1)
+
+    records, _ = analyzer.match_features(docs, features=features, workers=1)
+
+    assert len(hashed) == len(docs)
+    assert set(analyzer.passage_ranker._cache) == {key_for(doc['content']) for doc in docs}
+    assert records[1].relation_paragraph == '处理器连接存储器'
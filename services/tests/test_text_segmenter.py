@@ -0,0 +1,55 @@
+"""SegmentIndex 分句测试"""
+import pytest
+
+from analyzers.records import FeatureRecord
+from analyzers.tech_analyzer import TechFeatureAnalyzer
+from processors.text_segmenter import SegmentIndex, join_lines
+
+# pdfplumber的输出：每个视觉行以换行结束，句子和词语都可能被折断
+WRAPPED = "本发明公开了一种终端，包括处理器和存\n储器，所述处理器用于执行存储器中的\n程序。所述终端还包括显示屏。\n\n第二段说明散热结构。"
+
+
+def test_single_newline_does_not_end_a_sentence():
+    segments = SegmentIndex.build(WRAPPED)
+
+    assert list(segments.sentences(WRAPPED)) == [
+        "本发明公开了一种终端，包括处理器和存储器，所述处理器用于执行存储器中的程序",
+        "所述终端还包括显示屏",
+        "第二段说明散热结构",
+    ]
+    assert segments.paragraph_spans() == [(0, WRAPPED.index("\n\n")),
+                                          (WRAPPED.index("第二段"), len(WRAPPED))]
+
+
+def test_blank_line_ends_a_sentence_without_punctuation():
+    text = "标题行没有标点\n\n正文第一句。"
+    segments = SegmentIndex.build(text)
+
+    assert list(segments.sentences(text)) == ["标题行没有标点", "正文第一句"]
+
+
+def test_join_lines_keeps_a_space_between_latin_words():
+    assert join_lines("a processor and\nmemory") == "a processor and memory"
+    assert join_lines("处理器和存 \n 储器") == "处理器和存储器"
+
+
+@pytest.mark.parametrize('ranking', ['first', 'bm25'])
+def test_snippets_are_whole_sentences_for_wrapped_lines(ranking):
+    analyzer = TechFeatureAnalyzer(ranking=ranking, top_k=1)
+    records, _ = analyzer.match_features(
+        [{'filename': 'doc', 'content': WRAPPED}],
+        features=[FeatureRecord('1', '1', '处理器和存储器')]
+    )
+
+    assert records[0].relation_paragraph == (
+        "本发明公开了一种终端，包括处理器和存储器，所述处理器用于执行存储器中的程序"
+    )
+
+
+def test_serialized_index_round_trips_and_rejects_old_format():
+    segments = SegmentIndex.build(WRAPPED)
+    restored = SegmentIndex.from_bytes(segments.to_bytes())
+
+    assert list(restored.sentences(WRAPPED)) == list(segments.sentences(WRAPPED))
+    with pytest.raises(ValueError):
+        SegmentIndex.from_bytes(segments.to_bytes()[4:])
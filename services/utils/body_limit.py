@@ -0,0 +1,71 @@
+"""请求体大小限制 - 在解析multipart之前按字节计数拒绝过大的请求"""
+import logging
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+
+class BodySizeLimitMiddleware:
+    """
+    请求体大小限制中间件（ASGI）
+
+    Starlette 会先把整个 multipart 请求体读入临时文件再交给路由，路由里的分块校验
+    拦不住超大请求；这里在读取请求体时计数：声明的 Content-Length 超限时直接返回413，
+    未声明（分块传输）或声明不实时，累计收到的字节数一旦超限即中止读取并返回413。
+    """
+
+    def __init__(self, app, max_body_size: int):
+        """
+        初始化中间件
+
+        Args:
+            app: 下游ASGI应用
+            max_body_size: 单个请求体的字节数上限
+        """
+        self.app = app
+        self.max_body_size = max_body_size
+
+    def _too_large(self) -> HTTPException:
+        return HTTPException(status_code=413, detail=f"请求体过大，上限 {self.max_body_size} 字节")
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope['headers']).get(b'content-length', b'')
+        if content_length.isdigit() and int(content_length) > self.max_body_size:
+            error = self._too_large()
+            response = JSONResponse({'detail': error.detail}, status_code=error.status_code)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message['type'] == 'http.request':
+                received += len(message.get('body', b''))
+                if received > self.max_body_size:
+                    raise self._too_large()
+            return message
+
+        async def tracked_send(message):
+            nonlocal response_started
+            if message['type'] == 'http.response.start':
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracked_send)
+        except HTTPException as e:
+            # 读取请求体的代码不在路由的异常处理范围内时（如其他中间件）在这里返回413
+            if e.status_code != 413 or response_started:
+                raise
+            logger.warning(f"请求体超过上限被拒绝: {scope.get('path')}")
+            response = JSONResponse({'detail': e.detail}, status_code=e.status_code)
+            await response(scope, receive, send)
@@ -0,0 +1,324 @@
+"""LLM响应缓存 - 内存LRU + SQLite持久化两级缓存"""
+import re
+import json
+import asyncio
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+WHITESPACE = re.compile(r'\s+')
+
+
+def _normalize_content(content: Any) -> Any:
+    """归一化消息内容：文本合并空白并去除首尾空白，图文列表逐项处理"""
+    if isinstance(content, str):
+        return WHITESPACE.sub(' ', content).strip()
+    if isinstance(content, list):
+        return [
+            {**item, 'text': _normalize_content(item['text'])} if isinstance(item, dict) and 'text' in item
+            else item
+            for item in content
+        ]
+    return content
+
+
+def make_cache_key(model: str, messages: List[Dict[str, Any]], params: Dict[str, Any]) -> str:
+    """
+    计算缓存键
+
+    Args:
+        model: 模型ID
+        messages: 对话消息（内容归一化后参与计算）
+        params: 采样参数（max_tokens、temperature、extra_body等）
+
+    Returns:
+        SHA-256十六进制字符串
+    """
+    payload = {
+        'model': model,
+        'messages': [{**message, 'content': _normalize_content(message.get('content'))}
+                     for message in messages],
+        'params': params,
+    }
+    data = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    两级LLM响应缓存
+
+    第一级为进程内LRU（按条数限制），第二级为SQLite文件（按TTL过期、按总字节数淘汰最久未访问的条目），
+    第二级命中时回填第一级。SQLite连接在首次使用时打开。
+    异步调用方使用 aget/aput：内存层直接查询，SQLite读写放到线程中执行，不阻塞事件循环；
+    SQLite的总字节数和条目数在内存中随写入和删除更新，淘汰时无需全表统计。
+    """
+
+    def __init__(self,
+                 db_path: str,
+                 memory_entries: int = 512,
+                 ttl: float = 7 * 24 * 3600,
+                 max_bytes: int = 256 * 1024 * 1024):
+        """
+        初始化缓存
+
+        Args:
+            db_path: SQLite文件路径
+            memory_entries: 内存缓存的最大条数
+            ttl: 条目有效期（秒），0表示不过期
+            max_bytes: SQLite中响应文本的总字节数上限
+        """
+        self.db_path = Path(db_path)
+        self.memory_entries = memory_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._disk_bytes = 0
+        self._disk_entries = 0
+        # 内存层和SQLite层分开加锁，事件循环中的内存查询不会等待线程中的SQLite操作
+        self._memory_lock = threading.Lock()
+        self._db_lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        """打开（必要时创建）SQLite数据库，调用方需持有 _db_lock"""
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS llm_cache ('
+                ' key TEXT PRIMARY KEY, model TEXT, value TEXT, size INTEGER,'
+                ' created_at REAL, accessed_at REAL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache (accessed_at)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_llm_cache_created ON llm_cache (created_at)')
+            # 只在打开时统计一次，之后随写入和删除增减
+            self._disk_entries, self._disk_bytes = conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache'
+            ).fetchone()
+            self._conn = conn
+        return self._conn
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return bool(self.ttl) and now - created_at > self.ttl
+
+    def get(self, key: str) -> Tuple[Optional[str], Optional[str]]:
+        """
+        查询缓存（同步，会在当前线程读取SQLite）
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            (响应文本, 命中层级 'memory'/'disk')，未命中时为 (None, None)
+        """
+        now = time.time()
+        value = self._get_memory(key, now)
+        if value is not None:
+            return value, 'memory'
+        return self._get_disk(key, now)
+
+    async def aget(self, key: str) -> Tuple[Optional[str], Optional[str]]:
+        """
+        查询缓存（异步，SQLite查询在线程中执行）
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            (响应文本, 命中层级 'memory'/'disk')，未命中时为 (None, None)
+        """
+        now = time.time()
+        value = self._get_memory(key, now)
+        if value is not None:
+            return value, 'memory'
+        return await asyncio.to_thread(self._get_disk, key, now)
+
+    def put(self, key: str, model: str, value: str):
+        """
+        写入缓存（同步，会在当前线程写入SQLite）
+
+        Args:
+            key: 缓存键
+            model: 模型ID（仅用于统计和排查）
+            value: 响应文本
+        """
+        now = time.time()
+        self._remember(key, value, now)
+        self._put_disk(key, model, value, now)
+
+    async def aput(self, key: str, model: str, value: str):
+        """
+        写入缓存（异步，SQLite写入在线程中执行）
+
+        Args:
+            key: 缓存键
+            model: 模型ID（仅用于统计和排查）
+            value: 响应文本
+        """
+        now = time.time()
+        self._remember(key, value, now)
+        await asyncio.to_thread(self._put_disk, key, model, value, now)
+
+    def _get_memory(self, key: str, now: float) -> Optional[str]:
+        """查询内存层，过期条目直接删除"""
+        with self._memory_lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            value, created_at = entry
+            if self._expired(created_at, now):
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+            return value
+
+    def _get_disk(self, key: str, now: float) -> Tuple[Optional[str], Optional[str]]:
+        """查询SQLite层，命中时回填内存层"""
+        with self._db_lock:
+            try:
+                conn = self._connect()
+                row = conn.execute('SELECT value, size, created_at FROM llm_cache WHERE key = ?',
+                                   (key,)).fetchone()
+                if row is not None:
+                    value, size, created_at = row
+                    if self._expired(created_at, now):
+                        conn.execute('DELETE FROM llm_cache WHERE key = ?', (key,))
+                        self._disk_entries -= 1
+                        self._disk_bytes -= size
+                    else:
+                        conn.execute('UPDATE llm_cache SET accessed_at = ? WHERE key = ?', (now, key))
+                        conn.commit()
+                        self._remember(key, value, created_at)
+                        self.disk_hits += 1
+                        return value, 'disk'
+                    conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"读取LLM响应缓存失败: {str(e)}")
+
+            self.misses += 1
+            return None, None
+
+    def _put_disk(self, key: str, model: str, value: str, now: float):
+        """写入SQLite层并按需淘汰"""
+        size = len(value.encode('utf-8'))
+        with self._db_lock:
+            try:
+                conn = self._connect()
+                old = conn.execute('SELECT size FROM llm_cache WHERE key = ?', (key,)).fetchone()
+                conn.execute(
+                    'INSERT OR REPLACE INTO llm_cache (key, model, value, size, created_at, accessed_at)'
+                    ' VALUES (?, ?, ?, ?, ?, ?)',
+                    (key, model, value, size, now, now)
+                )
+                if old is None:
+                    self._disk_entries += 1
+                else:
+                    self._disk_bytes -= old[0]
+                self._disk_bytes += size
+                self._evict(conn, now)
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"写入LLM响应缓存失败: {str(e)}")
+                # 事务回滚后计数可能与表不一致，下次打开连接时重新统计
+                self._reset_connection()
+
+    def _reset_connection(self):
+        """关闭连接，下次使用时重新打开并重新统计（调用方需持有 _db_lock）"""
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except sqlite3.Error:
+                pass
+            self._conn = None
+
+    def _remember(self, key: str, value: str, created_at: float):
+        """写入内存层，超出条数上限时淘汰最久未使用的条目"""
+        with self._memory_lock:
+            self._memory[key] = (value, created_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        """删除过期条目，总大小超限时按最近访问时间从旧到新删除到上限的90%（调用方需持有 _db_lock）"""
+        if self.ttl:
+            count, size = conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache WHERE created_at < ?',
+                (now - self.ttl,)
+            ).fetchone()
+            if count:
+                conn.execute('DELETE FROM llm_cache WHERE created_at < ?', (now - self.ttl,))
+                self._disk_entries -= count
+                self._disk_bytes -= size
+                self.evictions += count
+
+        if self._disk_bytes <= self.max_bytes:
+            return
+        target = self.max_bytes * 0.9
+        for key, size in conn.execute('SELECT key, size FROM llm_cache ORDER BY accessed_at').fetchall():
+            if self._disk_bytes <= target:
+                break
+            conn.execute('DELETE FROM llm_cache WHERE key = ?', (key,))
+            with self._memory_lock:
+                self._memory.pop(key, None)
+            self._disk_entries -= 1
+            self._disk_bytes -= size
+            self.evictions += 1
+
+    def clear(self):
+        """清空两级缓存"""
+        with self._memory_lock:
+            self._memory.clear()
+        with self._db_lock:
+            try:
+                conn = self._connect()
+                conn.execute('DELETE FROM llm_cache')
+                conn.commit()
+                self._disk_entries = 0
+                self._disk_bytes = 0
+            except sqlite3.Error as e:
+                logger.warning(f"清空LLM响应缓存失败: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计"""
+        with self._db_lock:
+            try:
+                self._connect()
+            except sqlite3.Error as e:
+                logger.warning(f"读取LLM响应缓存统计失败: {str(e)}")
+            entries, total_bytes = self._disk_entries, self._disk_bytes
+        with self._memory_lock:
+            memory_entries = len(self._memory)
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            'memory_entries': memory_entries,
+            'disk_entries': entries,
+            'disk_bytes': total_bytes,
+            'max_bytes': self.max_bytes,
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        """关闭SQLite连接"""
+        with self._db_lock:
+            self._reset_connection()
@@ -1,10 +1,20 @@
 """多种LLM客户端实现"""
+import re
+import json
+import time
+import hashlib
+import asyncio
 import logging
-from typing import Dict, Any, Optional, AsyncGenerator, List
-from openai import OpenAI, AsyncOpenAI
+from collections import OrderedDict, defaultdict, deque
+from typing import Dict, Any, Optional, AsyncGenerator, List, Tuple, Callable
 import httpx
 import base64
 from config import settings
+from utils.rate_limiter import AdaptiveRateLimiter, estimate_tokens
+from utils.retry import backoff_delay, classify_error, is_retryable, retry_async
+from utils.llm_cache import LLMResponseCache, make_cache_key
+from utils.single_flight import SingleFlight
+from utils.upload_registry import UploadRegistry
 
 logger = logging.getLogger(__name__)
 
@@ -13,71 +23,175 @@ class MultiLLMClient:
     """支持多种LLM API的客户端"""
     
     def __init__(self):
-        """初始化所有LLM客户端"""
-        # 主模型客户端（火山引擎）
-        self.main_client = AsyncOpenAI(
-            api_key=settings.API_KEY,
-            base_url=settings.MODEL_URL
-        )
+        """初始化LLM客户端配置，各服务商的客户端在首次使用时创建"""
+        self._client_configs = {
+            'main': (settings.API_KEY, settings.MODEL_URL),  # 主模型（火山引擎）
+            'qwen': (settings.QWEN_API_KEY, settings.QWEN_MODEL_URL),  # 通义千问
+            'ds': (settings.DS_API_KEY, settings.DS_MODEL_URL),  # DeepSeek
+            'image': (settings.IMAGE_API_KEY, settings.IMAGE_MODEL_URL),  # 图文分析（Gemini）
+        }
+        self._clients: Dict[str, Any] = {}
         
-        # 通义千问客户端
-        self.qwen_client = AsyncOpenAI(
-            api_key=settings.QWEN_API_KEY,
-            base_url=settings.QWEN_MODEL_URL
-        )
+        # 每个服务商独立限流
+        self.rate_limiters = {
+            name: AdaptiveRateLimiter(
+                name=name,
+                rpm=getattr(settings, f'LLM_{name.upper()}_RPM'),
+                tpm=getattr(settings, f'LLM_{name.upper()}_TPM'),
+                max_concurrency=getattr(settings, f'LLM_{name.upper()}_MAX_CONCURRENCY'),
+                latency_spike_factor=settings.LLM_LATENCY_SPIKE_FACTOR
+            )
+            for name in self._client_configs
+        }
         
-        # DeepSeek客户端
-        self.ds_client = AsyncOpenAI(
-            api_key=settings.DS_API_KEY,
-            base_url=settings.DS_MODEL_URL
-        )
+        # 对冲请求的等效模型：火山引擎与DeepSeek官方部署的同为DeepSeek-V3
+        self.hedge_models = {
+            settings.MODEL_ID_V3: settings.DS_MODEL_ID,
+            settings.DS_MODEL_ID: settings.MODEL_ID_V3,
+        }
+        # 各模型最近成功调用的延迟，用于计算对冲等待时间
+        self._latencies: Dict[str, deque] = defaultdict(lambda: deque(maxlen=200))
         
-        # 图文分析客户端（Gemini）
-        self.image_client = AsyncOpenAI(
-            api_key=settings.IMAGE_API_KEY,
-            base_url=settings.IMAGE_MODEL_URL
-        )
+        # 响应缓存（内存LRU + SQLite）
+        self.response_cache = LLMResponseCache(
+            db_path=settings.LLM_CACHE_DB,
+            memory_entries=settings.LLM_CACHE_MEMORY_ENTRIES,
+            ttl=settings.LLM_CACHE_TTL,
+            max_bytes=settings.LLM_CACHE_MAX_BYTES
+        ) if settings.LLM_CACHE_ENABLED else None
+        
+        # 合并进行中的相同请求（同一份比对结果被多个页面同时请求时只调用一次）
+        self.single_flight = SingleFlight()
         
         # 默认模型
         self.default_model = settings.MODEL_ID_V3
     
-    async def process_item(self, prompt: str, model: str = None, **kwargs) -> Dict[str, Any]:
+    def _get_client(self, name: str):
+        """
+        获取（必要时创建）指定服务商的客户端，openai在此时才导入
+        
+        Args:
+            name: 客户端名称，main/qwen/ds/image
+            
+        Returns:
+            AsyncOpenAI客户端
+        """
+        client = self._clients.get(name)
+        if client is None:
+            from openai import AsyncOpenAI
+            
+            api_key, base_url = self._client_configs[name]
+            # 重试由本类按错误分类统一处理，关闭SDK自带的重试
+            client = self._clients[name] = AsyncOpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+        return client
+    
+    def rate_limit_stats(self) -> Dict[str, Dict[str, Any]]:
+        """各服务商限流器的当前状态"""
+        return {name: limiter.stats() for name, limiter in self.rate_limiters.items()}
+    
+    def latency_stats(self) -> Dict[str, Dict[str, Any]]:
+        """各模型最近成功调用的样本数和p95延迟"""
+        return {model: {'samples': len(samples), 'p95': self.latency_p95(model)}
+                for model, samples in self._latencies.items()}
+    
+    @property
+    def main_client(self):
+        """主模型客户端（火山引擎）"""
+        return self._get_client('main')
+    
+    @property
+    def qwen_client(self):
+        """通义千问客户端"""
+        return self._get_client('qwen')
+    
+    @property
+    def ds_client(self):
+        """DeepSeek客户端"""
+        return self._get_client('ds')
+    
+    @property
+    def image_client(self):
+        """图文分析客户端（Gemini）"""
+        return self._get_client('image')
+    
+    async def process_item(self,
+                           prompt: str,
+                           model: str = None,
+                           hedge: Optional[bool] = None,
+                           bypass_cache: bool = False,
+                           **kwargs) -> Dict[str, Any]:
         """
         通用LLM调用接口
         
+        相同模型、提示词和采样参数的请求直接返回缓存的响应，已有相同请求在进行中时等待并共享其结果；
+        限流、超时和服务端错误按退避策略重试；启用对冲时，主请求超过该模型的p95延迟仍未返回，
+        则向其他服务商的等效模型发出同样的请求，取先成功返回的结果。
+        
         Args:
             prompt: 提示词
             model: 模型ID
+            hedge: 是否启用对冲请求，默认使用配置中的LLM_HEDGE_ENABLED
+            bypass_cache: 是否跳过缓存查询（新结果仍会写入缓存）
             **kwargs: 其他参数
             
         Returns:
-            包含模型响应的字典
+            包含模型响应的字典；命中缓存时 cached 为True，cache_tier 为命中层级；
+            共享了进行中请求的结果时 coalesced 为True；
+            调用失败时 res 为空，error 为错误信息，error_type 为错误分类
         """
         model = model or self.default_model
         
-        # 根据模型选择客户端
+        _, extra_body, max_tokens = self._select_provider(model)
+        request_key = make_cache_key(model, [{"role": "user", "content": prompt}], {
+            'max_tokens': kwargs.get('max_tokens', max_tokens),
+            'temperature': kwargs.get('temperature', 0.7),
+            'extra_body': extra_body,
+        })
+        if self.response_cache is not None and not bypass_cache:
+            text, tier = await self.response_cache.aget(request_key)
+            if text is not None:
+                return {'model': model, 'prompt': prompt, 'res': text,
+                        'cached': True, 'cache_tier': tier}
+        
+        hedge = settings.LLM_HEDGE_ENABLED if hedge is None else hedge
+        hedge_model = self.hedge_models.get(model) if hedge else None
+        
+        async def call() -> Dict[str, Any]:
+            if hedge_model is None:
+                return await self._process_with_retry(prompt, model, **kwargs)
+            return await self._process_hedged(prompt, model, hedge_model, **kwargs)
+        
+        result, shared = await self.single_flight.do(request_key, call)
+        # 每个调用方拿到独立的副本，结果只由发起调用的一方写入缓存
+        result = dict(result)
+        if shared:
+            result['coalesced'] = True
+        elif self.response_cache is not None and not result.get('error'):
+            await self.response_cache.aput(request_key, result['model'], result['res'])
+        return result
+    
+    def _select_provider(self, model: str) -> Tuple[str, Dict[str, Any], int]:
+        """
+        根据模型选择服务商
+        
+        Returns:
+            (服务商名称, extra_body, 默认max_tokens)
+        """
         if 'qwen' in model.lower():
-            client = self.qwen_client
-            extra_body = {
-                'enable_thinking': False,
-                'repetition_penalty': 1.05
-            }
-            max_tokens = 16000
+            return 'qwen', {'enable_thinking': False, 'repetition_penalty': 1.05}, 16000
         elif 'deepseek-chat' in model.lower():
-            client = self.ds_client
-            extra_body = {}
-            max_tokens = 8000
+            return 'ds', {}, 8000
         elif 'gemini' in model.lower():
-            client = self.image_client
-            extra_body = {}
-            max_tokens = 8000
-        else:
-            # 默认使用火山引擎
-            client = self.main_client
-            extra_body = {'repetition_penalty': 1.05}
-            max_tokens = 8000
+            return 'image', {}, 8000
+        # 默认使用火山引擎
+        return 'main', {'repetition_penalty': 1.05}, 8000
+    
+    async def _complete(self, prompt: str, model: str, **kwargs) -> str:
+        """单次调用（经过服务商限流），成功时记录延迟"""
+        provider, extra_body, max_tokens = self._select_provider(model)
+        client = self._get_client(provider)
         
-        try:
+        async with self.rate_limiters[provider].limit(estimate_tokens(prompt)) as permit:
             completion = await client.chat.completions.create(
                 model=model,
                 messages=[
@@ -88,18 +202,83 @@ class MultiLLMClient:
                 stream=False,
                 extra_body=extra_body
             )
-            
-            text = completion.choices[0].message.content
+            if getattr(completion, 'usage', None):
+                permit.tokens_used = completion.usage.total_tokens
+        
+        self._latencies[model].append(time.monotonic() - permit.started)
+        return completion.choices[0].message.content
+    
+    async def _process_with_retry(self, prompt: str, model: str, **kwargs) -> Dict[str, Any]:
+        """带重试的调用，失败时返回错误信息而不是抛出异常"""
+        try:
+            text = await retry_async(
+                lambda: self._complete(prompt, model, **kwargs),
+                max_retries=settings.LLM_MAX_RETRIES,
+                base_delay=settings.LLM_RETRY_BASE_DELAY,
+                max_delay=settings.LLM_RETRY_MAX_DELAY,
+                label=model
+            )
             return {'model': model, 'prompt': prompt, 'res': text}
             
         except Exception as e:
             logger.error(f"LLM调用失败: {str(e)}")
-            return {'model': model, 'prompt': prompt, 'res': str(e)}
+            return {'model': model, 'prompt': prompt, 'res': '',
+                    'error': str(e), 'error_type': classify_error(e)}
+    
+    async def _process_hedged(self, prompt: str, model: str, hedge_model: str, **kwargs) -> Dict[str, Any]:
+        """
+        对冲调用：主请求在p95延迟内未成功时，再向等效模型发出请求，取先成功的结果
+        
+        Args:
+            prompt: 提示词
+            model: 主模型ID
+            hedge_model: 对冲使用的等效模型ID
+            
+        Returns:
+            先成功返回的结果（对冲请求胜出时带 hedged=True），都失败时返回主请求的错误
+        """
+        delay = self.latency_p95(model) or settings.LLM_HEDGE_DEFAULT_DELAY
+        primary = asyncio.ensure_future(self._process_with_retry(prompt, model, **kwargs))
+        secondary = None
+        try:
+            done, pending = await asyncio.wait({primary}, timeout=delay)
+            if primary in done and not primary.result().get('error'):
+                return primary.result()
+            
+            logger.info(f"{model} 在 {delay:.1f}s 内未成功返回，对冲请求 {hedge_model}")
+            secondary = asyncio.ensure_future(self._process_with_retry(prompt, hedge_model, **kwargs))
+            pending.add(secondary)
+            
+            failed = primary.result() if primary in done else None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = task.result()
+                    if not result.get('error'):
+                        result['hedged'] = task is secondary
+                        return result
+                    if task is primary or failed is None:
+                        failed = result
+            return failed
+        finally:
+            for task in (primary, secondary):
+                if task is not None and not task.done():
+                    task.cancel()
+    
+    def latency_p95(self, model: str) -> Optional[float]:
+        """模型最近成功调用的p95延迟（秒），样本不足时返回None"""
+        samples = self._latencies.get(model)
+        if not samples or len(samples) < settings.LLM_HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(samples)
+        return ordered[int(0.95 * (len(ordered) - 1))]
     
     async def process_item_streaming(self, prompt: str, model: str = None, system_prompt: str = None):
         """
         流式LLM调用接口
         
+        已有相同请求的流在进行中时不再发起新调用，而是从头回放已收到的片段并继续接收后续片段。
+        
         Args:
             prompt: 提示词
             model: 模型ID
@@ -107,6 +286,9 @@ class MultiLLMClient:
             
         Yields:
             响应片段
+            
+        Raises:
+            Exception: 调用失败且无法重试时抛出；已输出片段后不再重试
         """
         model = model or self.default_model
         
@@ -118,65 +300,137 @@ class MultiLLMClient:
         
         # 根据模型选择客户端和参数
         if 'qwen' in model.lower():
-            client = self.qwen_client
+            provider = 'qwen'
             extra_body = {
                 'enable_thinking': False,
                 'repetition_penalty': 1.05
             }
             max_tokens = 16000
         else:
-            client = self.main_client
+            provider = 'main'
             extra_body = {'repetition_penalty': 1.05}
             max_tokens = 8000
         
+        request_key = make_cache_key(model, messages, {
+            'max_tokens': max_tokens,
+            'extra_body': extra_body,
+            'stream': True,
+        })
+        stream = self.single_flight.stream(
+            request_key,
+            lambda: self._stream(provider, model, messages, max_tokens, extra_body)
+        )
         try:
-            completion = await client.chat.completions.create(
-                model=model,
-                messages=messages,
-                max_tokens=max_tokens,
-                stream=True,
-                extra_body=extra_body
-            )
-            
-            async for chunk in completion:
-                if hasattr(chunk, "choices") and chunk.choices:
-                    delta = chunk.choices[0].delta
-                    if delta.content:
-                        yield delta.content
+            async for content in stream:
+                yield content
+        finally:
+            # 调用方提前结束时立即退订，最后一个订阅者离开时上游流随之取消
+            await stream.aclose()
+    
+    async def _stream(self,
+                      provider: str,
+                      model: str,
+                      messages: List[Dict[str, str]],
+                      max_tokens: int,
+                      extra_body: Dict[str, Any]) -> AsyncGenerator[str, None]:
+        """发起流式调用，只在首个片段之前重试"""
+        client = self._get_client(provider)
+        
+        prompt_tokens = estimate_tokens(''.join(m['content'] for m in messages))
+        attempt = 0
+        while True:
+            output_chars = 0
+            try:
+                async with self.rate_limiters[provider].limit(prompt_tokens) as permit:
+                    completion = await client.chat.completions.create(
+                        model=model,
+                        messages=messages,
+                        max_tokens=max_tokens,
+                        stream=True,
+                        extra_body=extra_body
+                    )
+                    
+                    async for chunk in completion:
+                        if hasattr(chunk, "choices") and chunk.choices:
+                            delta = chunk.choices[0].delta
+                            if delta.content:
+                                # 流式请求以首个片段到达的时间作为延迟
+                                permit.mark_latency()
+                                output_chars += len(delta.content)
+                                yield delta.content
+                    
+                    permit.tokens_used = prompt_tokens + output_chars // 2
+                return
                         
-        except Exception as e:
-            logger.error(f"流式LLM调用失败: {str(e)}")
-            yield f"错误: {str(e)}"
+            except Exception as e:
+                # 已经输出的片段无法撤回，只在首个片段之前重试
+                if output_chars or attempt >= settings.LLM_MAX_RETRIES or not is_retryable(e):
+                    logger.error(f"流式LLM调用失败: {str(e)}")
+                    raise
+                delay = backoff_delay(attempt, settings.LLM_RETRY_BASE_DELAY, settings.LLM_RETRY_MAX_DELAY, e)
+                logger.warning(f"流式LLM调用失败({classify_error(e)}: {e})，{delay:.2f}s 后第 {attempt + 1} 次重试")
+                await asyncio.sleep(delay)
+                attempt += 1
     
-    async def process_item_image(self, content_list: List[Dict], model: str = None) -> Dict[str, Any]:
+    async def process_item_image(self,
+                                 content_list: List[Dict],
+                                 model: str = None,
+                                 bypass_cache: bool = False) -> Dict[str, Any]:
         """
         图文分析接口
         
         Args:
             content_list: 包含文本和图片的内容列表
             model: 模型ID（默认使用Gemini）
+            bypass_cache: 是否跳过缓存查询（新结果仍会写入缓存）
             
         Returns:
-            包含模型响应的字典
+            包含模型响应的字典；命中缓存时 cached 为True；
+            调用失败时 res 为空，error 为错误信息，error_type 为错误分类
         """
         model = model or settings.IMAGE_MODEL_ID
         
+        cache_key = None
+        if self.response_cache is not None:
+            cache_key = make_cache_key(model, [{"role": "user", "content": content_list}], {'max_tokens': 8000})
+            if not bypass_cache:
+                text, tier = await self.response_cache.aget(cache_key)
+                if text is not None:
+                    return {'model': model, 'res': text, 'cached': True, 'cache_tier': tier}
+        
+        # 图片按固定token数估算
+        text_tokens = sum(estimate_tokens(item.get('text', '')) if item.get('type') == 'text' else 1000
+                          for item in content_list)
+        
+        async def complete() -> str:
+            async with self.rate_limiters['image'].limit(text_tokens) as permit:
+                completion = await self.image_client.chat.completions.create(
+                    model=model,
+                    messages=[
+                        {"role": "user", "content": content_list}
+                    ],
+                    max_tokens=8000,
+                    stream=False
+                )
+                if getattr(completion, 'usage', None):
+                    permit.tokens_used = completion.usage.total_tokens
+            return completion.choices[0].message.content
+        
         try:
-            completion = await self.image_client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "user", "content": content_list}
-                ],
-                max_tokens=8000,
-                stream=False
+            text = await retry_async(
+                complete,
+                max_retries=settings.LLM_MAX_RETRIES,
+                base_delay=settings.LLM_RETRY_BASE_DELAY,
+                max_delay=settings.LLM_RETRY_MAX_DELAY,
+                label=model
             )
-            
-            text = completion.choices[0].message.content
+            if cache_key is not None:
+                await self.response_cache.aput(cache_key, model, text)
             return {'model': model, 'res': text}
             
         except Exception as e:
             logger.error(f"图文分析失败: {str(e)}")
-            return {'model': model, 'res': str(e)}
+            return {'model': model, 'res': '', 'error': str(e), 'error_type': classify_error(e)}
     
     async def process_document_compare(self, application_text: str, compare_text_dict: dict, 
                                       review_text: str, model: str = None, language: str = "Chinese") -> str:
@@ -224,7 +478,14 @@ class MultiLLMClient:
 
 
 class DocumentProcessor:
-    """文档处理器 - 与RAGFlow API交互"""
+    """
+    文档处理器 - 与RAGFlow API交互
+    
+    所有请求共用一个长连接的httpx.AsyncClient（keep-alive连接池，可用时启用HTTP/2），
+    客户端在首次请求时创建，应用关闭时通过 aclose() 释放。
+    检索结果按 (查询, 数据集ID, top_k) 在进程内缓存，同时进行的相同检索只发出一次请求；
+    上传按数据集记录内容哈希，相同内容不再重复上传。
+    """
     
     def __init__(self):
         """初始化文档处理器"""
@@ -233,8 +494,171 @@ class DocumentProcessor:
         self.upload_url = f"{self.base_api_url}/api/v1/datasets/{{dataset_id}}/documents"
         self.retrieval_url = f"{self.base_api_url}/api/v1/retrieval"
         self.timeout = httpx.Timeout(connect=10.0, read=30.0, write=10.0, pool=5.0)
+        self.limits = httpx.Limits(
+            max_connections=settings.DOCUMENT_API_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.DOCUMENT_API_MAX_KEEPALIVE,
+            keepalive_expiry=settings.DOCUMENT_API_KEEPALIVE_EXPIRY
+        )
+        
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop = None
+        self.http2 = False
+        
+        # 连接池使用统计
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.clients_created = 0
+        self.clients_closed = 0
+        self.http_versions: Dict[str, int] = defaultdict(int)
+        
+        # 检索结果缓存：键 -> (写入时间, 结果)，按最近使用顺序排列
+        self.retrieval_cache_ttl = settings.RAG_RETRIEVAL_CACHE_TTL
+        self.retrieval_cache_entries = settings.RAG_RETRIEVAL_CACHE_ENTRIES
+        self._retrieval_cache: "OrderedDict[str, Tuple[float, List[Dict]]]" = OrderedDict()
+        self._retrievals = SingleFlight()
+        self.retrieval_hits = 0
+        self.retrieval_misses = 0
+        
+        # 上传记录：(数据集ID, 内容哈希) -> RAGFlow文档ID
+        self.upload_registry = UploadRegistry(settings.RAG_UPLOAD_REGISTRY_DB)
+        self._uploads = SingleFlight()
+        self.uploads = 0
+        self.uploads_skipped = 0
+    
+    async def _get_client(self) -> httpx.AsyncClient:
+        """获取（必要时创建）绑定当前事件循环的共享客户端，事件循环变化时先关闭旧客户端"""
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client.is_closed or self._loop is not loop:
+            if self._client is not None and not self._client.is_closed:
+                await self._close_client(self._client, self._loop)
+            kwargs = dict(
+                timeout=self.timeout,
+                limits=self.limits,
+                headers={'Authorization': f'Bearer {self.api_key}'}
+            )
+            try:
+                self._client = httpx.AsyncClient(http2=settings.DOCUMENT_API_HTTP2, **kwargs)
+                self.http2 = settings.DOCUMENT_API_HTTP2
+            except ImportError:
+                logger.warning("未安装h2，RAGFlow连接退回HTTP/1.1")
+                self._client = httpx.AsyncClient(**kwargs)
+                self.http2 = False
+            self._loop = loop
+            self.clients_created += 1
+        return self._client
     
-    async def retrieve_documents(self, query: str, dataset_ids: List[str], top_k: int = 5) -> List[Dict]:
+    async def _close_client(self, client: httpx.AsyncClient, loop):
+        """
+        关闭被替换的客户端及其连接池
+        
+        旧事件循环仍在运行时交给它关闭（连接属于旧循环），否则在当前循环中关闭。
+        
+        Args:
+            client: 被替换的客户端
+            loop: 客户端绑定的事件循环
+        """
+        try:
+            if loop is not None and loop is not asyncio.get_running_loop() and loop.is_running():
+                future = asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+                await asyncio.wrap_future(future)
+            else:
+                await client.aclose()
+        except Exception as e:
+            logger.warning(f"关闭旧的RAGFlow客户端失败: {str(e)}")
+        self.clients_closed += 1
+    
+    async def _post(self, url: str, **kwargs) -> httpx.Response:
+        """通过共享客户端发出POST请求并记录连接池使用情况"""
+        client = await self._get_client()
+        self.requests += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            response = await client.post(url, **kwargs)
+            self.http_versions[response.http_version] += 1
+            return response
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self.in_flight -= 1
+    
+    def pool_stats(self) -> Dict[str, Any]:
+        """连接池配置和请求统计（只报告本类维护的计数，不读取httpx内部状态）"""
+        return {
+            'open': self._client is not None and not self._client.is_closed,
+            'http2': self.http2,
+            'max_connections': self.limits.max_connections,
+            'max_keepalive_connections': self.limits.max_keepalive_connections,
+            'keepalive_expiry': self.limits.keepalive_expiry,
+            'in_flight': self.in_flight,
+            'peak_in_flight': self.peak_in_flight,
+            'requests': self.requests,
+            'errors': self.errors,
+            'clients_created': self.clients_created,
+            'clients_closed': self.clients_closed,
+            'http_versions': dict(self.http_versions),
+        }
+    
+    async def aclose(self):
+        """关闭共享客户端及其连接池，以及上传记录"""
+        if self._client is not None and not self._client.is_closed:
+            await self._close_client(self._client, self._loop)
+        self._client = None
+        self._loop = None
+        self.upload_registry.close()
+    
+    @staticmethod
+    def _retrieval_key(query: str, dataset_ids: List[str], top_k: int) -> str:
+        """检索缓存键：查询合并空白，数据集ID去重排序"""
+        normalized = re.sub(r'\s+', ' ', query).strip()
+        return json.dumps([normalized, sorted(set(dataset_ids)), top_k], ensure_ascii=False)
+    
+    def _get_cached_retrieval(self, key: str) -> Optional[List[Dict]]:
+        """读取未过期的检索结果"""
+        entry = self._retrieval_cache.get(key)
+        if entry is not None:
+            stored_at, chunks = entry
+            if time.monotonic() - stored_at <= self.retrieval_cache_ttl:
+                self._retrieval_cache.move_to_end(key)
+                self.retrieval_hits += 1
+                return chunks
+            del self._retrieval_cache[key]
+        self.retrieval_misses += 1
+        return None
+    
+    def _put_cached_retrieval(self, key: str, chunks: List[Dict]):
+        """写入检索结果，超出条数上限时淘汰最久未使用的条目"""
+        if self.retrieval_cache_ttl <= 0:
+            return
+        self._retrieval_cache[key] = (time.monotonic(), chunks)
+        self._retrieval_cache.move_to_end(key)
+        while len(self._retrieval_cache) > self.retrieval_cache_entries:
+            self._retrieval_cache.popitem(last=False)
+    
+    async def _fetch_chunks(self, key: str, query: str, dataset_ids: List[str], top_k: int) -> List[Dict]:
+        """请求RAGFlow检索接口，成功时写入缓存，失败时抛出异常"""
+        data = {
+            'question': query,
+            'dataset_ids': dataset_ids,
+            'top_k': top_k
+        }
+        
+        response = await self._post(self.retrieval_url, json=data)
+        if response.status_code != 200:
+            raise RuntimeError(f"{response.status_code} - {response.text}")
+        
+        chunks = response.json().get('data', {}).get('chunks', [])
+        self._put_cached_retrieval(key, chunks)
+        return chunks
+    
+    async def retrieve_documents(self,
+                                 query: str,
+                                 dataset_ids: List[str],
+                                 top_k: int = 5,
+                                 use_cache: bool = True) -> List[Dict]:
         """
         从RAGFlow检索相关文档
         
@@ -242,88 +666,208 @@ class DocumentProcessor:
             query: 查询文本
             dataset_ids: 数据集ID列表
             top_k: 返回结果数量
+            use_cache: 是否读取检索缓存（新结果仍会写入缓存）
             
         Returns:
-            检索结果列表
+            检索结果列表，检索失败时为空列表
         """
+        key = self._retrieval_key(query, dataset_ids, top_k)
+        if use_cache:
+            chunks = self._get_cached_retrieval(key)
+            if chunks is not None:
+                return list(chunks)
+        
         try:
-            headers = {
-                'Authorization': f'Bearer {self.api_key}',
-                'Content-Type': 'application/json'
-            }
-            
-            data = {
-                'question': query,
-                'dataset_ids': dataset_ids,
-                'top_k': top_k
-            }
-            
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(
-                    self.retrieval_url,
-                    headers=headers,
-                    json=data
-                )
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    return result.get('data', {}).get('chunks', [])
-                else:
-                    logger.error(f"文档检索失败: {response.status_code} - {response.text}")
-                    return []
-                    
+            chunks, _ = await self._retrievals.do(
+                key, lambda: self._fetch_chunks(key, query, dataset_ids, top_k)
+            )
+            return list(chunks)
         except Exception as e:
-            logger.error(f"文档检索异常: {str(e)}")
+            logger.error(f"文档检索失败: {str(e)}")
             return []
     
-    async def upload_document(self, dataset_id: str, content: str, filename: str) -> Optional[Dict]:
+    async def retrieve_batch(self,
+                             queries: List[str],
+                             dataset_ids: List[str],
+                             top_k: int = 5,
+                             concurrency: Optional[int] = None) -> List[List[Dict]]:
         """
-        上传文档到RAGFlow
+        批量检索：重复的查询只检索一次，其余并发执行
+        
+        Args:
+            queries: 查询文本列表
+            dataset_ids: 数据集ID列表
+            top_k: 每个查询返回的结果数量
+            concurrency: 最大并发请求数，默认使用配置中的RAG_RETRIEVAL_CONCURRENCY
+            
+        Returns:
+            与queries一一对应的检索结果列表
+        """
+        keys = [self._retrieval_key(query, dataset_ids, top_k) for query in queries]
+        unique: Dict[str, str] = {}
+        for key, query in zip(keys, queries):
+            unique.setdefault(key, query)
+        semaphore = asyncio.Semaphore(max(concurrency or settings.RAG_RETRIEVAL_CONCURRENCY, 1))
+        
+        async def retrieve(query: str) -> List[Dict]:
+            async with semaphore:
+                return await self.retrieve_documents(query, dataset_ids, top_k)
+        
+        results = await asyncio.gather(*(retrieve(query) for query in unique.values()))
+        by_key = dict(zip(unique, results))
+        return [list(by_key[key]) for key in keys]
+    
+    def retrieval_cache_stats(self) -> Dict[str, Any]:
+        """检索缓存统计"""
+        lookups = self.retrieval_hits + self.retrieval_misses
+        return {
+            'entries': len(self._retrieval_cache),
+            'max_entries': self.retrieval_cache_entries,
+            'ttl': self.retrieval_cache_ttl,
+            'hits': self.retrieval_hits,
+            'misses': self.retrieval_misses,
+            'hit_rate': self.retrieval_hits / lookups if lookups else 0.0,
+            'shared_requests': self._retrievals.shared_calls,
+        }
+    
+    async def upload_document(self,
+                              dataset_id: str,
+                              content: str,
+                              filename: str,
+                              force: bool = False) -> Optional[Dict]:
+        """
+        上传文档到RAGFlow（正文直接从内存发送）
+        
+        同一数据集中已上传过相同内容时跳过上传，返回之前的上传记录。
         
         Args:
             dataset_id: 数据集ID
             content: 文档内容
             filename: 文件名
+            force: 是否忽略上传记录强制上传
             
         Returns:
-            上传结果
+            上传结果，附带 content_hash、document_ids（RAGFlow文档ID）和 duplicate（是否跳过了重复上传）；
+            失败时返回None
         """
-        try:
-            import tempfile
-            import os
+        data = content.encode('utf-8')
+        content_hash = await asyncio.to_thread(lambda: hashlib.sha256(data).hexdigest())
+        return await self._upload(dataset_id, content_hash, filename, lambda: data, force)
+    
+    async def upload_file(self,
+                          dataset_id: str,
+                          path: str,
+                          filename: str,
+                          force: bool = False) -> Optional[Dict]:
+        """
+        上传磁盘上的UTF-8正文文件（如文档存储中的正文），按块流式发送，不整体读入内存
+        
+        Args:
+            dataset_id: 数据集ID
+            path: 正文文件路径
+            filename: 上传时使用的文件名
+            force: 是否忽略上传记录强制上传
             
-            # 创建临时文件
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False) as temp_file:
-                temp_file.write(content)
-                temp_path = temp_file.name
+        Returns:
+            上传结果，同 upload_document
+        """
+        try:
+            content_hash = await asyncio.to_thread(self._hash_file, path)
+        except OSError as e:
+            logger.error(f"读取上传文件失败: {str(e)}")
+            return None
+        return await self._upload(dataset_id, content_hash, filename, lambda: open(path, 'rb'), force)
+    
+    @staticmethod
+    def _hash_file(path: str) -> str:
+        """分块计算文件的SHA-256（在线程中执行）"""
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
+    
+    async def upload_documents(self,
+                               dataset_id: str,
+                               documents: List[Dict[str, str]],
+                               force: bool = False,
+                               concurrency: Optional[int] = None) -> List[Optional[Dict]]:
+        """
+        并发批量上传文档
+        
+        Args:
+            dataset_id: 数据集ID
+            documents: 文档列表，每项包含 filename，以及 content（正文）或 path（正文文件路径）
+            force: 是否忽略上传记录强制上传
+            concurrency: 最大并发上传数，默认使用配置中的RAG_UPLOAD_CONCURRENCY
             
-            # 上传文件
-            with open(temp_path, 'rb') as f:
-                files = {
-                    'file': (filename, f, 'text/plain')
-                }
-                
-                headers = {
-                    'Authorization': f'Bearer {self.api_key}'
-                }
-                
-                url = self.upload_url.format(dataset_id=dataset_id)
-                
-                async with httpx.AsyncClient(timeout=self.timeout) as client:
-                    response = await client.post(url, headers=headers, files=files)
-                    
-                    # 清理临时文件
-                    os.unlink(temp_path)
-                    
-                    if response.status_code == 200:
-                        return response.json()
-                    else:
-                        logger.error(f"文档上传失败: {response.status_code} - {response.text}")
-                        return None
-                        
+        Returns:
+            与documents一一对应的上传结果
+        """
+        semaphore = asyncio.Semaphore(max(concurrency or settings.RAG_UPLOAD_CONCURRENCY, 1))
+        
+        async def upload(document: Dict[str, str]) -> Optional[Dict]:
+            async with semaphore:
+                if document.get('path'):
+                    return await self.upload_file(dataset_id, document['path'], document['filename'], force)
+                return await self.upload_document(dataset_id, document.get('content', ''),
+                                                  document['filename'], force)
+        
+        return list(await asyncio.gather(*(upload(document) for document in documents)))
+    
+    async def _upload(self,
+                      dataset_id: str,
+                      content_hash: str,
+                      filename: str,
+                      open_body: Callable[[], Any],
+                      force: bool) -> Optional[Dict]:
+        """跳过已上传的内容，合并同时进行的相同上传，其余发送到RAGFlow"""
+        if not force:
+            record = await asyncio.to_thread(self.upload_registry.get, dataset_id, content_hash)
+            if record is not None:
+                self.uploads_skipped += 1
+                return {**record, 'duplicate': True}
+        
+        try:
+            result, shared = await self._uploads.do(
+                f"{dataset_id}:{content_hash}",
+                lambda: self._post_upload(dataset_id, content_hash, filename, open_body)
+            )
         except Exception as e:
             logger.error(f"文档上传异常: {str(e)}")
             return None
+        if result is None:
+            return None
+        if shared:
+            self.uploads_skipped += 1
+        return {**result, 'duplicate': shared}
+    
+    async def _post_upload(self,
+                           dataset_id: str,
+                           content_hash: str,
+                           filename: str,
+                           open_body: Callable[[], Any]) -> Optional[Dict]:
+        """发送上传请求，成功时写入上传记录"""
+        body = open_body()
+        try:
+            files = {
+                'file': (filename, body, 'text/plain')
+            }
+            url = self.upload_url.format(dataset_id=dataset_id)
+            response = await self._post(url, files=files)
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+        
+        result = response.json() if response.status_code == 200 else None
+        if result is None or result.get('code', 0) != 0:
+            logger.error(f"文档上传失败: {response.status_code} - {response.text}")
+            return None
+        
+        document_ids = [doc.get('id') for doc in result.get('data') or [] if isinstance(doc, dict)]
+        await asyncio.to_thread(self.upload_registry.record, dataset_id, content_hash, filename, document_ids)
+        self.uploads += 1
+        return {**result, 'content_hash': content_hash, 'document_ids': document_ids}
 
 
 def encode_image_to_base64(image_path: str) -> str:
@@ -2,7 +2,6 @@
 import json
 import logging
 from typing import Dict, Any, Optional, AsyncGenerator
-from openai import OpenAI, AsyncOpenAI
 import os
 
 logger = logging.getLogger(__name__)
@@ -29,6 +28,8 @@ class LLMClient:
             self.client = None
             self.async_client = None
         else:
+            from openai import OpenAI, AsyncOpenAI
+            
             self.client = OpenAI(
                 api_key=self.api_key,
                 base_url=self.base_url
@@ -0,0 +1,34 @@
+"""进程池工具"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.context import BaseContext
+
+
+def process_context() -> BaseContext:
+    """
+    获取创建进程池使用的多进程上下文
+
+    服务进程里同时运行着事件循环和多个线程，fork 会把其他线程持有的锁原样复制到
+    子进程中，子进程可能因此永久阻塞；优先使用 forkserver，不支持时使用 spawn。
+
+    Returns:
+        多进程上下文
+    """
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+def kill_pool(pool: ProcessPoolExecutor):
+    """
+    结束进程池的全部子进程并关闭进程池
+
+    shutdown 只能取消尚未开始的任务，卡住的子进程需要直接结束。
+
+    Args:
+        pool: 进程池
+    """
+    processes = list((pool._processes or {}).values())
+    pool.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        if process.is_alive():
+            process.kill()
@@ -0,0 +1,279 @@
+"""自适应限流器 - 按LLM服务商限制请求数、token数和并发数"""
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Dict, Optional
+
+from utils.retry import retry_after
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估算文本的token数（中文约一字一token，英文约四字符一token，取折中）
+
+    Args:
+        text: 文本
+
+    Returns:
+        估算的token数
+    """
+    return len(text) // 2 + 1
+
+
+def is_rate_limited(exc: BaseException) -> bool:
+    """判断异常是否为服务商限流（HTTP 429）"""
+    return getattr(exc, 'status_code', None) == 429
+
+
+class _TokenBucket:
+    """令牌桶，容量为每分钟配额，按秒均匀补充；rate为0表示不限"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.refill_rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.capacity <= 0
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """取出amount个令牌还需等待的秒数（超过容量的请求按容量计）"""
+        if self.unlimited:
+            return 0.0
+        deficit = min(amount, self.capacity) - self.tokens
+        return deficit / self.refill_rate if deficit > 0 else 0.0
+
+
+class RateLimitPermit:
+    """一次请求的许可，调用方在请求完成后可记录实际token用量"""
+
+    __slots__ = ('reserved_tokens', 'tokens_used', 'started', 'latency')
+
+    def __init__(self, reserved_tokens: int):
+        self.reserved_tokens = reserved_tokens
+        self.tokens_used: Optional[int] = None
+        self.started = time.monotonic()
+        self.latency: Optional[float] = None
+
+    def mark_latency(self):
+        """记录延迟（只记录第一次），未记录时以请求总耗时作为延迟"""
+        if self.latency is None:
+            self.latency = time.monotonic() - self.started
+
+
+class AdaptiveRateLimiter:
+    """
+    单个服务商的自适应限流器
+
+    请求数和token数按每分钟配额的令牌桶限制；并发上限按AIMD调整：
+    请求正常完成时每轮（约等于当前上限个请求）加一，遇到429或延迟突增时减半/按比例收缩，
+    收缩每个冷却周期最多一次，429附带Retry-After时暂停发出新请求。
+    """
+
+    def __init__(self,
+                 name: str,
+                 rpm: int = 0,
+                 tpm: int = 0,
+                 max_concurrency: int = 16,
+                 min_concurrency: int = 1,
+                 latency_spike_factor: float = 2.0,
+                 decrease_cooldown: float = 1.0):
+        """
+        初始化限流器
+
+        Args:
+            name: 服务商名称
+            rpm: 每分钟请求数上限，0表示不限
+            tpm: 每分钟token数上限，0表示不限
+            max_concurrency: 并发上限的最大值
+            min_concurrency: 并发上限的最小值
+            latency_spike_factor: 延迟超过平均延迟的该倍数时视为延迟突增
+            decrease_cooldown: 两次收缩并发上限的最小间隔（秒）
+        """
+        self.name = name
+        self.max_concurrency = max(max_concurrency, 1)
+        self.min_concurrency = max(min(min_concurrency, self.max_concurrency), 1)
+        self.latency_spike_factor = latency_spike_factor
+        self.decrease_cooldown = decrease_cooldown
+
+        self.concurrency_limit = float(self.max_concurrency)
+        self.in_flight = 0
+        self._requests = _TokenBucket(rpm)
+        self._tokens = _TokenBucket(tpm)
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+
+        self.latency_avg: Optional[float] = None
+        self.completed = 0
+        self.throttled = 0
+        self.latency_spikes = 0
+        self._recent: deque = deque()  # (完成时间, token数)，用于统计最近一分钟的吞吐
+
+        self._condition: Optional[asyncio.Condition] = None
+        self._loop = None
+
+    def _get_condition(self) -> asyncio.Condition:
+        """获取绑定当前事件循环的条件变量"""
+        loop = asyncio.get_running_loop()
+        if self._condition is None or self._loop is not loop:
+            self._condition = asyncio.Condition()
+            self._loop = loop
+        return self._condition
+
+    def _wait_time(self, tokens: int, now: float) -> Optional[float]:
+        """可以发出请求时返回0；受令牌桶或暂停限制时返回需等待的秒数；受并发限制时返回None"""
+        if now < self._paused_until:
+            return self._paused_until - now
+        self._requests.refill(now)
+        self._tokens.refill(now)
+        wait = max(self._requests.wait_time(1), self._tokens.wait_time(tokens))
+        if wait > 0:
+            return wait
+        if self.in_flight >= int(self.concurrency_limit):
+            return None
+        return 0.0
+
+    async def acquire(self, tokens: int = 0) -> RateLimitPermit:
+        """
+        等待直到可以发出请求
+
+        Args:
+            tokens: 预估的token数
+
+        Returns:
+            请求许可
+        """
+        condition = self._get_condition()
+        async with condition:
+            while True:
+                wait = self._wait_time(tokens, time.monotonic())
+                if wait == 0:
+                    break
+                try:
+                    await asyncio.wait_for(condition.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+
+            self.in_flight += 1
+            if not self._requests.unlimited:
+                self._requests.tokens -= 1
+            if not self._tokens.unlimited:
+                self._tokens.tokens -= tokens
+        return RateLimitPermit(tokens)
+
+    async def release(self, permit: RateLimitPermit, error: Optional[BaseException] = None):
+        """
+        请求完成后归还许可并调整并发上限
+
+        Args:
+            permit: acquire返回的许可
+            error: 请求抛出的异常（成功时为None）
+        """
+        now = time.monotonic()
+        latency = permit.latency if permit.latency is not None else now - permit.started
+        condition = self._get_condition()
+        async with condition:
+            self.in_flight -= 1
+
+            # 按实际用量修正预留的token（可以为负，之后的请求相应等待）
+            if permit.tokens_used is not None and not self._tokens.unlimited:
+                self._tokens.tokens -= permit.tokens_used - permit.reserved_tokens
+
+            if error is not None and is_rate_limited(error):
+                self.throttled += 1
+                self._decrease(now, 0.5, "429限流")
+                pause = retry_after(error)
+                if pause:
+                    self._paused_until = max(self._paused_until, now + pause)
+            elif error is None:
+                self._record_success(now, latency, permit.tokens_used or permit.reserved_tokens)
+
+            condition.notify_all()
+
+    def _record_success(self, now: float, latency: float, tokens: int):
+        """记录成功请求：更新延迟均值，延迟突增时收缩，否则加性增长"""
+        self.completed += 1
+        self._recent.append((now, tokens))
+
+        spike = (self.latency_avg is not None and self.completed > 10
+                 and latency > self.latency_avg * self.latency_spike_factor)
+        self.latency_avg = latency if self.latency_avg is None else 0.9 * self.latency_avg + 0.1 * latency
+
+        if spike:
+            self.latency_spikes += 1
+            self._decrease(now, 0.8, f"延迟突增 {latency:.1f}s")
+        else:
+            self.concurrency_limit = min(self.max_concurrency,
+                                         self.concurrency_limit + 1 / self.concurrency_limit)
+
+    def _decrease(self, now: float, factor: float, reason: str):
+        """按比例收缩并发上限（冷却期内只收缩一次）"""
+        if now - self._last_decrease < self.decrease_cooldown:
+            return
+        self._last_decrease = now
+        previous = self.concurrency_limit
+        self.concurrency_limit = max(self.min_concurrency, self.concurrency_limit * factor)
+        logger.warning(f"{self.name} {reason}，并发上限 {previous:.1f} -> {self.concurrency_limit:.1f}")
+
+    def limit(self, tokens: int = 0) -> "_LimitContext":
+        """
+        以上下文管理器方式获取许可，退出时自动归还
+
+        Args:
+            tokens: 预估的token数
+
+        Returns:
+            异步上下文管理器，进入时返回请求许可
+        """
+        return _LimitContext(self, tokens)
+
+    def stats(self) -> Dict[str, Any]:
+        """限流器当前状态及最近一分钟的实际吞吐"""
+        now = time.monotonic()
+        while self._recent and now - self._recent[0][0] > 60:
+            self._recent.popleft()
+        self._requests.refill(now)
+        self._tokens.refill(now)
+        return {
+            'name': self.name,
+            'concurrency_limit': round(self.concurrency_limit, 2),
+            'max_concurrency': self.max_concurrency,
+            'in_flight': self.in_flight,
+            'rpm_limit': int(self._requests.capacity),
+            'tpm_limit': int(self._tokens.capacity),
+            'rpm_available': None if self._requests.unlimited else int(self._requests.tokens),
+            'tpm_available': None if self._tokens.unlimited else int(self._tokens.tokens),
+            'paused_for': round(max(self._paused_until - now, 0.0), 2),
+            'latency_avg': round(self.latency_avg, 3) if self.latency_avg is not None else None,
+            'completed': self.completed,
+            'throttled': self.throttled,
+            'latency_spikes': self.latency_spikes,
+            'requests_last_minute': len(self._recent),
+            'tokens_last_minute': sum(tokens for _, tokens in self._recent),
+        }
+
+
+class _LimitContext:
+    """AdaptiveRateLimiter.limit 返回的异步上下文管理器"""
+
+    def __init__(self, limiter: AdaptiveRateLimiter, tokens: int):
+        self.limiter = limiter
+        self.tokens = tokens
+        self.permit: Optional[RateLimitPermit] = None
+
+    async def __aenter__(self) -> RateLimitPermit:
+        self.permit = await self.limiter.acquire(self.tokens)
+        return self.permit
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.limiter.release(self.permit, exc)
+        return False
@@ -0,0 +1,118 @@
+"""LLM调用重试 - 错误分类与带抖动的指数退避"""
+import random
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+# 可重试的HTTP状态码：超时、冲突、限流和服务端错误
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+def classify_error(exc: BaseException) -> str:
+    """
+    对LLM调用异常分类
+
+    Args:
+        exc: 异常
+
+    Returns:
+        'rate_limit'（429）、'server'（5xx等可重试状态码）、'network'（连接/超时）、
+        'client'（请求本身有误，重试无意义）
+    """
+    status = getattr(exc, 'status_code', None)
+    if status == 429:
+        return 'rate_limit'
+    if status is not None:
+        return 'server' if status in RETRYABLE_STATUS else 'client'
+
+    if isinstance(exc, (asyncio.TimeoutError, ConnectionError)):
+        return 'network'
+    try:
+        import httpx
+        if isinstance(exc, httpx.TransportError):
+            return 'network'
+    except ImportError:
+        pass
+    try:
+        from openai import APIConnectionError
+        if isinstance(exc, APIConnectionError):  # 包括APITimeoutError
+            return 'network'
+    except ImportError:
+        pass
+    return 'client'
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """异常是否值得重试"""
+    return classify_error(exc) != 'client'
+
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    """读取响应头中的Retry-After（秒）"""
+    headers = getattr(getattr(exc, 'response', None), 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int,
+                  base_delay: float,
+                  max_delay: float,
+                  exc: Optional[BaseException] = None) -> float:
+    """
+    计算第attempt次重试前的等待时间（full jitter指数退避）
+
+    Args:
+        attempt: 重试序号，从0开始
+        base_delay: 基础等待时间（秒）
+        max_delay: 等待时间上限（秒）
+        exc: 触发重试的异常，带Retry-After时至少等待该时长
+
+    Returns:
+        等待秒数
+    """
+    delay = random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+    server_delay = retry_after(exc) if exc is not None else None
+    if server_delay:
+        delay = max(delay, min(server_delay, max_delay))
+    return delay
+
+
+async def retry_async(call: Callable[[], Awaitable[T]],
+                      max_retries: int,
+                      base_delay: float,
+                      max_delay: float,
+                      label: str = '') -> T:
+    """
+    执行异步调用，遇到可重试的错误时按退避策略重试
+
+    Args:
+        call: 无参数的异步调用（每次重试重新调用）
+        max_retries: 最大重试次数
+        base_delay: 基础等待时间（秒）
+        max_delay: 等待时间上限（秒）
+        label: 日志中的调用名称
+
+    Returns:
+        调用结果
+
+    Raises:
+        最后一次调用的异常，或不可重试的异常
+    """
+    attempt = 0
+    while True:
+        try:
+            return await call()
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable(e):
+                raise
+            delay = backoff_delay(attempt, base_delay, max_delay, e)
+            logger.warning(f"{label} 调用失败({classify_error(e)}: {e})，"
+                           f"{delay:.2f}s 后第 {attempt + 1} 次重试")
+            await asyncio.sleep(delay)
+            attempt += 1
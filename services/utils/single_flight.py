@@ -0,0 +1,140 @@
+"""请求合并 - 相同的并发请求共享一次上游调用"""
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class _StreamFanout:
+    """
+    一个上游流的多路分发
+
+    上游片段按顺序缓存，订阅者从头回放已收到的片段后继续接收新片段；
+    所有订阅者都离开且上游未结束时取消上游。
+    """
+
+    def __init__(self, source: AsyncIterator[str], on_done: Callable[[], None]):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self._on_done = on_done
+        self._condition = asyncio.Condition()
+        self._task = asyncio.ensure_future(self._pump(source))
+
+    async def _pump(self, source: AsyncIterator[str]):
+        """读取上游流并通知订阅者"""
+        try:
+            async for chunk in source:
+                async with self._condition:
+                    self.chunks.append(chunk)
+                    self._condition.notify_all()
+        except asyncio.CancelledError:
+            self.error = ConnectionAbortedError("上游流已取消")
+        except Exception as e:
+            self.error = e
+        finally:
+            self._on_done()
+            async with self._condition:
+                self.done = True
+                self._condition.notify_all()
+
+    async def subscribe(self) -> AsyncIterator[str]:
+        """从头开始订阅片段，上游出错时在最后抛出同一异常"""
+        self.subscribers += 1
+        index = 0
+        try:
+            while True:
+                async with self._condition:
+                    await self._condition.wait_for(lambda: index < len(self.chunks) or self.done)
+                    pending = self.chunks[index:]
+                    finished = self.done
+                for chunk in pending:
+                    yield chunk
+                index += len(pending)
+                if finished and index >= len(self.chunks):
+                    if self.error is not None:
+                        raise self.error
+                    return
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self._task.done():
+                self._task.cancel()
+
+
+class SingleFlight:
+    """
+    按键合并并发请求
+
+    同一键的请求在进行中时，后到的请求不再发起上游调用，而是等待并共享同一个结果；
+    流式请求共享同一个上游流，每个订阅者都收到完整的片段序列。
+    上游调用在独立任务中执行，单个等待方取消不会影响其他等待方。
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+        self._streams: Dict[str, _StreamFanout] = {}
+        self.calls = 0
+        self.shared_calls = 0
+        self.streams = 0
+        self.shared_streams = 0
+
+    async def do(self, key: str, call: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        执行或加入一次调用
+
+        Args:
+            key: 请求键
+            call: 无参数的异步调用，只在没有进行中的同键调用时执行
+
+        Returns:
+            (调用结果, 是否共享了其他请求的调用)
+        """
+        task = self._calls.get(key)
+        shared = task is not None
+        if shared:
+            self.shared_calls += 1
+        else:
+            self.calls += 1
+            task = asyncio.ensure_future(call())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(self._calls, key, done))
+        return await asyncio.shield(task), shared
+
+    def stream(self, key: str, open_stream: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """
+        订阅或发起一个流式调用
+
+        Args:
+            key: 请求键
+            open_stream: 返回上游异步迭代器的函数，只在没有进行中的同键流时调用
+
+        Returns:
+            片段异步迭代器
+        """
+        fanout = self._streams.get(key)
+        if fanout is not None:
+            self.shared_streams += 1
+        else:
+            self.streams += 1
+            fanout = _StreamFanout(open_stream(), lambda: self._forget(self._streams, key, fanout))
+            self._streams[key] = fanout
+        return fanout.subscribe()
+
+    @staticmethod
+    def _forget(registry: Dict[str, Any], key: str, value: Any):
+        """调用结束后移除登记（只移除同一个调用）"""
+        if registry.get(key) is value:
+            del registry[key]
+
+    def stats(self) -> Dict[str, int]:
+        """合并统计"""
+        return {
+            'in_flight_calls': len(self._calls),
+            'in_flight_streams': len(self._streams),
+            'calls': self.calls,
+            'shared_calls': self.shared_calls,
+            'streams': self.streams,
+            'shared_streams': self.shared_streams,
+        }
@@ -0,0 +1,117 @@
+"""RAGFlow上传记录 - 按数据集记录已上传内容的哈希"""
+import json
+import time
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class UploadRegistry:
+    """
+    已上传到RAGFlow的文档记录
+
+    以 (数据集ID, 内容SHA-256) 为键保存在SQLite文件中，进程重启后仍可识别重复上传。
+    SQLite连接在首次使用时打开。
+    """
+
+    def __init__(self, db_path: str):
+        """
+        初始化上传记录
+
+        Args:
+            db_path: SQLite文件路径
+        """
+        self.db_path = Path(db_path)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        """打开（必要时创建）SQLite数据库，调用方需持有锁"""
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS ragflow_uploads ('
+                ' dataset_id TEXT, content_hash TEXT, filename TEXT, document_ids TEXT, uploaded_at REAL,'
+                ' PRIMARY KEY (dataset_id, content_hash))'
+            )
+        return self._conn
+
+    def get(self, dataset_id: str, content_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        查询上传记录
+
+        Args:
+            dataset_id: 数据集ID
+            content_hash: 内容SHA-256
+
+        Returns:
+            上传记录，未上传过时返回None
+        """
+        with self._lock:
+            try:
+                row = self._connect().execute(
+                    'SELECT filename, document_ids, uploaded_at FROM ragflow_uploads'
+                    ' WHERE dataset_id = ? AND content_hash = ?',
+                    (dataset_id, content_hash)
+                ).fetchone()
+            except sqlite3.Error as e:
+                logger.warning(f"读取上传记录失败: {str(e)}")
+                return None
+        if row is None:
+            return None
+        filename, document_ids, uploaded_at = row
+        return {
+            'dataset_id': dataset_id,
+            'content_hash': content_hash,
+            'filename': filename,
+            'document_ids': json.loads(document_ids or '[]'),
+            'uploaded_at': uploaded_at,
+        }
+
+    def record(self, dataset_id: str, content_hash: str, filename: str, document_ids: List[str]):
+        """
+        记录一次成功的上传
+
+        Args:
+            dataset_id: 数据集ID
+            content_hash: 内容SHA-256
+            filename: 上传时的文件名
+            document_ids: RAGFlow返回的文档ID列表
+        """
+        with self._lock:
+            try:
+                conn = self._connect()
+                conn.execute(
+                    'INSERT OR REPLACE INTO ragflow_uploads'
+                    ' (dataset_id, content_hash, filename, document_ids, uploaded_at) VALUES (?, ?, ?, ?, ?)',
+                    (dataset_id, content_hash, filename, json.dumps(document_ids), time.time())
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"写入上传记录失败: {str(e)}")
+
+    def count(self, dataset_id: Optional[str] = None) -> int:
+        """已记录的上传数，可按数据集过滤"""
+        with self._lock:
+            try:
+                conn = self._connect()
+                if dataset_id is None:
+                    return conn.execute('SELECT COUNT(*) FROM ragflow_uploads').fetchone()[0]
+                return conn.execute('SELECT COUNT(*) FROM ragflow_uploads WHERE dataset_id = ?',
+                                    (dataset_id,)).fetchone()[0]
+            except sqlite3.Error as e:
+                logger.warning(f"读取上传记录失败: {str(e)}")
+                return 0
+
+    def close(self):
+        """关闭SQLite连接"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None